@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""
+Per-base, per-amplicon and genome coverage from primer-trimmed BAMs in one pass.
+
+Each BAM is read once with pysam: the aligned blocks of every primary,
+non-duplicate, QC-passed read are added to a difference array per reference,
+and a cumulative sum gives the per-base depth. Amplicon intervals from the
+sample's collapsed primer BED are then sliced out of that array for mean and
+median depth and breadth, and genome coverage is reported at several depth
+thresholds. Samples run in a process pool.
+
+Outputs (one set per run):
+    <prefix>.depth.npz                Per-base depth of every sample and reference (uint32, compressed)
+    <prefix>.amplicon_metrics.tsv     sample, amplicon, interval, mean/median depth, breadth
+    <prefix>.genome_coverage.tsv      sample, reference, mean depth, % of genome at each threshold
+    <prefix>.amplicon_depth.tsv, <prefix>.heatmap.{tsv,pdf}, <prefix>.dropouts.tsv
+                                      Same tables and heatmap as plot_mosdepth_regions.py (mean depth)
+
+Usage:
+    amplicon_depth.py --samples samples.tsv --outdir ./ --thresholds 1 10 20 100 --threads 8
+    (samples.tsv: "sample_id<TAB>bam<TAB>collapsed primer bed" per line)
+"""
+
+import argparse
+import logging
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pysam
+from plot_mosdepth_regions import write_region_outputs  # Shared heatmap/dropout writer bundled in bin/
+
+# Unmapped, secondary, QC-fail, duplicate (mosdepth default exclusion)
+EXCLUDE_FLAGS = 0x4 | 0x100 | 0x200 | 0x400
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Native amplicon and genome depth from primer-trimmed BAMs.")
+    parser.add_argument("--samples", required=True, help="TSV of sample_id, BAM and collapsed primer BED")
+    parser.add_argument("--outdir", default=".", help="Output directory (default: current directory)")
+    parser.add_argument("--prefix", default="all_samples.depth", help="Output file prefix (default: all_samples.depth)")
+    parser.add_argument("--thresholds", type=int, nargs="+", default=[1, 10, 20, 100],
+                        help="Depths at which genome coverage is reported (default: 1 10 20 100)")
+    parser.add_argument("--breadth-depth", type=int, default=20,
+                        help="Depth at which amplicon breadth and dropouts are called (default: 20)")
+    parser.add_argument("--min-mapq", type=int, default=0, help="Minimum mapping quality (default: 0)")
+    parser.add_argument("--formats", nargs="+", choices=["pdf", "png"], default=["pdf"], help="Heatmap formats (default: pdf)")
+    parser.add_argument("--threads", type=int, default=1, help="Worker processes (default: 1)")
+    return parser.parse_args()
+
+
+def read_amplicons(bed_path):
+    amplicons = []
+    with open(bed_path) as f:
+        for line in f:
+            fields = line.rstrip("\n").split("\t")
+            if len(fields) >= 4:
+                amplicons.append((fields[0], int(fields[1]), int(fields[2]), fields[3]))
+    return sorted(amplicons, key=lambda a: (a[0], a[1]))
+
+
+# Per-base depth of every reference in one pass over the BAM
+def depth_arrays(bam_path, min_mapq):
+    depths, mapped = {}, 0
+    with pysam.AlignmentFile(bam_path, "rb") as bam:
+        for contig, length in zip(bam.references, bam.lengths):
+            starts, ends = [], []
+            for read in bam.fetch(contig):
+                if read.flag & EXCLUDE_FLAGS or read.mapping_quality < min_mapq:
+                    continue
+                mapped += not read.is_supplementary
+                for start, end in read.get_blocks():
+                    starts.append(start)
+                    ends.append(end)
+            diff = np.bincount(np.asarray(starts, dtype=np.int64), minlength=length + 1)[:length + 1]
+            diff -= np.bincount(np.asarray(ends, dtype=np.int64), minlength=length + 1)[:length + 1]
+            depths[contig] = np.cumsum(diff[:length]).astype(np.uint32)
+    return depths, mapped
+
+
+def process_sample(sample, bam_path, bed_path, thresholds, breadth_depth, min_mapq):
+    depths, mapped = depth_arrays(bam_path, min_mapq)
+
+    amplicon_rows = []
+    for chrom, start, end, name in read_amplicons(bed_path) if bed_path else []:
+        region = depths.get(chrom, np.zeros(0, dtype=np.uint32))[start:end]
+        if region.size == 0:
+            amplicon_rows.append((name, chrom, start, end, 0.0, 0.0, 0.0))
+            continue
+        amplicon_rows.append((name, chrom, start, end, float(region.mean()), float(np.median(region)),
+                              float(100 * (region >= breadth_depth).mean())))
+
+    genome_rows = []
+    for contig, depth in depths.items():
+        # Multi-reference BAMs carry every candidate; report those with reads
+        if depth.size == 0 or not depth.any() and len(depths) > 1:
+            continue
+        genome_rows.append((contig, depth.size, float(depth.mean()),
+                            [float(100 * (depth >= t).mean()) for t in thresholds]))
+    return sample, mapped, depths, amplicon_rows, genome_rows
+
+
+def main():
+    args = parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+    samples = []
+    with open(args.samples) as f:
+        for line in f:
+            fields = line.rstrip("\n").split("\t")
+            if len(fields) >= 2 and fields[0]:
+                samples.append((fields[0], fields[1], fields[2] if len(fields) > 2 and fields[2] else None))
+    if not samples:
+        logging.error(f"No samples found in {args.samples}")
+        sys.exit(1)
+
+    with ProcessPoolExecutor(max_workers=max(1, args.threads)) as executor:
+        futures = [executor.submit(process_sample, sample, bam, bed, args.thresholds, args.breadth_depth, args.min_mapq)
+                   for sample, bam, bed in samples]
+        results = sorted((future.result() for future in futures), key=lambda r: r[0])
+
+    os.makedirs(args.outdir, exist_ok=True)
+    prefix = os.path.join(args.outdir, args.prefix)
+
+    np.savez_compressed(f"{prefix}.npz", **{f"{sample}|{contig}": depth
+                                           for sample, _, depths, _, _ in results for contig, depth in depths.items()})
+
+    with open(f"{prefix}.amplicon_metrics.tsv", "w") as f:
+        f.write(f"sample\tamplicon\tchrom\tstart\tend\tmean_depth\tmedian_depth\tbreadth_{args.breadth_depth}x_pct\n")
+        for sample, _, _, amplicon_rows, _ in results:
+            for name, chrom, start, end, mean, median, breadth in amplicon_rows:
+                f.write(f"{sample}\t{name}\t{chrom}\t{start}\t{end}\t{mean:.2f}\t{median:g}\t{breadth:.2f}\n")
+
+    with open(f"{prefix}.genome_coverage.tsv", "w") as f:
+        f.write("sample\treference\tlength\tmapped_reads\tmean_depth\t" +
+                "\t".join(f"pct_ge_{t}x" for t in args.thresholds) + "\n")
+        for sample, mapped, _, _, genome_rows in results:
+            for contig, length, mean, pcts in genome_rows:
+                f.write(f"{sample}\t{contig}\t{length}\t{mapped}\t{mean:.2f}\t" +
+                        "\t".join(f"{p:.2f}" for p in pcts) + "\n")
+
+    # Sample x amplicon matrix of mean depth, in the amplicon order of the first scheme seen
+    amplicons = list(dict.fromkeys(row[0] for result in results for row in result[3]))
+    if amplicons:
+        column = {name: i for i, name in enumerate(amplicons)}
+        matrix = np.full((len(results), len(amplicons)), np.nan)
+        for i, result in enumerate(results):
+            for row in result[3]:
+                matrix[i, column[row[0]]] = row[4]
+        write_region_outputs([r[0] for r in results], amplicons, matrix, prefix, args.breadth_depth, args.formats)
+
+    logging.info(f"Computed depth for {len(results)} sample(s)")
+
+
+if __name__ == "__main__":
+    main()
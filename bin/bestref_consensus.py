@@ -13,6 +13,8 @@ import tempfile
 import re
 from concurrent.futures import ThreadPoolExecutor
 from Bio import SeqIO  # For reading/writing sequence files in FASTA/FASTQ formats
+from reference_cache import ReferenceCache  # Persistent reference/index cache bundled in bin/
+from consensus_qc import compute_metrics, read_fasta  # Shared consensus QC metrics bundled in bin/
 
 # Runs a shell command and raises an error if the command fails
 def run_command(command):
@@ -27,13 +29,42 @@ def safe_id(description):
     first_word = description.split()[0]
     return re.sub(r"[^\w.-]", "_", first_word)
 
+# Builds a minimap2 index (.mmi) for a single reference so it can be reused by every sample
+def build_reference_index(ref_fasta, threads, index_path=None):
+    index_path = index_path or os.path.splitext(ref_fasta)[0] + ".mmi"
+    run_command(f"minimap2 -x map-ont -t {threads} -d {index_path} {ref_fasta}")
+    return index_path
+
+# Writes each reference to its own FASTA and indexes it once, reusing the persistent cache when given
+def prepare_references(references, tempdir, threads, workers, cache=None, cache_key=None):
+    def prepare(ref_record):
+        ref_id = safe_id(ref_record.description)  # Sanitize reference header
+        try:
+            if cache:
+                ref_fasta = cache.get_sequence(cache_key, ref_id, lambda path: SeqIO.write(ref_record, path, "fasta"))
+                index_path = cache.get_index(cache_key, ref_id, ref_fasta,
+                                             lambda fasta, dest: build_reference_index(fasta, threads, dest))
+            else:
+                ref_fasta = os.path.join(tempdir, f"{ref_id}.fa")
+                with open(ref_fasta, "w") as f:
+                    SeqIO.write(ref_record, f, "fasta")
+                index_path = build_reference_index(ref_fasta, threads)
+        except Exception as e:
+            logging.warning(f"Failed to index reference {ref_id}: {e}")
+            return None
+        return {"ref_id": ref_id, "fasta": ref_fasta, "index": index_path}
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        prepared = list(executor.map(prepare, references))
+    return [ref for ref in prepared if ref]
+
 # Runs minimap2 and samtools to align reads and generate a consensus FASTA
-def generate_consensus(reads_path, ref_path, output_prefix, threads, min_depth):
+def generate_consensus(reads_path, ref_index, output_prefix, threads, min_depth):
     bam_file = f"{output_prefix}.bam"
     consensus_file = f"{output_prefix}.fasta"
 
-    # Align reads to reference and sort into BAM
-    cmd_align = f"minimap2 -ax map-ont -t {threads} {ref_path} {reads_path} | samtools sort -@ {threads} -o {bam_file}"
+    # Align reads to the prebuilt reference index and sort into BAM
+    cmd_align = f"minimap2 -ax map-ont -t {threads} {ref_index} {reads_path} | samtools sort -@ {threads} -o {bam_file}"
     run_command(cmd_align)
     run_command(f"samtools index {bam_file}")  # Index BAM for downstream tools
 
@@ -49,9 +80,10 @@ def generate_consensus(reads_path, ref_path, output_prefix, threads, min_depth):
 
 # Calculates genome coverage (percentage of bases that are not 'N')
 def parse_consensus_coverage(consensus_fasta):
-    record = SeqIO.read(consensus_fasta, "fasta")
-    total_len = len(record.seq)
-    covered_bases = total_len - record.seq.upper().count("N")
+    seqs = [seq for _, seq in read_fasta(consensus_fasta)]
+    metrics = compute_metrics(seqs[:1])
+    total_len = int(metrics["length"][0])
+    covered_bases = total_len - int(metrics["n_count"][0])
     return round((covered_bases / total_len) * 100, 2)
 
 # Parses JSON stats from `samtools flagstat` output
@@ -76,16 +108,12 @@ def parse_bam_stats(bam_file):
     }
 
 # Full processing pipeline for a single reference: align, consensus, coverage, stats
-def process_reference(ref_record, reads_path, threads, tempdir, min_depth, sample_id):
-    ref_id = safe_id(ref_record.description)  # Sanitize reference header
-    ref_fasta = os.path.join(tempdir, f"{ref_id}.fa")
-    with open(ref_fasta, "w") as f:
-        SeqIO.write(ref_record, f, "fasta")
-
+def process_reference(ref, reads_path, threads, tempdir, min_depth, sample_id):
+    ref_id = ref["ref_id"]
     prefix = os.path.join(tempdir, f"{sample_id}_{ref_id}_output")
 
     try:
-        consensus_path, bam_path = generate_consensus(reads_path, ref_fasta, prefix, threads, min_depth)
+        consensus_path, bam_path = generate_consensus(reads_path, ref["index"], prefix, threads, min_depth)
         coverage = parse_consensus_coverage(consensus_path)
         stats = parse_bam_stats(bam_path)
         score = stats["mapped"] * (coverage / 100)  # Score used for best-reference ranking
@@ -111,27 +139,127 @@ def get_priority_key(priority):
         "score": lambda x: x["score"]
     }[priority]
 
+# Reads the batch sheet: one "sample_id<TAB>reads" pair per line
+def load_batch(batch_file):
+    samples = []
+    with open(batch_file) as f:
+        for line in f:
+            fields = line.rstrip("\n").split("\t")
+            if len(fields) < 2 or not fields[0]:
+                continue
+            samples.append((fields[0], fields[1]))
+    return samples
+
+# Writes the best consensus, BAM and JSON summaries for one sample, exactly as the single-sample mode does
+def finalize_sample(sample_id, results, output, mapping_json, best_json, args):
+    output_dir = os.path.dirname(output)
+
+    # If keeping all BAMs, move them to persistent directory
+    if args.keep_all_bams:
+        bam_dir = os.path.join(output_dir, f"{sample_id}_bams")
+        os.makedirs(bam_dir, exist_ok=True)
+        for entry in results:
+            bam_src = entry["bam"]
+            bai_src = bam_src + ".bai"
+            bam_dest = os.path.join(bam_dir, os.path.basename(bam_src))
+            bai_dest = bam_dest + ".bai"
+            shutil.copy(bam_src, bam_dest)
+            shutil.copy(bai_src, bai_dest)
+            entry["bam"] = bam_dest  # Update path in metadata
+
+    # Write all mapping statistics to file (optional)
+    if mapping_json:
+        with open(mapping_json, "w") as f:
+            json.dump(results, f, indent=2)
+
+    # Select best reference according to user-defined priority
+    best = sorted(results, key=get_priority_key(args.priority), reverse=True)[0]
+
+    # Determine consensus output path
+    output_consensus = f"{output}.consensus.fasta" if not output.endswith(".fasta") else output
+
+    # Create FASTA header with sample ID, taxid, organism, and reference accession
+    ref_accession = best["ref_id"]
+    custom_header = f">{sample_id}|taxon_{args.taxid}|{args.pathogen}|ref_{ref_accession}"
+
+    # Load consensus and write with new custom header
+    record = SeqIO.read(best["consensus"], "fasta")
+    record.id = custom_header[1:]  # Remove '>' for ID
+    record.description = ""  # Clear description
+    with open(output_consensus, "w") as out_f:
+        SeqIO.write(record, out_f, "fasta")
+
+    # Copy best BAM and BAI to output
+    best_bam_dest = f"{output}.bam"
+    best_bai_dest = best_bam_dest + ".bai"
+    shutil.copy(best["bam"], best_bam_dest)
+    shutil.copy(best["bam"] + ".bai", best_bai_dest)
+
+    # Write summary JSON for best reference
+    if best_json:
+        best_output = {
+            "sample_id": sample_id,
+            "taxid": args.taxid,
+            "organism": args.pathogen,
+            **best["stats"],
+            "genome_coverage": best["coverage"],
+            "ref_id": best["ref_id"]
+        }
+        with open(best_json, "w") as f:
+            json.dump(best_output, f, indent=2)
+
+    # Delete all non-best BAMs if not requested to keep them
+    if not args.keep_all_bams:
+        for entry in results:
+            if entry["bam"] != best["bam"]:
+                try:
+                    os.remove(entry["bam"])
+                    os.remove(entry["bam"] + ".bai")
+                except Exception as e:
+                    logging.warning(f"Failed to remove temp BAMs for {entry['ref_id']}: {e}")
+
+    # Log summary info
+    logging.info(f"[{sample_id}] Best reference: {best['ref_id']} with {best['stats']['mapped_percent']}% mapped and {best['coverage']}% coverage.")
+    logging.info(f"[{sample_id}] Consensus written to: {output_consensus}")
+    logging.info(f"[{sample_id}] Best BAM file: {best_bam_dest}")
+
 # Main entry point of the script
 def main():
     # Command-line interface definition
     parser = argparse.ArgumentParser(description="Select best reference after consensus")
-    parser.add_argument("--reads", required=True, help="Input FASTQ(.gz)")
+    parser.add_argument("--reads", help="Input FASTQ(.gz) (single-sample mode)")
+    parser.add_argument("--batch", help="TSV of 'sample_id<TAB>reads' pairs sharing the same references (batch mode)")
     parser.add_argument("--msa", required=True, help="Multi-FASTA file of reference genomes")
-    parser.add_argument("--output", required=True, help="Output prefix or directory")
-    parser.add_argument("--mapping-json", help="Optional: output all reference mapping stats")
-    parser.add_argument("--best-json", help="Optional: output best reference mapping stats")
+    parser.add_argument("--output", required=True, help="Output prefix (single-sample mode) or directory (batch mode)")
+    parser.add_argument("--mapping-json", help="Optional: output all reference mapping stats (single-sample mode)")
+    parser.add_argument("--best-json", help="Optional: output best reference mapping stats (single-sample mode)")
     parser.add_argument("--threads", type=int, default=4, help="Threads per job (default: 4)")
     parser.add_argument("--min_depth", type=int, default=10, help="Minimum depth for consensus generation (default: 10)")
     parser.add_argument("--workers", type=int, default=None, help="Parallel jobs. Defaults to (CPUs - 1)")
-    parser.add_argument("--sample_id", required=True, help="Sample ID (e.g., run1_bc01)")
+    parser.add_argument("--sample_id", help="Sample ID (e.g., run1_bc01) (single-sample mode)")
     parser.add_argument("--taxid", required=True, help="NCBI taxon ID")
     parser.add_argument("--pathogen", required=True, help="Pathogen name (e.g., Zaire ebolavirus)")
     parser.add_argument("--keep_all_bams", action="store_true", help="If set, all BAMs and indices are retained")
     parser.add_argument("--priority", choices=["mapped", "coverage", "score"], default="mapped", help="Metric to prioritize for best reference selection (default: mapped)")
+    parser.add_argument("--cache-dir", help="Optional: persistent reference cache directory (reuses .mmi indexes across runs)")
+    parser.add_argument("--cache-max-gb", type=float, default=None, help="Optional: evict least-recently-used cache entries above this size (GB)")
+    parser.add_argument("--cache-stats", help="Optional: output reference cache hit/miss counts as JSON")
 
     args = parser.parse_args()
     logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
 
+    # Build the list of samples to process
+    if args.batch:
+        samples = load_batch(args.batch)
+        if not samples:
+            logging.error(f"No samples found in batch file {args.batch}.")
+            sys.exit(1)
+        os.makedirs(args.output, exist_ok=True)
+    elif args.reads and args.sample_id:
+        samples = [(args.sample_id, args.reads)]
+    else:
+        parser.error("Provide either --batch or both --reads and --sample_id")
+
     # Determine how many worker threads to run in parallel
     cpu_count = multiprocessing.cpu_count()
     workers = args.workers if args.workers else max(1, cpu_count - 1)
@@ -143,95 +271,61 @@ def main():
         logging.error("No references found in MSA.")
         sys.exit(1)
 
-    output_dir = os.path.dirname(args.output)
-    bam_dir = None
-    if args.keep_all_bams:
-        bam_dir = os.path.join(output_dir, f"{args.sample_id}_bams")
-        os.makedirs(bam_dir, exist_ok=True)
+    # Register the reference set in the persistent cache, keyed by its SHA-256
+    cache, cache_key = None, None
+    if args.cache_dir:
+        cache = ReferenceCache(args.cache_dir, args.cache_max_gb)
+        cache_key = cache.store_refset(args.msa, taxid=args.taxid)
 
     # Temporary directory to hold intermediate outputs
     with tempfile.TemporaryDirectory() as tmpdir:
-        # Create processing tasks for each reference
-        tasks = [(ref, args.reads, args.threads, tmpdir, args.min_depth, args.sample_id) for ref in references]
+        # Index every reference once; all samples align against the same prebuilt indexes
+        prepared_refs = prepare_references(references, tmpdir, args.threads, workers, cache, cache_key)
+        if not prepared_refs:
+            logging.error("All references failed during indexing.")
+            sys.exit(1)
+        logging.info(f"Indexed {len(prepared_refs)} reference(s) for {len(samples)} sample(s).")
+
+        if cache:
+            cache.finalize(cache_key)
+            logging.info(f"Reference cache: {cache.hits} index hit(s), {cache.misses} miss(es).")
+            if args.cache_stats:
+                with open(args.cache_stats, "w") as f:
+                    json.dump({"taxid": args.taxid, **cache.stats()}, f, indent=2)
+
+        # Create processing tasks for every (sample, reference) pair
+        tasks = [(ref, reads, args.threads, tmpdir, args.min_depth, sample_id)
+                 for sample_id, reads in samples for ref in prepared_refs]
 
         # Run all reference mapping tasks in parallel
         with ThreadPoolExecutor(max_workers=workers) as executor:
             results = list(executor.map(lambda x: process_reference(*x), tasks))
 
-        # Filter out any failed reference mappings
-        results = [r for r in results if r]
-
-        if not results:
-            logging.error("All references failed during processing.")
+        # Group successful mappings per sample, preserving input order
+        per_sample = {sample_id: [] for sample_id, _ in samples}
+        for result in results:
+            if result:
+                per_sample[result["sample_id"]].append(result)
+
+        failed = []
+        for sample_id, sample_results in per_sample.items():
+            if not sample_results:
+                logging.error(f"[{sample_id}] All references failed during processing.")
+                failed.append(sample_id)
+                continue
+
+            if args.batch:
+                prefix = os.path.join(args.output, f"{sample_id}_{args.taxid}")
+                finalize_sample(sample_id, sample_results, prefix,
+                                f"{prefix}_allstats.json", f"{prefix}_beststat.json", args)
+            else:
+                finalize_sample(sample_id, sample_results, args.output,
+                                args.mapping_json, args.best_json, args)
+
+        # Fail only when nothing could be assembled
+        if len(failed) == len(per_sample):
             sys.exit(1)
 
-        # If keeping all BAMs, move them to persistent directory
-        if args.keep_all_bams:
-            for entry in results:
-                bam_src = entry["bam"]
-                bai_src = bam_src + ".bai"
-                bam_dest = os.path.join(bam_dir, os.path.basename(bam_src))
-                bai_dest = bam_dest + ".bai"
-                shutil.copy(bam_src, bam_dest)
-                shutil.copy(bai_src, bai_dest)
-                entry["bam"] = bam_dest  # Update path in metadata
-
-        # Write all mapping statistics to file (optional)
-        if args.mapping_json:
-            with open(args.mapping_json, "w") as f:
-                json.dump(results, f, indent=2)
-
-        # Select best reference according to user-defined priority
-        best = sorted(results, key=get_priority_key(args.priority), reverse=True)[0]
-
-        # Determine consensus output path
-        output_consensus = f"{args.output}.consensus.fasta" if not args.output.endswith(".fasta") else args.output
-
-        # Create FASTA header with sample ID, taxid, organism, and reference accession
-        ref_accession = best["ref_id"]
-        custom_header = f">{args.sample_id}|taxon_{args.taxid}|{args.pathogen}|ref_{ref_accession}"
-
-        # Load consensus and write with new custom header
-        record = SeqIO.read(best["consensus"], "fasta")
-        record.id = custom_header[1:]  # Remove '>' for ID
-        record.description = ""  # Clear description
-        with open(output_consensus, "w") as out_f:
-            SeqIO.write(record, out_f, "fasta")
-
-        # Copy best BAM and BAI to output
-        best_bam_dest = f"{args.output}.bam"
-        best_bai_dest = best_bam_dest + ".bai"
-        shutil.copy(best["bam"], best_bam_dest)
-        shutil.copy(best["bam"] + ".bai", best_bai_dest)
-
-        # Write summary JSON for best reference
-        if args.best_json:
-            best_output = {
-                "sample_id": args.sample_id,
-                "taxid": args.taxid,
-                "organism": args.pathogen,
-                **best["stats"],
-                "genome_coverage": best["coverage"],
-                "ref_id": best["ref_id"]
-            }
-            with open(args.best_json, "w") as f:
-                json.dump(best_output, f, indent=2)
-
-        # Delete all non-best BAMs if not requested to keep them
-        if not args.keep_all_bams:
-            for entry in results:
-                if entry["bam"] != best["bam"]:
-                    try:
-                        os.remove(entry["bam"])
-                        os.remove(entry["bam"] + ".bai")
-                    except Exception as e:
-                        logging.warning(f"Failed to remove temp BAMs for {entry['ref_id']}: {e}")
-
-        # Log summary info
-        logging.info(f"Best reference: {best['ref_id']} with {best['stats']['mapped_percent']}% mapped and {best['coverage']}% coverage.")
-        logging.info(f"Consensus written to: {output_consensus}")
-        logging.info(f"Best BAM file: {best_bam_dest}")
-
 # Entrypoint check
 if __name__ == "__main__":
     main()
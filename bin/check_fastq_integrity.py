@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+"""
+Pre-flight integrity check of every FASTQ file referenced by a samplesheet.
+
+Each file is checked in a process pool:
+    - gzip files are decompressed to the end, which verifies the CRC32 and
+      length trailer of every member and catches truncated transfers
+    - the first and the last record must be complete, well-formed FASTQ
+      (header starting with '@', '+' separator, sequence and quality of equal length)
+
+Results are cached by (path, size, mtime) in a JSON file, so unchanged files
+are never read twice across runs. A TSV report lists every file. With
+--exclude-bad, samples keep only their good files: the samplesheet written to
+--output-samplesheet points such samples at a directory of symlinks to the
+good files, and samples without any good file are dropped.
+
+Usage:
+    check_fastq_integrity.py --samplesheet samplesheet.csv --report fastq_integrity.tsv \\
+        --output-samplesheet samplesheet.checked.csv [--cache integrity.json] [--exclude-bad] [--threads 8]
+"""
+
+import argparse
+import csv
+import glob
+import gzip
+import json
+import logging
+import os
+import sys
+import tempfile
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+
+FASTQ_SUFFIXES = (".fastq.gz", ".fq.gz", ".fastq", ".fq")
+CHUNK_SIZE = 4 * 1024 * 1024
+TAIL_SIZE = 8 * 1024 * 1024         # enough to hold the last record of very long reads
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Parallel gzip and FASTQ format check of samplesheet inputs.")
+    parser.add_argument("--samplesheet", required=True, help="Samplesheet CSV with 'sample' and 'fastq_dir' columns")
+    parser.add_argument("--report", required=True, help="Output TSV with one row per FASTQ file")
+    parser.add_argument("--output-samplesheet", required=True, help="Samplesheet to use downstream")
+    parser.add_argument("--cache", default=None, help="JSON cache of earlier results keyed by path, size and mtime")
+    parser.add_argument("--exclude-bad", action="store_true", help="Drop bad files (and samples left without files)")
+    parser.add_argument("--clean-dir", default="checked_fastq", help="Where symlink directories for --exclude-bad go")
+    parser.add_argument("--threads", type=int, default=1, help="Worker processes (default: 1)")
+    return parser.parse_args()
+
+
+def list_fastqs(path):
+    if os.path.isdir(path):
+        return sorted(f for f in glob.glob(os.path.join(path, "*")) if f.endswith(FASTQ_SUFFIXES) and os.path.isfile(f))
+    return [path] if os.path.isfile(path) else []
+
+
+# Validates one FASTQ record given as four byte lines
+def check_record(lines, where):
+    if len(lines) < 4:
+        return f"incomplete {where} record"
+    header, seq, plus, qual = lines[:4]
+    if not header.startswith(b"@"):
+        return f"{where} record header does not start with '@'"
+    if not plus.startswith(b"+"):
+        return f"{where} record separator is not '+'"
+    if len(seq) != len(qual):
+        return f"{where} record sequence and quality lengths differ"
+    return None
+
+
+# Returns the last four lines of a buffer that ends at end of file, or None if the final line is cut
+def last_record_lines(tail):
+    if not tail.endswith(b"\n"):
+        return None
+    lines = tail[:-1].split(b"\n")
+    return lines[-4:] if len(lines) >= 4 else None
+
+
+def check_gzip(path):
+    """Decompress the whole file (verifying member CRCs) and keep the head and tail of the data."""
+    head, tail = b"", b""
+    try:
+        with gzip.open(path, "rb") as f:
+            while True:
+                chunk = f.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                if len(head) < CHUNK_SIZE:
+                    head += chunk[:CHUNK_SIZE - len(head)]
+                tail = (tail + chunk)[-TAIL_SIZE:]
+    except (OSError, EOFError, zlib.error) as e:
+        # BadGzipFile is an OSError; EOFError means the trailer is missing (truncated file)
+        return f"gzip error: {e}", head, tail
+    return None, head, tail
+
+
+def check_plain(path):
+    size = os.path.getsize(path)
+    with open(path, "rb") as f:
+        head = f.read(CHUNK_SIZE)
+        f.seek(max(0, size - TAIL_SIZE))
+        tail = f.read()
+    return None, head, tail
+
+
+def check_file(path):
+    try:
+        error, head, tail = check_gzip(path) if path.endswith(".gz") else check_plain(path)
+    except OSError as e:
+        return f"read error: {e}"
+    if error:
+        return error
+    if not head:
+        return "empty file"
+    error = check_record(head.split(b"\n")[:4], "first")
+    if error:
+        return error
+    last = last_record_lines(tail)
+    if last is None:
+        return "file does not end with a complete record"
+    return check_record(last, "last")
+
+
+def load_cache(cache_file):
+    if not cache_file or not os.path.exists(cache_file):
+        return {}
+    try:
+        with open(cache_file) as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError):
+        logging.warning(f"Ignoring unreadable cache {cache_file}")
+        return {}
+
+
+def save_cache(cache_file, cache):
+    cache_dir = os.path.dirname(os.path.abspath(cache_file))
+    os.makedirs(cache_dir, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=cache_dir, prefix=".integrity.")
+    with os.fdopen(fd, "w") as f:
+        json.dump(cache, f)
+    os.replace(tmp_path, cache_file)
+
+
+def main():
+    args = parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+    with open(args.samplesheet, newline="") as f:
+        reader = csv.DictReader(f)
+        fieldnames = reader.fieldnames
+        rows = list(reader)
+    if not rows or "fastq_dir" not in fieldnames:
+        logging.error(f"Samplesheet {args.samplesheet} has no rows or no 'fastq_dir' column")
+        sys.exit(1)
+
+    sample_files = {row["sample"]: [os.path.realpath(p) for p in list_fastqs(row["fastq_dir"])] for row in rows}
+    cache = load_cache(args.cache)
+
+    results, to_check = {}, []
+    for path in sorted({p for files in sample_files.values() for p in files}):
+        st = os.stat(path)
+        cached = cache.get(path)
+        if cached and cached["size"] == st.st_size and cached["mtime_ns"] == st.st_mtime_ns:
+            results[path] = (cached["error"], True)
+        else:
+            to_check.append((path, st.st_size, st.st_mtime_ns))
+
+    logging.info(f"Checking {len(to_check)} file(s), {len(results)} unchanged file(s) taken from cache")
+    with ProcessPoolExecutor(max_workers=max(1, args.threads)) as executor:
+        for (path, size, mtime_ns), error in zip(to_check, executor.map(check_file, [p for p, _, _ in to_check])):
+            results[path] = (error, False)
+            cache[path] = {"size": size, "mtime_ns": mtime_ns, "error": error}
+
+    if args.cache:
+        save_cache(args.cache, cache)
+
+    bad = 0
+    with open(args.report, "w") as out:
+        out.write("sample\tfile\tsize\tstatus\terror\tcached\n")
+        for sample, files in sample_files.items():
+            if not files:
+                out.write(f"{sample}\t\t0\tbad\tno FASTQ files found\tno\n")
+            for path in files:
+                error, cached = results[path]
+                bad += bool(error)
+                out.write(f"{sample}\t{path}\t{os.path.getsize(path)}\t{'bad' if error else 'ok'}\t"
+                          f"{error or ''}\t{'yes' if cached else 'no'}\n")
+                if error:
+                    logging.warning(f"{sample}: {path}: {error}")
+    logging.info(f"{bad} bad file(s) out of {len(results)}")
+
+    kept_rows = []
+    for row in rows:
+        files = sample_files[row["sample"]]
+        good = [p for p in files if not results[p][0]]
+        if not args.exclude_bad or len(good) == len(files) and files:
+            kept_rows.append(row)
+            continue
+        if not good:
+            logging.warning(f"Excluding sample {row['sample']}: no readable FASTQ files")
+            continue
+        # Point the sample at a directory holding only its good files
+        clean_dir = os.path.abspath(os.path.join(args.clean_dir, row["sample"]))
+        os.makedirs(clean_dir, exist_ok=True)
+        for path in good:
+            link = os.path.join(clean_dir, os.path.basename(path))
+            if not os.path.lexists(link):
+                os.symlink(path, link)
+        kept_rows.append({**row, "fastq_dir": clean_dir})
+
+    with open(args.output_samplesheet, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=fieldnames)
+        writer.writeheader()
+        writer.writerows(kept_rows)
+
+
+if __name__ == "__main__":
+    main()
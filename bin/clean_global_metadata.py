@@ -1,9 +1,99 @@
 #!/usr/bin/env python3
 
 import pandas as pd
+import numpy as np
 import argparse
-import re
-from datetime import datetime
+
+# Columns of the `dataformat tsv virus-genome` output, after name cleaning, and how they are read.
+# Location, region and date repeat a lot, so they are read as categoricals and cleaned once per
+# distinct value; length is read as float so that missing lengths do not fail the parse.
+DTYPES = {
+    'accession': object,
+    'geographic_location': 'category',
+    'geographic_region': 'category',
+    'isolate_collection_date': 'category',
+    'length': np.float64,
+}
+OUTPUT_COLUMNS = ['accession', 'geographic_location', 'region', 'isolate_collection_date', 'length', 'country', 'date']
+CHUNK_ROWS = 500_000
+
+# Collection date patterns and the pd.to_datetime format each is parsed with
+DATE_FORMATS = [
+    (r'\d{4}', '%Y'),                       # YYYY       -> YYYY-01-01
+    (r'\d{4}-\d{2}', '%Y-%m'),              # YYYY-MM    -> YYYY-MM-01
+    (r'\d{4}-\d{1,2}-\d{1,2}', '%Y-%m-%d'), # YYYY-MM-DD
+]
+
+
+def clean_name(name):
+    return name.lower().replace(' ', '_')
+
+
+def parse_dates(dates):
+    """Normalises collection dates to YYYY-MM-DD, one to_datetime pass per format; anything else is left empty"""
+    dates = pd.Series(dates, dtype=object)
+    parsed = pd.Series(pd.NaT, index=dates.index, dtype='datetime64[ns]')
+    for pattern, fmt in DATE_FORMATS:
+        mask = dates.str.fullmatch(pattern).fillna(False).to_numpy(dtype=bool)
+        if mask.any():
+            parsed[mask] = pd.to_datetime(dates[mask], format=fmt, errors='coerce')
+    return parsed.dt.strftime('%Y-%m-%d').fillna('')
+
+
+def country_of(locations):
+    """Country is the part of the location before the first ':' (e.g. "Kenya: Kilifi" -> "Kenya")"""
+    return pd.Series(locations, dtype=object).str.split(':', n=1).str[0].str.replace(' ', '_', regex=False)
+
+
+def quote(values):
+    """Quotes fields the way DataFrame.to_csv does (separator, quote or line break inside)"""
+    values = pd.Series(values, dtype=object)
+    special = values.str.contains('[\t"\r\n]', regex=True).fillna(False).to_numpy(dtype=bool)
+    if special.any():
+        values[special] = '"' + values[special].str.replace('"', '""', regex=False) + '"'
+    return values.to_numpy(dtype=object)
+
+
+def category_strings(column, transform=None):
+    """Per-row output strings of a categorical column, cleaning each distinct value once; NA is empty"""
+    categories = column.cat.categories.astype(object)
+    if transform is not None:
+        categories = transform(categories)
+    lookup = np.append(quote(categories), '')
+    return lookup[column.cat.codes.to_numpy()]
+
+
+def length_strings(length):
+    """Lengths as integers, formatted once per distinct value; NA is empty"""
+    values, inverse = np.unique(length, return_inverse=True)
+    lookup = np.array(['' if np.isnan(v) else str(int(v)) for v in values], dtype=object)
+    return lookup[inverse.ravel()]
+
+
+def clean_chunk(chunk, min_length, max_length):
+    # Length filter and missing "isolate_collection_date" filter, applied as the chunk is read
+    length = chunk['length'].to_numpy()
+    keep = chunk['isolate_collection_date'].cat.codes.to_numpy() >= 0
+    if min_length is not None:
+        keep &= length >= min_length
+    if max_length is not None:
+        keep &= length <= max_length
+    chunk = chunk[keep]
+
+    accession = chunk['accession'].to_numpy(dtype=object)
+    joined = ''.join(accession)
+    if any(c in joined for c in '\t"\r\n'):
+        accession = quote(accession)
+    return [
+        accession,
+        category_strings(chunk['geographic_location']),
+        category_strings(chunk['geographic_region']),
+        category_strings(chunk['isolate_collection_date']),
+        length_strings(chunk['length'].to_numpy()),
+        category_strings(chunk['geographic_location'], country_of),
+        category_strings(chunk['isolate_collection_date'], parse_dates),
+    ]
+
 
 def main():
     # Define command-line arguments
@@ -19,64 +109,32 @@ def main():
 
     args = parser.parse_args()
 
-    # Load the input TSV file
+    # Only the needed columns are read, with explicit dtypes, a chunk of rows at a time
     try:
-        data = pd.read_csv(args.input_tsv, sep='\t')
+        with open(args.input_tsv) as f:
+            header = f.readline().rstrip('\n').split('\t')
     except FileNotFoundError:
         print(f"Error: Input file {args.input_tsv} not found.")
         exit(1)
+    names = {column: clean_name(column) for column in header if clean_name(column) in DTYPES}
+    missing = [column for column in DTYPES if column not in names.values()]
+    if missing:
+        print(f"Error: Input file {args.input_tsv} lacks column(s): {', '.join(missing)}")
+        exit(1)
 
-    # Clean column names - modified to handle specific column names
-    data.columns = data.columns.str.lower().str.replace(' ', '_')
-    
-    # Now the columns should be:
-    # accession, geographic_location, geographic_region, isolate_collection_date, length
-
-    # Drop rows where "isolate_collection_date" is NA
-    data = data.dropna(subset=['isolate_collection_date'])
-
-    # Apply length filtering
-    if args.min_length is not None:
-        data = data[data['length'] >= args.min_length]
-    if args.max_length is not None:
-        data = data[data['length'] <= args.max_length]
-
-    # Create the "country" column
-    data['country'] = data['geographic_location'].apply(
-        lambda x: x.split(':')[0] if ':' in str(x) else x
-    ).str.replace(' ', '_')
-
-    # Rename the column geographic_region to region
-    data = data.rename(columns={'geographic_region': 'region'})
-
-    # Create a new "date" column in the format YYYY-MM-DD
-    def parse_date(date_str):
-        if pd.isna(date_str):
-            return pd.NaT
-        date_str = str(date_str)
-        try:
-            if re.match(r'^\d{4}$', date_str):
-                return datetime.strptime(date_str + '-01-01', '%Y-%m-%d').date()
-            elif re.match(r'^\d{4}-\d{2}$', date_str):
-                return datetime.strptime(date_str + '-01', '%Y-%m-%d').date()
-            else:
-                return datetime.strptime(date_str, '%Y-%m-%d').date()
-        except ValueError:
-            return pd.NaT
-
-    data['date'] = data['isolate_collection_date'].apply(parse_date)
-    
-    # Create the "strain" column in format "accession|country|date"
-    # data['strain'] = data.apply(
-    #     lambda row: f"{row['accession']}|{row['country']}|{row['date']}",
-    #     axis=1
-    # )
-
-    # Write the cleaned data to the output TSV file
-    data.to_csv(args.output_file, sep='\t', index=False)
+    reader = pd.read_csv(args.input_tsv, sep='\t', usecols=list(names), chunksize=CHUNK_ROWS,
+                         dtype={column: DTYPES[name] for column, name in names.items()})
+    rows = 0
+    with open(args.output_file, 'w') as out:
+        out.write('\t'.join(OUTPUT_COLUMNS) + '\n')
+        for chunk in reader:
+            columns = clean_chunk(chunk.rename(columns=names), args.min_length, args.max_length)
+            if len(columns[0]):
+                out.write('\n'.join(map('\t'.join, zip(*columns))) + '\n')
+            rows += len(columns[0])
 
     # Inform the user that the script has completed
-    print(f"Data cleaning complete. Output saved to: {args.output_file}")
+    print(f"Data cleaning complete. {rows} rows kept. Output saved to: {args.output_file}")
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    main()
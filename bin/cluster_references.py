@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+Cluster the references fetched for a taxid and keep one representative per cluster.
+
+Sequences are sketched with MinHash (sketch_utils.py) and clustered greedily at
+a minimum identity: references are visited from most complete to least
+(most unambiguous bases first), and each joins the first representative it
+matches or becomes a new representative. Distinct genotypes stay in separate
+clusters as long as they differ by more than 1 - identity.
+
+With --cache-dir the clustered set is stored next to the reference set in the
+persistent reference cache (reference_cache.py) and reused on later runs.
+
+Usage:
+    cluster_references.py --input 12345.fasta --output 12345.curated.fasta \\
+        --clusters 12345_reference_clusters.tsv [--identity 0.99] [--cache-dir DIR --taxid 12345]
+"""
+
+import argparse
+import logging
+import os
+import shutil
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from Bio import SeqIO
+from reference_cache import ReferenceCache
+from sketch_utils import DEFAULT_KMER, DEFAULT_SKETCH_SIZE, identity, sketch_sequence
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Cluster reference sequences and keep one representative per cluster.")
+    parser.add_argument("--input", required=True, help="Reference multi-FASTA for one taxid")
+    parser.add_argument("--output", required=True, help="FASTA of cluster representatives")
+    parser.add_argument("--clusters", default=None, help="TSV listing every reference and its representative")
+    parser.add_argument("--identity", type=float, default=0.99, help="Minimum identity to join a cluster (default: 0.99)")
+    parser.add_argument("--kmer", type=int, default=DEFAULT_KMER, help=f"k-mer size (default: {DEFAULT_KMER})")
+    parser.add_argument("--sketch-size", type=int, default=DEFAULT_SKETCH_SIZE,
+                        help=f"MinHash sketch size (default: {DEFAULT_SKETCH_SIZE})")
+    parser.add_argument("--threads", type=int, default=1, help="Threads used for sketching")
+    parser.add_argument("--cache-dir", default=None, help="Persistent reference cache directory")
+    parser.add_argument("--cache-max-gb", type=float, default=None, help="Reference cache size limit in GB")
+    parser.add_argument("--taxid", default=None, help="Taxid the references belong to (links it in the cache)")
+    return parser.parse_args()
+
+
+# Number of unambiguous bases; ranks longer and more complete references first
+def completeness(record):
+    seq = str(record.seq).upper()
+    return sum(seq.count(base) for base in "ACGT")
+
+
+# Greedy clustering; returns [(record, representative_id, identity)] and the representatives in order
+def cluster(records, min_identity, k, sketch_size, threads):
+    order = sorted(records, key=lambda r: (-completeness(r), -len(r.seq), r.id))
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        sketches = list(executor.map(lambda r: sketch_sequence(str(r.seq), k, sketch_size), order))
+
+    representatives = []        # [(record, sketch)]
+    assignments = []
+    for record, sketch in zip(order, sketches):
+        best_rep, best_identity = None, 0.0
+        for rep, rep_sketch in representatives:
+            ident = identity(sketch, rep_sketch, k, sketch_size)
+            if ident >= min_identity and ident > best_identity:
+                best_rep, best_identity = rep, ident
+        if best_rep is None:
+            representatives.append((record, sketch))
+            assignments.append((record, record.id, 1.0))
+        else:
+            assignments.append((record, best_rep.id, best_identity))
+
+    return assignments, [rep for rep, _ in representatives]
+
+
+def write_outputs(assignments, representatives, output, clusters_tsv):
+    with open(output, "w") as out:
+        SeqIO.write(representatives, out, "fasta")
+    if clusters_tsv:
+        with open(clusters_tsv, "w") as out:
+            out.write("reference\trepresentative\tidentity\tlength\n")
+            for record, rep_id, ident in assignments:
+                out.write(f"{record.id}\t{rep_id}\t{ident:.4f}\t{len(record.seq)}\n")
+
+
+def main():
+    args = parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+    if not 0 < args.identity <= 1:
+        logging.error("--identity must be in (0, 1]")
+        sys.exit(1)
+
+    cache, cached_output, cached_clusters = None, None, None
+    if args.cache_dir:
+        cache = ReferenceCache(args.cache_dir, args.cache_max_gb)
+        key = cache.store_refset(args.input, taxid=args.taxid)
+        name = f"clustered_id{args.identity}_k{args.kmer}_s{args.sketch_size}"
+        cached_output = cache.derived_path(key, f"{name}.fasta")
+        cached_clusters = cache.derived_path(key, f"{name}.tsv")
+        if os.path.exists(cached_output) and os.path.exists(cached_clusters):
+            logging.info(f"Reusing clustered reference set {cached_output}")
+            shutil.copyfile(cached_output, args.output)
+            if args.clusters:
+                shutil.copyfile(cached_clusters, args.clusters)
+            return
+
+    records = list(SeqIO.parse(args.input, "fasta"))
+    if not records:
+        logging.error(f"No sequences found in {args.input}")
+        sys.exit(1)
+
+    assignments, representatives = cluster(records, args.identity, args.kmer, args.sketch_size, args.threads)
+    logging.info(f"Clustered {len(records)} reference(s) into {len(representatives)} representative(s) "
+                 f"at {args.identity:.2%} identity")
+
+    clusters_tsv = args.clusters or (f"{args.output}.clusters.tsv" if cache else None)
+    write_outputs(assignments, representatives, args.output, clusters_tsv)
+
+    if cache:
+        cache.store_derived(key, args.output, os.path.basename(cached_output))
+        cache.store_derived(key, clusters_tsv, os.path.basename(cached_clusters))
+        cache.finalize(key)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,243 @@
+#!/usr/bin/env python3
+"""
+Merge the per-batch FASTQ files of one barcode directory into a single gzipped FASTQ.
+
+Two modes:
+    concat  gzip files are joined byte for byte (a multi-member gzip is a valid
+            gzip stream), so nothing is recompressed. Plain FASTQ files are
+            compressed into their own member.
+    filter  reads are filtered on length and mean quality and repeated read IDs
+            are dropped, like artic guppyplex. Each input file is parsed,
+            filtered and compressed by its own worker process into a separate
+            gzip member, and the members are joined in input order, so parsing
+            and compression use every core. A read ID already kept from an
+            earlier file is removed by rewriting that member afterwards.
+
+Both modes write a one-line TSV of read and base counts. In concat mode the
+counts come from a decompress-only pass over the inputs in worker processes;
+use --no-stats to skip it.
+
+Usage:
+    concat_barcode_reads.py --directory barcode01/ --output sample.fastq.gz --mode concat --stats sample.read_stats.tsv
+    concat_barcode_reads.py --directory barcode01/ --output sample.fastq.gz --mode filter --min-length 350 --max-length 700
+"""
+
+import argparse
+import glob
+import gzip
+import hashlib
+import logging
+import math
+import os
+import shutil
+import sys
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+
+FASTQ_SUFFIXES = (".fastq.gz", ".fq.gz", ".fastq", ".fq")
+COPY_BUFFER = 16 * 1024 * 1024
+
+# Phred score -> error probability, indexed by raw quality byte
+ERROR_PROB = np.ones(256, dtype=np.float64)
+ERROR_PROB[33:127] = 10 ** (-np.arange(0, 94) / 10)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Concatenate or filter the FASTQ files of one barcode directory.")
+    parser.add_argument("--directory", required=True, help="Barcode directory with per-batch FASTQ files")
+    parser.add_argument("--output", required=True, help="Output gzipped FASTQ")
+    parser.add_argument("--mode", choices=["concat", "filter"], default="concat", help="Merge mode (default: concat)")
+    parser.add_argument("--min-length", type=int, default=None, help="Minimum read length (filter mode)")
+    parser.add_argument("--max-length", type=int, default=None, help="Maximum read length (filter mode)")
+    parser.add_argument("--quality", type=float, default=None, help="Minimum mean read quality (filter mode)")
+    parser.add_argument("--compresslevel", type=int, default=6, help="gzip level for written members (default: 6)")
+    parser.add_argument("--threads", type=int, default=1, help="Worker processes/threads (default: 1)")
+    parser.add_argument("--sample", default=None, help="Sample label used in the stats TSV")
+    parser.add_argument("--stats", default=None, help="TSV of read and base counts")
+    parser.add_argument("--no-stats", action="store_true", help="Skip the counting pass in concat mode")
+    return parser.parse_args()
+
+
+def list_fastqs(directory):
+    return sorted(f for f in glob.glob(os.path.join(directory, "*")) if f.endswith(FASTQ_SUFFIXES) and os.path.isfile(f))
+
+
+def open_fastq(path):
+    return gzip.open(path, "rb") if path.endswith(".gz") else open(path, "rb")
+
+
+# Yields (header, seq, plus, qual) byte lines of each record
+def read_fastq(path):
+    with open_fastq(path) as f:
+        while True:
+            header = f.readline()
+            if not header:
+                return
+            seq, plus, qual = f.readline(), f.readline(), f.readline()
+            if not qual:
+                raise ValueError(f"Truncated FASTQ record in {path}: {header.strip()!r}")
+            yield header, seq, plus, qual
+
+
+# 64-bit hash of the read ID (first word of the header), to find IDs repeated across files
+def read_id_hash(header):
+    return int.from_bytes(hashlib.blake2b(header[1:].split(None, 1)[0], digest_size=8).digest(), "little")
+
+
+def mean_quality(qual):
+    if not qual:
+        return 0.0
+    error = ERROR_PROB[np.frombuffer(qual, dtype=np.uint8)].mean()
+    return -10 * math.log10(max(error, 1e-10))
+
+
+def empty_stats():
+    return {"reads_in": 0, "reads_out": 0, "bases_out": 0, "min_length": None, "max_length": 0}
+
+
+def merge_stats(total, part):
+    for key in ("reads_in", "reads_out", "bases_out"):
+        total[key] += part[key]
+    if part["min_length"] is not None:
+        total["min_length"] = part["min_length"] if total["min_length"] is None else min(total["min_length"], part["min_length"])
+    total["max_length"] = max(total["max_length"], part["max_length"])
+    return total
+
+
+def count_kept(stats, length):
+    stats["reads_out"] += 1
+    stats["bases_out"] += length
+    stats["min_length"] = length if stats["min_length"] is None else min(stats["min_length"], length)
+    stats["max_length"] = max(stats["max_length"], length)
+
+
+# Counts reads in one file without writing anything (concat mode statistics)
+def count_file(path):
+    stats = empty_stats()
+    for _, seq, _, _ in read_fastq(path):
+        stats["reads_in"] += 1
+        count_kept(stats, len(seq.rstrip(b"\r\n")))
+    return stats
+
+
+# Filters one file into its own gzip member in member_path; returns its stats and the ID hashes kept
+def filter_file(path, member_path, min_length, max_length, min_quality, compresslevel):
+    stats = empty_stats()
+    kept_ids = []
+    seen = set()
+    with gzip.open(member_path, "wb", compresslevel=compresslevel) as out:
+        for record in read_fastq(path):
+            stats["reads_in"] += 1
+            length = len(record[1].rstrip(b"\r\n"))
+            if min_length is not None and length < min_length:
+                continue
+            if max_length is not None and length > max_length:
+                continue
+            if min_quality is not None and mean_quality(record[3].rstrip(b"\r\n")) < min_quality:
+                continue
+            read_id = read_id_hash(record[0])
+            if read_id in seen:
+                continue
+            seen.add(read_id)
+            kept_ids.append(read_id)
+            out.write(b"".join(record))
+            count_kept(stats, length)
+    return stats, np.array(kept_ids, dtype=np.uint64)
+
+
+# Rewrites a member without the records at the given positions; returns the stats of the dropped reads
+def drop_records(member_path, positions, compresslevel):
+    dropped = empty_stats()
+    drop = set(positions.tolist())
+    tmp_path = f"{member_path}.tmp"
+    with gzip.open(tmp_path, "wb", compresslevel=compresslevel) as out:
+        for position, record in enumerate(read_fastq(member_path)):
+            if position in drop:
+                count_kept(dropped, len(record[1].rstrip(b"\r\n")))
+            else:
+                out.write(b"".join(record))
+    os.replace(tmp_path, member_path)
+    return dropped
+
+
+# Appends files to out byte for byte, compressing plain FASTQ into a new member
+def append_members(out, paths, compresslevel):
+    for path in paths:
+        if path.endswith(".gz"):
+            with open(path, "rb") as src:
+                shutil.copyfileobj(src, out, COPY_BUFFER)
+        else:
+            with open(path, "rb") as src, gzip.GzipFile(fileobj=out, mode="wb", compresslevel=compresslevel) as member:
+                shutil.copyfileobj(src, member, COPY_BUFFER)
+
+
+def run_concat(files, args):
+    with open(args.output, "wb") as out:
+        append_members(out, files, args.compresslevel)
+    if args.no_stats:
+        return None
+    total = empty_stats()
+    with ProcessPoolExecutor(max_workers=max(1, args.threads)) as executor:
+        for part in executor.map(count_file, files):
+            merge_stats(total, part)
+    return total
+
+
+def run_filter(files, args):
+    total = empty_stats()
+    with tempfile.TemporaryDirectory(dir=os.path.dirname(os.path.abspath(args.output))) as tmpdir:
+        members = [os.path.join(tmpdir, f"{i:06d}.fastq.gz") for i in range(len(files))]
+        with ProcessPoolExecutor(max_workers=max(1, args.threads)) as executor:
+            futures = [
+                executor.submit(filter_file, path, member, args.min_length, args.max_length, args.quality, args.compresslevel)
+                for path, member in zip(files, members)
+            ]
+            results = [future.result() for future in futures]
+        for part, _ in results:
+            merge_stats(total, part)
+
+        # Keep the first read of each ID, in input order, as guppyplex does
+        ids = np.concatenate([kept_ids for _, kept_ids in results])
+        first = np.zeros(ids.size, dtype=bool)
+        first[np.unique(ids, return_index=True)[1]] = True
+        offset = 0
+        for path, member, (_, kept_ids) in zip(files, members, results):
+            repeated = np.flatnonzero(~first[offset:offset + kept_ids.size])
+            offset += kept_ids.size
+            if repeated.size:
+                dropped = drop_records(member, repeated, args.compresslevel)
+                total["reads_out"] -= dropped["reads_out"]
+                total["bases_out"] -= dropped["bases_out"]
+                logging.info(f"Dropped {repeated.size} read(s) of {path} whose ID was already kept")
+        with open(args.output, "wb") as out:
+            append_members(out, members, args.compresslevel)
+    return total
+
+
+def main():
+    args = parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+    files = list_fastqs(args.directory)
+    if not files:
+        logging.error(f"No FASTQ files found in {args.directory}")
+        sys.exit(1)
+
+    stats = run_concat(files, args) if args.mode == "concat" else run_filter(files, args)
+    if stats is None:
+        logging.info(f"Concatenated {len(files)} file(s) into {args.output}")
+        return
+
+    logging.info(f"{args.mode}: {stats['reads_out']}/{stats['reads_in']} reads from {len(files)} file(s) written to {args.output}")
+    if args.stats:
+        sample = args.sample or os.path.basename(os.path.normpath(args.directory))
+        mean_length = round(stats["bases_out"] / stats["reads_out"], 1) if stats["reads_out"] else 0
+        with open(args.stats, "w") as f:
+            f.write("sample\tmode\tfiles\treads_in\treads_out\tbases_out\tmean_length\tmin_length\tmax_length\n")
+            f.write(f"{sample}\t{args.mode}\t{len(files)}\t{stats['reads_in']}\t{stats['reads_out']}\t{stats['bases_out']}\t"
+                    f"{mean_length}\t{stats['min_length'] or 0}\t{stats['max_length']}\n")
+
+
+if __name__ == "__main__":
+    main()
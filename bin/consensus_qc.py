@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+Vectorised QC metrics for every consensus genome of a run.
+
+All consensus sequences are read as raw bytes and joined into one uint8 NumPy
+buffer (records separated by a newline byte), so every metric is computed with
+a few array operations over the whole run rather than a loop per genome:
+    length, length_deviation    Length, and difference from the reference length
+    n_count, pct_n              N bases
+    ambiguous_bases             IUPAC ambiguity codes other than N (R, Y, K, M, S, W, B, D, H, V)
+    longest_acgt_run            Longest stretch of unambiguous A/C/G/T
+    leading_n, trailing_n       Length of the N runs at the start and end
+    gc_percent                  GC content of the unambiguous bases
+
+Output is one TSV keyed on strain_id (the part of the FASTA header before the
+first '/', as in fasta_meta_filter.py), ready for AGGREGATE_ASSEMBLY_TSVS.
+
+Usage:
+    consensus_qc.py --input-fasta *.consensus.fasta --reference ref.fasta --output consensus_qc.tsv
+"""
+
+import argparse
+import logging
+import sys
+import numpy as np
+
+SEPARATOR = ord("\n")
+COLUMNS = ["strain_id", "length", "length_deviation", "n_count", "pct_n", "ambiguous_bases",
+           "longest_acgt_run", "leading_n", "trailing_n", "gc_percent"]
+
+
+def lookup(chars):
+    table = np.zeros(256, dtype=bool)
+    table[np.frombuffer(chars.encode(), dtype=np.uint8)] = True
+    return table
+
+
+IS_ACGT = lookup("ACGT")
+IS_GC = lookup("GC")
+IS_N = lookup("N")
+IS_AMBIGUOUS = lookup("RYKMSWBDHV")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Vectorised QC metrics over all consensus FASTA files.")
+    parser.add_argument("--input-fasta", nargs="+", required=True, help="Consensus FASTA file(s)")
+    parser.add_argument("--reference", default=None, help="Reference FASTA; its first record's length is the expected length")
+    parser.add_argument("--reference-length", type=int, default=None, help="Expected genome length (overrides --reference)")
+    parser.add_argument("--output", required=True, help="Output TSV")
+    return parser.parse_args()
+
+
+# Yields (header, sequence bytes) from a FASTA file read in one go
+def read_fasta(path):
+    with open(path, "rb") as f:
+        data = f.read()
+    for chunk in data.split(b">")[1:]:
+        header, _, seq = chunk.partition(b"\n")
+        yield header.decode().strip(), seq.replace(b"\n", b"").replace(b"\r", b"").upper()
+
+
+def reference_length(args):
+    if args.reference_length:
+        return args.reference_length
+    if args.reference:
+        for _, seq in read_fasta(args.reference):
+            return len(seq)
+    return None
+
+
+def compute_metrics(seqs):
+    """Returns a dict of per-record metric arrays for a list of byte sequences."""
+    lengths = np.array([len(s) for s in seqs], dtype=np.int64)
+    starts = np.concatenate(([0], np.cumsum(lengths + 1)[:-1]))     # +1 for the separator after each record
+    ends = starts + lengths
+    buf = np.frombuffer(b"\n".join(seqs) + b"\n", dtype=np.uint8)
+    record = np.repeat(np.arange(len(seqs)), lengths + 1)          # record index of every byte
+
+    def per_record(mask):
+        return np.bincount(record, weights=mask, minlength=len(seqs)).astype(np.int64)
+
+    acgt = IS_ACGT[buf]
+    metrics = {
+        "length": lengths,
+        "n_count": per_record(IS_N[buf]),
+        "ambiguous_bases": per_record(IS_AMBIGUOUS[buf]),
+        "acgt": per_record(acgt),
+        "gc": per_record(IS_GC[buf]),
+    }
+
+    # Runs of A/C/G/T; separators are never ACGT, so runs do not cross records
+    edges = np.diff(np.concatenate(([0], acgt.view(np.int8), [0])))
+    run_starts, run_ends = np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)
+    longest = np.zeros(len(seqs), dtype=np.int64)
+    np.maximum.at(longest, record[run_starts], run_ends - run_starts)
+    metrics["longest_acgt_run"] = longest
+
+    # Terminal N runs from the first and last non-N position of each record
+    not_n = np.concatenate(([-1], np.flatnonzero(~IS_N[buf] & (buf != SEPARATOR)), [buf.size]))
+    first_pos = np.minimum(not_n[np.searchsorted(not_n, starts)], ends)
+    last_pos = np.maximum(not_n[np.searchsorted(not_n, ends) - 1], starts - 1)
+    all_n = first_pos >= ends
+    metrics["leading_n"] = np.where(all_n, lengths, first_pos - starts)
+    metrics["trailing_n"] = np.where(all_n, lengths, ends - 1 - last_pos)
+    return metrics
+
+
+def main():
+    args = parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+    ids, seqs = [], []
+    for path in args.input_fasta:
+        try:
+            for header, seq in read_fasta(path):
+                ids.append(header.split("/")[0].split()[0] if header else path)
+                seqs.append(seq)
+        except OSError as e:
+            logging.warning(f"Error reading {path}: {e}")
+    if not seqs:
+        logging.error("No consensus sequences found")
+        sys.exit(1)
+
+    metrics = compute_metrics(seqs)
+    ref_length = reference_length(args)
+    lengths = metrics["length"]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        pct_n = np.where(lengths > 0, 100 * metrics["n_count"] / lengths, 100.0)
+        gc = np.where(metrics["acgt"] > 0, 100 * metrics["gc"] / metrics["acgt"], 0.0)
+
+    with open(args.output, "w") as out:
+        out.write("\t".join(COLUMNS) + "\n")
+        for i, strain_id in enumerate(ids):
+            deviation = int(lengths[i] - ref_length) if ref_length else "NA"
+            out.write(f"{strain_id}\t{lengths[i]}\t{deviation}\t{metrics['n_count'][i]}\t{pct_n[i]:.2f}\t"
+                      f"{metrics['ambiguous_bases'][i]}\t{metrics['longest_acgt_run'][i]}\t{metrics['leading_n'][i]}\t"
+                      f"{metrics['trailing_n'][i]}\t{gc[i]:.2f}\n")
+
+    logging.info(f"QC metrics written for {len(ids)} consensus sequence(s) to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Collapse exact-duplicate sequences before alignment and tree building.
+
+Each sequence is normalised (upper-cased, whitespace removed, leading and
+trailing Ns trimmed) and hashed; the first sequence seen with a given hash is
+kept as the representative of its identity class and the rest are dropped.
+Global datasets carry many identical genomes, so MAFFT and FastTree then run
+on the unique sequences only.
+
+Outputs:
+    <output-fasta>        Representative sequences, written unchanged and in input order
+    <output-map>          strain <TAB> representative, one row per collapsed sequence
+                          (used by expand_duplicates.py to restore them on the tree)
+
+Usage:
+    dedup_sequences.py --fasta combined.fasta --output-fasta unique.fasta --output-map duplicates.tsv
+"""
+
+import argparse
+import gzip
+import hashlib
+import logging
+import sys
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Collapse exact-duplicate sequences to one representative each.")
+    parser.add_argument("--fasta", required=True, help="Input FASTA (optionally gzipped)")
+    parser.add_argument("--output-fasta", required=True, help="FASTA of representative sequences")
+    parser.add_argument("--output-map", required=True, help="TSV mapping each collapsed sequence to its representative")
+    return parser.parse_args()
+
+
+# Yields (name, record bytes, sequence bytes) for every record of a FASTA file
+def read_fasta(path):
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, "rb") as f:
+        data = f.read()
+    for chunk in data.split(b"\n>"):
+        chunk = chunk.lstrip(b">")
+        if not chunk.strip():
+            continue
+        header, _, seq = chunk.partition(b"\n")
+        name = header.split()[0].decode() if header.strip() else ""
+        yield name, b">" + chunk.rstrip(b"\n") + b"\n", seq
+
+
+def sequence_key(seq):
+    """Hash of the sequence with case, whitespace and terminal Ns normalised away."""
+    return hashlib.sha1(b"".join(seq.split()).upper().strip(b"N")).digest()
+
+
+def main():
+    args = parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+    representatives = {}
+    total, duplicates = 0, []
+    with open(args.output_fasta, "wb") as out:
+        for name, record, seq in read_fasta(args.fasta):
+            total += 1
+            key = sequence_key(seq)
+            if key in representatives:
+                duplicates.append((name, representatives[key]))
+                continue
+            representatives[key] = name
+            out.write(record)
+
+    if not total:
+        logging.error(f"No sequences found in {args.fasta}")
+        sys.exit(1)
+
+    with open(args.output_map, "w") as f:
+        f.write("strain\trepresentative\n")
+        for name, representative in duplicates:
+            f.write(f"{name}\t{representative}\n")
+
+    logging.info(f"{total} sequences collapsed to {len(representatives)} unique "
+                 f"({len(duplicates)} duplicates, {100 * len(duplicates) / total:.1f}%)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Restore sequences collapsed by dedup_sequences.py on the tree and alignment.
+
+Every representative leaf that stands for collapsed duplicates becomes a
+zero-length polytomy: the leaf is replaced by an internal node (keeping the
+leaf's branch length) whose children are the representative and each of its
+duplicates, all with branch length 0. The aligned row of the representative
+is copied for each duplicate, so augur sees every sequence in both files.
+
+Usage:
+    expand_duplicates.py --tree fasttree_phylogeny.tree --alignment aln.fas --duplicates duplicates.tsv \\
+        --output-tree expanded.tree --output-alignment expanded.fas
+"""
+
+import argparse
+import csv
+import gzip
+import logging
+from collections import defaultdict
+from Bio import Phylo
+from Bio.Phylo.Newick import Clade
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Re-expand collapsed duplicate sequences on a tree and alignment.")
+    parser.add_argument("--tree", required=True, help="Newick tree built from the representative sequences")
+    parser.add_argument("--alignment", required=True, help="Alignment of the representative sequences (optionally gzipped)")
+    parser.add_argument("--duplicates", required=True, help="strain/representative TSV from dedup_sequences.py")
+    parser.add_argument("--output-tree", required=True, help="Output Newick tree with duplicates restored")
+    parser.add_argument("--output-alignment", required=True, help="Output alignment with duplicates restored")
+    return parser.parse_args()
+
+
+def load_duplicates(path):
+    members = defaultdict(list)
+    with open(path, newline="") as f:
+        for row in csv.DictReader(f, delimiter="\t"):
+            members[row["representative"]].append(row["strain"])
+    return members
+
+
+def expand_tree(tree, members):
+    """Replaces each representative leaf with a zero-length polytomy of it and its duplicates."""
+    expanded = 0
+    for leaf in tree.get_terminals():
+        if leaf.name not in members:
+            continue
+        names = [leaf.name] + members[leaf.name]
+        leaf.clades = [Clade(branch_length=0.0, name=name) for name in names]
+        leaf.name = None
+        expanded += len(names) - 1
+    return expanded
+
+
+def expand_alignment(in_path, out_path, members):
+    opener = gzip.open if in_path.endswith(".gz") else open
+    with opener(in_path, "rb") as f:
+        data = f.read()
+    written = 0
+    with open(out_path, "wb") as out:
+        for chunk in data.split(b"\n>"):
+            chunk = chunk.lstrip(b">")
+            if not chunk.strip():
+                continue
+            header, _, seq = chunk.partition(b"\n")
+            seq = seq.rstrip(b"\n") + b"\n"
+            out.write(b">" + header + b"\n" + seq)
+            name = header.split()[0].decode() if header.strip() else ""
+            for member in members.get(name, ()):
+                out.write(b">" + member.encode() + b"\n" + seq)
+                written += 1
+    return written
+
+
+def main():
+    args = parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+    members = load_duplicates(args.duplicates)
+    tree = Phylo.read(args.tree, "newick")
+    on_tree = expand_tree(tree, members)
+    Phylo.write(tree, args.output_tree, "newick")
+    in_alignment = expand_alignment(args.alignment, args.output_alignment, members)
+
+    expected = sum(len(m) for m in members.values())
+    if on_tree != expected or in_alignment != expected:
+        logging.warning(f"{expected} duplicates listed but {on_tree} restored on the tree and "
+                        f"{in_alignment} in the alignment; representatives missing from the inputs are skipped")
+    logging.info(f"Restored {on_tree} duplicate sequences as zero-length polytomies")
+
+
+if __name__ == "__main__":
+    main()
@@ -6,60 +6,102 @@ Processes FASTA files with metadata merging, coverage filtering, and optional vi
 """
 
 import argparse
+import csv
+import operator
+import re
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 import pandas as pd
-from Bio import SeqIO
 import sys
 import matplotlib.pyplot as plt
 from matplotlib.patches import Patch
 
 
-def stream_records(fasta_paths):
-    """Generator that streams FASTA records one at a time with error handling.
+def read_fasta_bytes(fasta_path):
+    """Read all records of one FASTA file as raw bytes.
+    
+    Args:
+        fasta_path (Path): FASTA file to read
+        
+    Returns:
+        list: (description, sequence bytes) tuples; sequence line breaks are removed
+        
+    Note:
+        Returns an empty list (with a message to stderr) for unreadable files
+    """
+    try:
+        data = fasta_path.read_bytes()
+    except Exception as e:
+        print(f"Error processing {fasta_path}: {str(e)}", file=sys.stderr)
+        return []
+    records = []
+    for chunk in data.split(b'>')[1:]:
+        header, _, seq = chunk.partition(b'\n')
+        records.append((header.decode().strip(), b''.join(seq.split())))
+    return records
+
+
+def stream_records(fasta_paths, threads=4):
+    """Generator that streams FASTA records in input file order, reading files in parallel.
     
     Args:
         fasta_paths (list): List of Path objects pointing to FASTA files
+        threads (int): Number of files read concurrently
         
     Yields:
-        Bio.SeqRecord: One FASTA record at a time
+        tuple: (description, sequence bytes) for one FASTA record at a time
         
     Note:
-        Silently skips files that cause errors while processing
+        At most a few files per thread are held in memory at once
     """
-    for fasta_path in fasta_paths:
-        try:
-            with fasta_path.open("r") as handle:
-                for record in SeqIO.parse(handle, "fasta"):
-                    yield record
-        except Exception as e:
-            print(f"Error processing {fasta_path}: {str(e)}", file=sys.stderr)
-            continue
+    window = max(1, threads) * 4
+    with ThreadPoolExecutor(max_workers=max(1, threads)) as executor:
+        pending = deque()
+        for fasta_path in fasta_paths:
+            pending.append(executor.submit(read_fasta_bytes, fasta_path))
+            if len(pending) >= window:
+                yield from pending.popleft().result()
+        while pending:
+            yield from pending.popleft().result()
 
 
-def validate_metadata(metadata_df, merge_on):
-    """Validate metadata dataframe structure and content.
+# Strings read as missing by pandas; kept as 'nan' so sequence names match earlier releases
+MISSING_VALUES = {'', '#N/A', '#N/A N/A', '#NA', '-1.#IND', '-1.#QNAN', '-NaN', '-nan', '1.#IND', '1.#QNAN',
+                  '<NA>', 'N/A', 'NA', 'NULL', 'NaN', 'None', 'n/a', 'nan', 'null'}
+
+
+def load_metadata(tsv_path, merge_on):
+    """Load and validate a metadata TSV into a compact lookup.
     
     Args:
-        metadata_df (pd.DataFrame): Metadata dataframe to validate
+        tsv_path (Path): Metadata TSV file
         merge_on (str): Column name to use for merging
         
     Returns:
-        pd.DataFrame: Validated metadata dataframe
+        tuple: (metadata columns except merge_on, {strain_id: tuple of values in column order})
         
     Raises:
         SystemExit: If validation fails with error message to stderr
     """
-    if merge_on not in metadata_df.columns:
-        print(f"Error: Merge column '{merge_on}' missing from metadata", file=sys.stderr)
-        sys.exit(1)
-    
-    # Ensure merge column is string type and has no nulls
-    metadata_df[merge_on] = metadata_df[merge_on].astype(str)
-    if metadata_df[merge_on].isnull().any():
-        print("Error: Merge column contains empty values", file=sys.stderr)
-        sys.exit(1)
-    
-    return metadata_df
+    with open(tsv_path, newline='') as f:
+        reader = csv.reader(f, delimiter='\t')
+        header = next(reader, [])
+        if merge_on not in header:
+            print(f"Error: Merge column '{merge_on}' missing from metadata", file=sys.stderr)
+            sys.exit(1)
+        key_index = header.index(merge_on)
+        value_indices = [i for i, col in enumerate(header) if col != merge_on]
+        metadata_map = {}
+        for row in reader:
+            if not row:
+                continue
+            row += [''] * (len(header) - len(row))
+            if not row[key_index]:
+                print("Error: Merge column contains empty values", file=sys.stderr)
+                sys.exit(1)
+            metadata_map[row[key_index]] = tuple('nan' if row[i] in MISSING_VALUES else row[i] for i in value_indices)
+    return [header[i] for i in value_indices], metadata_map
 
 
 def parse_coverage(coverage_str):
@@ -72,13 +114,56 @@ def parse_coverage(coverage_str):
         float: Coverage percentage as float (0.0 if parsing fails)
     """
     try:
-        if pd.isna(coverage_str):
+        if pd.isna(coverage_str) or coverage_str == 'nan':
             return 0.0
         return float(str(coverage_str).replace('%', '').strip())
     except ValueError:
         return 0.0
 
 
+QC_OPERATORS = {'<=': operator.le, '>=': operator.ge, '==': operator.eq, '<': operator.lt, '>': operator.gt}
+
+
+def parse_qc_filter(expression):
+    """Parse a QC filter expression such as 'pct_n<=30'.
+    
+    Args:
+        expression (str): Column name, comparison operator and numeric value
+        
+    Returns:
+        tuple: (column, operator function, value, expression)
+        
+    Raises:
+        SystemExit: If the expression cannot be parsed
+    """
+    match = re.fullmatch(r'\s*(\w+)\s*(<=|>=|==|<|>)\s*(-?[\d.]+)\s*', expression)
+    if not match:
+        print(f"Error: Invalid QC filter '{expression}' (expected e.g. 'pct_n<=30')", file=sys.stderr)
+        sys.exit(1)
+    column, op, value = match.groups()
+    return column, QC_OPERATORS[op], float(value), expression
+
+
+def passes_qc_filters(meta_row, qc_filters, column_index):
+    """Check a metadata row against all QC filters.
+    
+    Args:
+        meta_row (tuple): Metadata values of one sequence (None if the sequence has no metadata)
+        qc_filters (list): Parsed filters from parse_qc_filter
+        column_index (dict): Position of each metadata column in meta_row
+        
+    Returns:
+        bool: True if every filter passes (missing or non-numeric values fail)
+    """
+    for column, compare, value, _ in qc_filters:
+        try:
+            if not compare(float(meta_row[column_index[column]]), value):
+                return False
+        except (TypeError, ValueError, KeyError):
+            return False
+    return True
+
+
 def generate_coverage_plot(coverage_data, threshold, output_file):
     """Generate coverage distribution plot and save to file.
     
@@ -165,6 +250,11 @@ def main():
     parser.add_argument('--threshold', type=float, default=0.7,
                       help='Coverage threshold for filtering (0.0-1.0, default: 0.7)\n'
                            'Note: This represents a fraction (0.7 = 70%)')
+    parser.add_argument('--qc-filter', nargs='+', default=[],
+                      help='Extra filters on merged metadata columns, e.g. "pct_n<=30" "ambiguous_bases<=10"\n'
+                           '(consensus QC columns from consensus_qc.py); all must pass')
+    parser.add_argument('--threads', type=int, default=4,
+                      help='Number of FASTA files read in parallel (default: 4)')
     
     args = parser.parse_args()
 
@@ -177,102 +267,95 @@ def main():
 
     # Convert threshold to percentage for comparison
     threshold_percent = args.threshold * 100
+    qc_filters = [parse_qc_filter(expression) for expression in args.qc_filter]
     
     # Fields that will be incorporated into sequence IDs
     required_fields = {'genotype', 'collection_date'}
 
-    # Resolve and deduplicate input files
-    fasta_paths = list({p.resolve() for pattern in args.input_fasta 
-                       for p in Path().glob(pattern)})
+    # Resolve and deduplicate input files, keeping a stable order
+    fasta_paths = sorted({p.resolve() for pattern in args.input_fasta 
+                         for p in Path().glob(pattern)})
     if not fasta_paths:
         print("Error: No FASTA files found", file=sys.stderr)
         sys.exit(1)
 
     # Process metadata if provided
-    metadata_map = {}  # Will hold {strain_id: {metadata_fields}}
+    metadata_map = {}  # Will hold {strain_id: (metadata values in metadata_cols order)}
     metadata_cols = []  # List of all metadata columns (except merge_on)
     coverage_available = False  # Flag if coverage data exists
     
     if args.merge_tsv:
         try:
-            # Load and validate metadata
-            metadata_df = validate_metadata(
-                pd.read_csv(args.merge_tsv, sep='\t', dtype=str),
-                args.merge_on
-            )
-            
-            # Track available columns
-            metadata_cols = [col for col in metadata_df.columns if col != args.merge_on]
-            coverage_available = args.coverage_col in metadata_df.columns
-            
-            # Create lookup dictionary for metadata
-            metadata_map = metadata_df.set_index(args.merge_on).to_dict('index')
+            metadata_cols, metadata_map = load_metadata(args.merge_tsv, args.merge_on)
+            coverage_available = args.coverage_col in metadata_cols
+        except SystemExit:
+            raise
         except Exception as e:
             print(f"Metadata error: {str(e)}", file=sys.stderr)
             sys.exit(1)
 
+    column_index = {col: i for i, col in enumerate(metadata_cols)}
+    genotype_index = column_index.get('genotype')
+    date_index = column_index.get('collection_date')
+    coverage_index = column_index.get(args.coverage_col)
+    empty_row = '\t' * (len(metadata_cols) - 1)
+
     # Prepare for coverage plotting if requested
     coverage_data = [] if args.coverage_plot else None
     
-    # Open all requested output files
+    # Open all requested output files (FASTA outputs are binary so sequences pass through untouched)
     file_handles = {}
+    header_line = "\t".join(["strain", "strain_id"] + metadata_cols) + "\n"
     try:
         # TSV output (all records)
         if args.tsv_output:
-            tsv_out = open(args.tsv_output, 'w')
-            file_handles['tsv_out'] = tsv_out
-            tsv_out.write("\t".join(["strain", "strain_id"] + metadata_cols) + "\n")
+            file_handles['tsv_out'] = open(args.tsv_output, 'w')
+            file_handles['tsv_out'].write(header_line)
         
         # FASTA output (all records)
         if args.fasta_output:
-            file_handles['fasta_out'] = open(args.fasta_output, 'w')
+            file_handles['fasta_out'] = open(args.fasta_output, 'wb')
         
         # Filtered TSV output
         if args.filtered_tsv:
-            filtered_tsv_out = open(args.filtered_tsv, 'w')
-            file_handles['filtered_tsv_out'] = filtered_tsv_out
-            filtered_tsv_out.write("\t".join(["strain", "strain_id"] + metadata_cols) + "\n")
+            file_handles['filtered_tsv_out'] = open(args.filtered_tsv, 'w')
+            file_handles['filtered_tsv_out'].write(header_line)
         
         # Filtered FASTA output
         if args.filtered_fasta:
-            file_handles['filtered_fasta_out'] = open(args.filtered_fasta, 'w')
+            file_handles['filtered_fasta_out'] = open(args.filtered_fasta, 'wb')
+
+        tsv_out = file_handles.get('tsv_out')
+        fasta_out = file_handles.get('fasta_out')
+        filtered_tsv_out = file_handles.get('filtered_tsv_out')
+        filtered_fasta_out = file_handles.get('filtered_fasta_out')
 
         # Process each FASTA record
-        for record in stream_records(fasta_paths):
+        for description, seq in stream_records(fasta_paths, args.threads):
             # Parse record description to get strain ID
-            parts = record.description.split('/')
-            strain_id = parts[0].strip()
+            strain_id = description.split('/')[0].strip()
             
             # Initialize sequence ID components and metadata
             sequence_id_parts = [strain_id]  # Start with strain_id
-            meta_data = {col: '' for col in metadata_cols}
+            meta_row = metadata_map.get(strain_id)
             meets_coverage = False
-            coverage_value = 0.0
+            meets_qc = passes_qc_filters(meta_row, qc_filters, column_index) if qc_filters else True
             
             # Merge with metadata if available
-            if metadata_map and strain_id in metadata_map:
-                meta_row = metadata_map[strain_id]
-                
-                # Add genotype first if available
-                if 'genotype' in meta_row and meta_row['genotype']:
-                    sequence_id_parts.append(str(meta_row['genotype']))
-                
-                # Copy all metadata fields
-                for col in metadata_cols:
-                    if col in meta_row:
-                        meta_data[col] = str(meta_row[col])
-                
-                # Add collection_date last if available
-                if 'collection_date' in meta_row and meta_row['collection_date']:
-                    sequence_id_parts.append(str(meta_row['collection_date']))
+            if meta_row is not None:
+                # Add genotype first, collection_date last if available
+                if genotype_index is not None and meta_row[genotype_index]:
+                    sequence_id_parts.append(meta_row[genotype_index])
+                if date_index is not None and meta_row[date_index]:
+                    sequence_id_parts.append(meta_row[date_index])
                 
                 # Check coverage if available
                 if coverage_available:
-                    coverage_value = parse_coverage(meta_row.get(args.coverage_col))
+                    coverage_value = parse_coverage(meta_row[coverage_index])
                     meets_coverage = (coverage_value >= threshold_percent)
                     
                     # Collect data for plotting if requested
-                    if args.coverage_plot:
+                    if coverage_data is not None:
                         coverage_data.append({
                             'strain_id': strain_id,
                             'coverage_percent': coverage_value,
@@ -282,22 +365,23 @@ def main():
             # Construct final sequence ID (now with guaranteed order)
             strain = "|".join(sequence_id_parts)
             
-            # Prepare TSV output line
-            row_line = "\t".join([strain, strain_id] + 
-                        [meta_data[col] for col in metadata_cols]) + "\n"
+            # Prepare TSV line and FASTA record once; both go to full and filtered outputs
+            row_line = f"{strain}\t{strain_id}\t" + ("\t".join(meta_row) if meta_row is not None else empty_row) + "\n" \
+                if metadata_cols else f"{strain}\t{strain_id}\n"
+            fasta_record = b"".join((b">", strain.encode(), b"\n", seq, b"\n"))
             
             # Write to full outputs
-            if args.fasta_output:
-                file_handles['fasta_out'].write(f">{strain}\n{str(record.seq)}\n")
-            if args.tsv_output:
-                file_handles['tsv_out'].write(row_line)
+            if fasta_out:
+                fasta_out.write(fasta_record)
+            if tsv_out:
+                tsv_out.write(row_line)
             
-            # Write to filtered outputs if coverage passes (or no coverage check)
-            if (not coverage_available) or meets_coverage:
-                if args.filtered_fasta:
-                    file_handles['filtered_fasta_out'].write(f">{strain}\n{str(record.seq)}\n")
-                if args.filtered_tsv:
-                    file_handles['filtered_tsv_out'].write(row_line)
+            # Write to filtered outputs if coverage (or no coverage check) and QC filters pass
+            if ((not coverage_available) or meets_coverage) and meets_qc:
+                if filtered_fasta_out:
+                    filtered_fasta_out.write(fasta_record)
+                if filtered_tsv_out:
+                    filtered_tsv_out.write(row_line)
 
         # Generate coverage plot if requested and data exists
         if args.coverage_plot:
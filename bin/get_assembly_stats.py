@@ -7,18 +7,29 @@ Supports multiple plot types:
 - mapping-rate-bar
 - scatter
 - histogram
+
+The TSV files are parsed once into a single table and every type listed in
+--plot-types is rendered from it (Agg backend, one figure per worker process
+with --threads > 1). Bar plots with more than MAX_LABELLED_BARS samples are
+drawn binned by rank instead of one labelled bar per sample.
 """
 
 import argparse
 from pathlib import Path
-from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 import sys
 import csv
+import matplotlib
+matplotlib.use('Agg')
 import matplotlib.pyplot as plt
 import matplotlib.ticker as ticker
 import numpy as np
 import pandas as pd
 
+PLOT_TYPES = ['grouped-bar', 'stacked-bar', 'mapping-rate-bar', 'scatter', 'histogram']
+MAX_LABELLED_BARS = 500
+RANK_BINS = 100
+
 def process_file(file_path):
     """Extract sample metrics from a TSV file."""
     try:
@@ -39,25 +50,39 @@ def process_file(file_path):
         print(f"Error processing {file_path}: {str(e)}", file=sys.stderr)
         return None
 
-def plot_grouped_bar(data, output_path=None, title=None):
-    """Grouped bar plot of total and mapped reads."""
-    if not data:
-        print("No data available for plotting", file=sys.stderr)
-        return
-    
+def build_table(data):
+    """One table with every column the plots need."""
     df = pd.DataFrame(data)
-    if len(df) > 30:
+    df['unmapped_reads'] = df['total_reads'] - df['mapped_reads']
+    df['mapping_rate'] = (df['mapped_reads'] / df['total_reads'].replace(0, np.nan)).fillna(0)
+    return df
+
+def bin_by_rank(df, columns):
+    """Mean of columns over consecutive rank bins of an already sorted table."""
+    edges = np.linspace(0, len(df), min(RANK_BINS, len(df)) + 1).astype(int)
+    rank = np.searchsorted(edges, np.arange(len(df)), side='right') - 1
+    binned = df[columns].groupby(rank).mean()
+    binned['label'] = [f"{edges[i] + 1}-{edges[i + 1]}" for i in binned.index]
+    return binned
+
+def style_bar_axis(ax, df, labels, binned):
+    """Sample labels, or rank ranges when the bars are binned."""
+    x = np.arange(len(df))
+    ax.set_xticks(x)
+    ax.set_xticklabels(labels, rotation=90, ha='center', fontsize=6 if binned else None)
+    ax.set_xlabel('Sample rank (mean per bin)' if binned else 'Sample')
+    return x
+
+def plot_grouped_bar(df, title=None):
+    """Grouped bar plot of total and mapped reads."""
+    if 30 < len(df) <= MAX_LABELLED_BARS:
         print("Warning: too many samples for grouped bar plot, may be unreadable!", file=sys.stderr)
     
     df = df.sort_values('total_reads', ascending=False)
-    
-    data_long = pd.melt(
-        df,
-        id_vars=['strain_id'],
-        value_vars=['total_reads', 'mapped_reads'],
-        var_name='Read_Type',
-        value_name='Read_Count'
-    )
+    binned = len(df) > MAX_LABELLED_BARS
+    if binned:
+        df = bin_by_rank(df, ['total_reads', 'mapped_reads'])
+    labels = df['label'] if binned else df['strain_id']
     
     plt.style.use('default')
     fig, ax = plt.subplots(figsize=(14, 7))
@@ -67,153 +92,124 @@ def plot_grouped_bar(data, output_path=None, title=None):
     for spine in ['top', 'right']:
         ax.spines[spine].set_visible(False)
     
-    sample_ids = df['strain_id']
-    x = np.arange(len(sample_ids))
+    x = style_bar_axis(ax, df, labels, binned)
     width = 0.35
     colors = {"total_reads": "#0072B2", "mapped_reads": "#E69F00"}
     
     for i, (read_type, color) in enumerate(colors.items()):
-        subset = data_long[data_long['Read_Type'] == read_type]
         ax.bar(
             x + (i * width) - (width/2),
-            subset['Read_Count'],
+            df[read_type],
             width,
             color=color,
             label=read_type.replace('_', ' ').title()
         )
     
     ax.set_title(title or "Read Counts by Sample", pad=20)
-    ax.set_xlabel('Sample')
     ax.set_ylabel('Read Counts')
-    ax.set_xticks(x)
-    ax.set_xticklabels(sample_ids, rotation=90, ha='center')
     ax.yaxis.set_major_formatter(ticker.FuncFormatter(lambda x, _: f"{int(x):,}"))
     ax.legend(title='Read Type')
+    return fig
     
-    plt.tight_layout()
-    if output_path:
-        plt.savefig(output_path, dpi=300, bbox_inches='tight')
-    else:
-        plt.show()
-    plt.close()
-
-def plot_stacked_bar(data, output_path=None, title=None):
+def plot_stacked_bar(df, title=None):
     """Stacked bar plot of mapped and unmapped reads."""
-    if not data:
-        print("No data available for plotting", file=sys.stderr)
-        return
-    
-    df = pd.DataFrame(data)
-    if len(df) > 30:
+    if 30 < len(df) <= MAX_LABELLED_BARS:
         print("Warning: too many samples for stacked bar plot, may be unreadable!", file=sys.stderr)
     
-    df['unmapped_reads'] = df['total_reads'] - df['mapped_reads']
     df = df.sort_values('total_reads', ascending=False)
+    binned = len(df) > MAX_LABELLED_BARS
+    if binned:
+        df = bin_by_rank(df, ['mapped_reads', 'unmapped_reads'])
+    labels = df['label'] if binned else df['strain_id']
     
-    sample_ids = df['strain_id']
-    x = np.arange(len(sample_ids))
-    
-    plt.figure(figsize=(14, 7))
-    plt.bar(x, df['mapped_reads'], label='Mapped Reads', color='#4E79A7')
-    plt.bar(x, df['unmapped_reads'], bottom=df['mapped_reads'], label='Unmapped Reads', color='#D55E00')
+    fig, ax = plt.subplots(figsize=(14, 7))
+    x = style_bar_axis(ax, df, labels, binned)
+    ax.bar(x, df['mapped_reads'], label='Mapped Reads', color='#4E79A7')
+    ax.bar(x, df['unmapped_reads'], bottom=df['mapped_reads'], label='Unmapped Reads', color='#D55E00')
     
-    plt.title(title or 'Stacked Barplot of Reads by Sample')
-    plt.xlabel('Sample')
-    plt.ylabel('Read Counts')
-    plt.xticks(x, sample_ids, rotation=90, ha='center')
-    plt.legend()
-    plt.grid(axis='y', linestyle='--', alpha=0.5)
-    plt.tight_layout()
+    ax.set_title(title or 'Stacked Barplot of Reads by Sample')
+    ax.set_ylabel('Read Counts')
+    ax.legend()
+    ax.grid(axis='y', linestyle='--', alpha=0.5)
+    return fig
     
-    if output_path:
-        plt.savefig(output_path, dpi=300, bbox_inches='tight')
-    else:
-        plt.show()
-    plt.close()
-
-def plot_mapping_rate_bar(data, output_path=None, title=None):
+def plot_mapping_rate_bar(df, title=None):
     """Bar plot of mapping rate per sample."""
-    if not data:
-        print("No data available for plotting", file=sys.stderr)
-        return
-    
-    df = pd.DataFrame(data)
-    df['mapping_rate'] = df['mapped_reads'] / df['total_reads']
     df = df.sort_values('mapping_rate', ascending=False)
-    
-    plt.figure(figsize=(14, 6))
-    plt.bar(df['strain_id'], df['mapping_rate'], color='#4E79A7')
-    plt.ylabel('Mapping Rate')
-    plt.title(title or 'Mapping Rate by Sample')
-    plt.xticks(rotation=90, ha='center')
-    plt.ylim(0, 1.05)
-    plt.grid(axis='y', linestyle='--', alpha=0.5)
-    plt.tight_layout()
-    
-    if output_path:
-        plt.savefig(output_path, dpi=300, bbox_inches='tight')
-    else:
-        plt.show()
-    plt.close()
+    binned = len(df) > MAX_LABELLED_BARS
+    if binned:
+        df = bin_by_rank(df, ['mapping_rate'])
+    labels = df['label'] if binned else df['strain_id']
+    
+    fig, ax = plt.subplots(figsize=(14, 6))
+    x = style_bar_axis(ax, df, labels, binned)
+    ax.bar(x, df['mapping_rate'], color='#4E79A7')
+    ax.set_ylabel('Mapping Rate')
+    ax.set_title(title or 'Mapping Rate by Sample')
+    ax.set_ylim(0, 1.05)
+    ax.grid(axis='y', linestyle='--', alpha=0.5)
+    return fig
 
-def plot_scatter_total_vs_mapping_rate(data, output_path=None, title=None):
+def plot_scatter_total_vs_mapping_rate(df, title=None):
     """Scatter plot of total reads vs. mapping rate."""
-    if not data:
-        print("No data available for plotting", file=sys.stderr)
-        return
-    
-    df = pd.DataFrame(data)
-    df['mapping_rate'] = df['mapped_reads'] / df['total_reads']
-    
-    plt.figure(figsize=(8, 6))
-    plt.scatter(df['total_reads'], df['mapping_rate'], alpha=0.7, color='#4E79A7')
-    plt.xlabel('Total Reads')
-    plt.ylabel('Mapping Rate')
-    plt.title(title or 'Mapping Rate vs. Total Reads')
-    plt.grid(True, linestyle='--', alpha=0.5)
-    plt.tight_layout()
-    
-    if output_path:
-        plt.savefig(output_path, dpi=300, bbox_inches='tight')
-    else:
-        plt.show()
-    plt.close()
-
-def plot_mapping_rate_histogram(data, output_path=None, title=None):
+    fig, ax = plt.subplots(figsize=(8, 6))
+    ax.scatter(df['total_reads'], df['mapping_rate'], alpha=0.7, color='#4E79A7')
+    ax.set_xlabel('Total Reads')
+    ax.set_ylabel('Mapping Rate')
+    ax.set_title(title or 'Mapping Rate vs. Total Reads')
+    ax.grid(True, linestyle='--', alpha=0.5)
+    return fig
+    
+def plot_mapping_rate_histogram(df, title=None):
     """Histogram of mapping rates across samples."""
-    if not data:
-        print("No data available for plotting", file=sys.stderr)
-        return
-    
-    df = pd.DataFrame(data)
-    df['mapping_rate'] = df['mapped_reads'] / df['total_reads']
-    
-    plt.figure(figsize=(8, 6))
-    plt.hist(df['mapping_rate'], bins=30, color='#4E79A7', alpha=0.8)
-    plt.xlabel('Mapping Rate')
-    plt.ylabel('Number of Samples')
-    plt.title(title or 'Distribution of Mapping Rates')
-    plt.grid(axis='y', linestyle='--', alpha=0.5)
-    plt.tight_layout()
-    
-    if output_path:
-        plt.savefig(output_path, dpi=300, bbox_inches='tight')
-    else:
-        plt.show()
-    plt.close()
+    fig, ax = plt.subplots(figsize=(8, 6))
+    ax.hist(df['mapping_rate'], bins=30, color='#4E79A7', alpha=0.8)
+    ax.set_xlabel('Mapping Rate')
+    ax.set_ylabel('Number of Samples')
+    ax.set_title(title or 'Distribution of Mapping Rates')
+    ax.grid(axis='y', linestyle='--', alpha=0.5)
+    return fig
+    
+PLOTTERS = {
+    'grouped-bar': plot_grouped_bar,
+    'stacked-bar': plot_stacked_bar,
+    'mapping-rate-bar': plot_mapping_rate_bar,
+    'scatter': plot_scatter_total_vs_mapping_rate,
+    'histogram': plot_mapping_rate_histogram,
+}
+    
+def render_plot(plot_type, df, output_path, title=None, dpi=300):
+    """Render one plot type to output_path (runs in a worker process)."""
+    fig = PLOTTERS[plot_type](df, title=title)
+    fig.tight_layout()
+    fig.savefig(output_path, dpi=dpi, bbox_inches='tight')
+    plt.close(fig)
+    return output_path
+
+def plot_outputs(plot_types, output_plot):
+    """A single plot type keeps --output-plot; several get the type appended to its stem."""
+    path = Path(output_plot)
+    if len(plot_types) == 1:
+        return {plot_types[0]: str(path)}
+    return {t: str(path.with_name(f"{path.stem}_{t}{path.suffix}")) for t in plot_types}
 
 def main():
     parser = argparse.ArgumentParser(description='Process QC TSV files and generate read count plots.')
     parser.add_argument('--tsv-files', nargs='+', required=True, help='Input TSV files')
     parser.add_argument('--output-tsv', help='Output TSV file path')
-    parser.add_argument('--output-plot', help='Output plot file path')
+    parser.add_argument('--output-plot', default='read_mapping.png',
+                        help='Output plot file path; with several plot types the type is appended to the name')
     parser.add_argument('--plot-title', help='Title for the plot')
     parser.add_argument(
-        '--plot-type',
-        choices=['grouped-bar', 'stacked-bar', 'mapping-rate-bar', 'scatter', 'histogram'],
-        default='stacked-bar',
-        help='Type of plot to generate'
+        '--plot-types',
+        nargs='+',
+        choices=PLOT_TYPES,
+        default=None,
+        help='Plot types to render from one parse of the input files'
     )
+    parser.add_argument('--plot-type', choices=PLOT_TYPES, default='stacked-bar',
+                        help='Single plot type to generate (ignored when --plot-types is given)')
+    parser.add_argument('--dpi', type=int, default=300, help='Resolution of the saved plots')
     parser.add_argument('--threads', type=int, default=4, help='Number of processing threads')
     args = parser.parse_args()
     
@@ -228,22 +224,19 @@ def main():
             writer.writerows(valid_results)
     
     if valid_results:
-        plot_type = args.plot_type
-        
-        if plot_type == 'grouped-bar':
-            plot_grouped_bar(valid_results, output_path=args.output_plot, title=args.plot_title)
-        
-        elif plot_type == 'stacked-bar':
-            plot_stacked_bar(valid_results, output_path=args.output_plot, title=args.plot_title)
-        
-        elif plot_type == 'mapping-rate-bar':
-            plot_mapping_rate_bar(valid_results, output_path=args.output_plot, title=args.plot_title)
-        
-        elif plot_type == 'scatter':
-            plot_scatter_total_vs_mapping_rate(valid_results, output_path=args.output_plot, title=args.plot_title)
-        
-        elif plot_type == 'histogram':
-            plot_mapping_rate_histogram(valid_results, output_path=args.output_plot, title=args.plot_title)
+        df = build_table(valid_results)
+        plot_types = list(dict.fromkeys(args.plot_types or [args.plot_type]))
+        outputs = plot_outputs(plot_types, args.output_plot)
+        if len(plot_types) > 1 and args.threads > 1:
+            with ProcessPoolExecutor(max_workers=min(args.threads, len(plot_types))) as executor:
+                futures = [executor.submit(render_plot, t, df, outputs[t], args.plot_title, args.dpi) for t in plot_types]
+                for future in futures:
+                    future.result()
+        else:
+            for t in plot_types:
+                render_plot(t, df, outputs[t], args.plot_title, args.dpi)
+    else:
+        print("No data available for plotting", file=sys.stderr)
     
     print(f"Processed {len(valid_results)}/{len(args.tsv_files)} files", file=sys.stderr)
 
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Size-bounded eviction of cached global context sets.
+
+Each entry of cache_dir/global_context/<key>/ holds a downloaded context set
+(global.fasta, global_metadata.tsv) and, with MAFFT alignment, the alignment
+of its whole candidate pool (global_alignment.fas). The pipeline refreshes
+<key>/.last_access whenever a run reuses an entry. Once the entries exceed
+the size limit, the least recently used ones are removed first; entries used
+within --min-age-hours are kept, so runs still reading them are not broken.
+
+Usage:
+    global_context_cache.py --cache-dir /data/viralphyl_cache/global_context --max-gb 5 [--protect <key>]
+"""
+
+import argparse
+import fcntl
+import logging
+import os
+import shutil
+import time
+from reference_cache import dir_size  # Shared directory sizing bundled in bin/
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Evict least-recently-used global context sets above a size limit.")
+    parser.add_argument("--cache-dir", required=True, help="Directory holding the global context entries")
+    parser.add_argument("--max-gb", type=float, required=True, help="Size limit in GB for all entries")
+    parser.add_argument("--protect", action="append", default=[], help="Entry never evicted (repeatable)")
+    parser.add_argument("--min-age-hours", type=float, default=24,
+                        help="Entries used more recently than this are never evicted (default: 24)")
+    return parser.parse_args()
+
+
+# Last use of an entry: its .last_access marker, or the newest file written into it
+def last_access(entry_path):
+    marker = os.path.join(entry_path, ".last_access")
+    if os.path.exists(marker):
+        return os.path.getmtime(marker)
+    return max((os.path.getmtime(os.path.join(entry_path, name)) for name in os.listdir(entry_path)),
+               default=os.path.getmtime(entry_path))
+
+
+def evict(cache_dir, max_bytes, protect, min_age_seconds):
+    entries = []
+    for name in os.listdir(cache_dir):
+        path = os.path.join(cache_dir, name)
+        if os.path.isdir(path):
+            entries.append((last_access(path), name, dir_size(path)))
+
+    total = sum(size for _, _, size in entries)
+    removed = []
+    now = time.time()
+    for accessed, name, size in sorted(entries):
+        if total <= max_bytes:
+            break
+        if name in protect or now - accessed < min_age_seconds:
+            continue
+        shutil.rmtree(os.path.join(cache_dir, name), ignore_errors=True)
+        total -= size
+        removed.append(name)
+    return removed, total
+
+
+def main():
+    args = parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+    cache_dir = os.path.realpath(args.cache_dir)
+    protect = {os.path.basename(os.path.normpath(entry)) for entry in args.protect}
+    # One pruning task at a time, across runs sharing the cache
+    with open(os.path.join(cache_dir, ".evict.lock"), "a") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            removed, total = evict(cache_dir, int(args.max_gb * 1024 ** 3), protect, args.min_age_hours * 3600)
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+    for name in removed:
+        logging.info(f"Global context cache: evicted {name}")
+    logging.info(f"Global context cache: {total / 1024 ** 3:.2f} GB in {cache_dir}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""
+Clean NCBI virus metadata straight from a `datasets summary virus genome
+--as-json-lines` stream.
+
+Replaces `dataformat tsv virus-genome` followed by clean_global_metadata.py:
+each JSON line is parsed (orjson when installed, json otherwise), only the
+needed fields are projected, the completeness, length and collection-date
+filters are applied on the fly, and the cleaned row is written at once. The
+output has the columns and values of clean_global_metadata.py:
+
+    accession, geographic_location, region, isolate_collection_date, length, country, date
+
+Memory is bounded by the number of distinct locations and dates, whose
+cleaned forms are cached, not by the number of records.
+
+Usage:
+    datasets summary virus genome taxon <taxon> --as-json-lines | \\
+        ingest_datasets_jsonl.py --output taxon.cleaned.metadata.tsv --min-length 10000 --complete-only
+"""
+
+import argparse
+import gzip
+import logging
+import re
+import sys
+from datetime import datetime
+
+try:
+    import orjson
+    loads = orjson.loads
+except ImportError:
+    import json
+    loads = json.loads
+
+OUTPUT_COLUMNS = ['accession', 'geographic_location', 'region', 'isolate_collection_date', 'length', 'country', 'date']
+
+# Values the TSV route reads as missing (pandas' default NA strings)
+MISSING_VALUES = {'', '#N/A', '#N/A N/A', '#NA', '-1.#IND', '-1.#QNAN', '-NaN', '-nan', '1.#IND', '1.#QNAN',
+                  '<NA>', 'N/A', 'NA', 'NULL', 'NaN', 'None', 'n/a', 'nan', 'null'}
+
+# Collection date patterns and the completion each needs, as in clean_global_metadata.py
+DATE_FORMATS = [
+    (re.compile(r'\d{4}'), '-01-01'),
+    (re.compile(r'\d{4}-\d{2}'), '-01'),
+    (re.compile(r'\d{4}-\d{1,2}-\d{1,2}'), ''),
+]
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Stream datasets JSON lines into a cleaned metadata TSV.")
+    parser.add_argument("--input", default="-", help="JSON-lines report, optionally gzipped (default: stdin)")
+    parser.add_argument("--output", required=True, help="Cleaned metadata TSV")
+    parser.add_argument("--min-length", type=int, default=None, help="Minimum genome length")
+    parser.add_argument("--max-length", type=int, default=None, help="Maximum genome length")
+    parser.add_argument("--complete-only", action="store_true", help="Keep only records with completeness COMPLETE")
+    return parser.parse_args()
+
+
+def text(value):
+    """Field value as the TSV route would see it; None for missing values."""
+    if value is None:
+        return None
+    value = str(value)
+    return None if value in MISSING_VALUES else value
+
+
+def quote(value):
+    """Quotes a field the way DataFrame.to_csv does (separator, quote or line break inside)."""
+    if any(c in value for c in '\t"\r\n'):
+        return '"' + value.replace('"', '""') + '"'
+    return value
+
+
+def normalise_date(value):
+    for pattern, suffix in DATE_FORMATS:
+        if pattern.fullmatch(value):
+            try:
+                return datetime.strptime(value + suffix, '%Y-%m-%d').strftime('%Y-%m-%d')
+            except ValueError:
+                return ''
+    return ''
+
+
+def country_of(location):
+    return location.split(':', 1)[0].replace(' ', '_')
+
+
+class CleanedValues(dict):
+    """Caches the cleaned output fields of each distinct raw value."""
+
+    def __init__(self, clean):
+        super().__init__()
+        self.clean = clean
+
+    def __missing__(self, value):
+        cleaned = self[value] = self.clean(value)
+        return cleaned
+
+
+def main():
+    args = parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+    if args.input == "-":
+        stream = sys.stdin.buffer
+    else:
+        stream = gzip.open(args.input, "rb") if args.input.endswith(".gz") else open(args.input, "rb")
+
+    # Output fields of a location (itself and its country) and of a date (itself and the normalised date)
+    locations = CleanedValues(lambda v: (quote(v), quote(country_of(v))) if v is not None else ('', ''))
+    regions = CleanedValues(lambda v: quote(v) if v is not None else '')
+    dates = CleanedValues(lambda v: (quote(v), quote(normalise_date(v))))
+
+    read = kept = 0
+    skipped = {"incomplete": 0, "length": 0, "date": 0, "malformed": 0}
+    with stream, open(args.output, "w") as out:
+        out.write('\t'.join(OUTPUT_COLUMNS) + '\n')
+        for line in stream:
+            if not line.strip():
+                continue
+            read += 1
+            try:
+                record = loads(line)
+            except ValueError:
+                skipped["malformed"] += 1
+                continue
+
+            if args.complete_only and record.get("completeness") != "COMPLETE":
+                skipped["incomplete"] += 1
+                continue
+            length = record.get("length")
+            if (args.min_length is not None and (length is None or length < args.min_length)) or \
+                    (args.max_length is not None and (length is None or length > args.max_length)):
+                skipped["length"] += 1
+                continue
+            date = text((record.get("isolate") or {}).get("collectionDate"))
+            if date is None:
+                skipped["date"] += 1
+                continue
+
+            location = record.get("location") or {}
+            raw_location, country = locations[text(location.get("geographicLocation"))]
+            raw_date, normalised = dates[date]
+            out.write('\t'.join((quote(text(record.get("accession")) or ''), raw_location,
+                                 regions[text(location.get("geographicRegion"))], raw_date,
+                                 '' if length is None else str(int(length)), country, normalised)) + '\n')
+            kept += 1
+
+    logging.info(f"{kept} of {read} records kept "
+                 f"({', '.join(f'{n} {reason}' for reason, n in skipped.items() if n) or 'none skipped'})")
+    if read == 0:
+        logging.warning("No records in the datasets report")
+
+
+if __name__ == "__main__":
+    main()
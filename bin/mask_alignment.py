@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+"""
+Mask or drop noisy alignment columns and trim ragged ends before tree building.
+
+The MSA is encoded as a uint8 matrix (one row per sequence). Column
+statistics are computed in blocks of columns, so memory stays at the matrix
+plus one block of temporaries however large the alignment is:
+    gap_fraction        '-' and '.'
+    n_fraction          N and '?'
+    ambiguous_fraction  IUPAC codes other than N
+Columns above --max-gap, --max-n or --max-ambiguous are dropped (or replaced
+by N with --mode mask). Leading and trailing columns where fewer than
+--min-end-occupancy of the sequences have an A/C/G/T base are trimmed as
+ragged ends.
+
+With --compress-patterns only the first column of each distinct site pattern
+is kept and <output>.weights.txt gives the number of columns it stands for,
+for tree builders that accept site weights (FastTree does not, so the
+pipeline leaves it off).
+
+Outputs the processed alignment and a per-column report (1-based alignment
+position, fractions and action: keep, drop, mask, trim or pattern).
+
+Usage:
+    mask_alignment.py --alignment aln.fas --output aln.masked.fas --report aln.mask_report.tsv \\
+        --max-gap 0.9 --max-n 0.9 --min-end-occupancy 0.5
+"""
+
+import argparse
+import logging
+import sys
+import numpy as np
+from dedup_sequences import read_fasta  # Shared FASTA reader bundled in bin/
+
+BLOCK_COLUMNS = 4096
+
+
+def lookup(chars):
+    table = np.zeros(256, dtype=bool)
+    table[np.frombuffer(chars.encode(), dtype=np.uint8)] = True
+    return table
+
+
+IS_GAP = lookup("-.")
+IS_N = lookup("Nn?")
+IS_ACGT = lookup("ACGTacgt")
+IS_AMBIGUOUS = lookup("RYKMSWBDHVrykmswbdhv")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Vectorised alignment column masking and end trimming.")
+    parser.add_argument("--alignment", required=True, help="Input alignment (FASTA, optionally gzipped)")
+    parser.add_argument("--output", required=True, help="Processed alignment")
+    parser.add_argument("--report", default=None, help="Per-column report TSV")
+    parser.add_argument("--max-gap", type=float, default=0.9, help="Maximum gap fraction of a kept column (default: 0.9)")
+    parser.add_argument("--max-n", type=float, default=0.9, help="Maximum N fraction of a kept column (default: 0.9)")
+    parser.add_argument("--max-ambiguous", type=float, default=0.5,
+                        help="Maximum ambiguity-code fraction of a kept column (default: 0.5)")
+    parser.add_argument("--min-end-occupancy", type=float, default=0.5,
+                        help="Trim leading/trailing columns with fewer A/C/G/T sequences than this fraction (default: 0.5)")
+    parser.add_argument("--mode", choices=["drop", "mask"], default="drop",
+                        help="Drop failing columns, or keep coordinates and replace them with N (default: drop)")
+    parser.add_argument("--compress-patterns", action="store_true",
+                        help="Keep one column per distinct site pattern and write <output>.weights.txt")
+    return parser.parse_args()
+
+
+def load_alignment(path):
+    names, rows = [], []
+    for name, _, seq in read_fasta(path):
+        names.append(name)
+        rows.append(b"".join(seq.split()))
+    if not rows:
+        logging.error(f"No sequences found in {path}")
+        sys.exit(1)
+    width = len(rows[0])
+    bad = [name for name, row in zip(names, rows) if len(row) != width]
+    if bad:
+        logging.error(f"{len(bad)} sequence(s) differ in length from the first ({width}), e.g. {bad[0]}")
+        sys.exit(1)
+    return names, np.frombuffer(b"".join(rows), dtype=np.uint8).reshape(len(rows), width)
+
+
+def column_fractions(matrix):
+    """Per-column gap, N, ambiguity and A/C/G/T fractions, computed a block of columns at a time."""
+    n_rows, width = matrix.shape
+    fractions = {key: np.empty(width) for key in ("gap", "n", "ambiguous", "acgt")}
+    for start in range(0, width, BLOCK_COLUMNS):
+        block = matrix[:, start:start + BLOCK_COLUMNS]
+        for key, table in (("gap", IS_GAP), ("n", IS_N), ("ambiguous", IS_AMBIGUOUS), ("acgt", IS_ACGT)):
+            fractions[key][start:start + block.shape[1]] = table[block].sum(axis=0) / n_rows
+    return fractions
+
+
+def trimmed_ends(acgt_fraction, min_occupancy):
+    """Boolean mask of the leading and trailing columns below the occupancy threshold."""
+    occupied = np.flatnonzero(acgt_fraction >= min_occupancy)
+    trim = np.ones(acgt_fraction.size, dtype=bool)
+    if occupied.size:
+        trim[occupied[0]:occupied[-1] + 1] = False
+    return trim
+
+
+def first_of_each_pattern(matrix, columns):
+    """Indices (into columns) of the first column of each distinct site pattern, and pattern counts."""
+    if not columns.size:
+        return columns, np.zeros(0, dtype=np.int64)
+    patterns = np.ascontiguousarray(matrix[:, columns].T)
+    view = patterns.view(np.dtype((np.void, patterns.shape[1])))[:, 0]
+    _, first, counts = np.unique(view, return_index=True, return_counts=True)
+    order = np.argsort(first)
+    return first[order], counts[order]
+
+
+def main():
+    args = parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+    names, matrix = load_alignment(args.alignment)
+    fractions = column_fractions(matrix)
+    trim = trimmed_ends(fractions["acgt"], args.min_end_occupancy)
+    fail = ((fractions["gap"] > args.max_gap) | (fractions["n"] > args.max_n) |
+            (fractions["ambiguous"] > args.max_ambiguous)) & ~trim
+
+    action = np.full(matrix.shape[1], "keep", dtype=object)
+    action[fail] = args.mode
+    action[trim] = "trim"
+
+    if args.mode == "mask":
+        matrix = matrix.copy()
+        matrix[:, fail] = ord("N")
+        columns = np.flatnonzero(~trim)
+    else:
+        columns = np.flatnonzero(~trim & ~fail)
+
+    weights = None
+    if args.compress_patterns:
+        keep, weights = first_of_each_pattern(matrix, columns)
+        action[np.setdiff1d(columns, columns[keep])] = "pattern"
+        columns = columns[keep]
+
+    with open(args.output, "wb") as out:
+        for start in range(0, len(names), 1024):
+            block = matrix[start:start + 1024][:, columns]
+            for name, row in zip(names[start:start + 1024], block):
+                out.write(b">" + name.encode() + b"\n" + row.tobytes() + b"\n")
+    if weights is not None:
+        np.savetxt(f"{args.output}.weights.txt", weights, fmt="%d")
+
+    if args.report:
+        with open(args.report, "w") as out:
+            out.write("position\tgap_fraction\tn_fraction\tambiguous_fraction\tacgt_fraction\taction\n")
+            for i in range(matrix.shape[1]):
+                out.write(f"{i + 1}\t{fractions['gap'][i]:.4f}\t{fractions['n'][i]:.4f}\t"
+                          f"{fractions['ambiguous'][i]:.4f}\t{fractions['acgt'][i]:.4f}\t{action[i]}\n")
+
+    logging.info(f"{len(names)} sequences x {matrix.shape[1]} columns -> {columns.size} columns "
+                 f"({int(trim.sum())} trimmed at the ends, {int(fail.sum())} {'masked' if args.mode == 'mask' else 'dropped'})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+Merge reference-guided alignment chunks into one MSA in reference coordinates.
+
+Each chunk is the output of `mafft --keeplength --addfragments chunk.fasta
+reference.fasta`, so every row already has the length of the reference (or
+reference alignment). Chunks are concatenated in chunk order, the reference
+rows repeated in each chunk are dropped, and row lengths are checked.
+
+Usage:
+    merge_alignment_chunks.py --chunks chunk.1.fas chunk.2.fas ... --reference ref.fasta --output aln.fas
+"""
+
+import argparse
+import gzip
+import logging
+import re
+import sys
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Merge reference-guided alignment chunks.")
+    parser.add_argument("--chunks", nargs="+", required=True, help="Aligned chunk FASTA files (optionally gzipped)")
+    parser.add_argument("--reference", required=True, help="Reference FASTA the chunks were aligned to")
+    parser.add_argument("--keep-reference", action="store_true", help="Keep the reference row(s), once, at the top")
+    parser.add_argument("--output", required=True, help="Merged alignment")
+    return parser.parse_args()
+
+
+# Yields (name, record bytes, aligned length) for every record of a FASTA file
+def read_fasta(path):
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, "rb") as f:
+        data = f.read()
+    for chunk in data.split(b"\n>"):
+        chunk = chunk.lstrip(b">")
+        if not chunk.strip():
+            continue
+        header, _, seq = chunk.partition(b"\n")
+        name = header.split()[0].decode() if header.strip() else ""
+        yield name, b">" + chunk.rstrip(b"\n") + b"\n", len(b"".join(seq.split()))
+
+
+# Orders chunk files by the numbers in their names (chunk.2 before chunk.10)
+def natural_key(path):
+    return [int(part) if part.isdigit() else part for part in re.split(r"(\d+)", path)]
+
+
+def main():
+    args = parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+    reference_names = {name for name, _, _ in read_fasta(args.reference)}
+    width, written, seen = None, 0, set()
+    with open(args.output, "wb") as out:
+        for i, path in enumerate(sorted(args.chunks, key=natural_key)):
+            for name, record, length in read_fasta(path):
+                width = width or length
+                if length != width:
+                    logging.error(f"{name} in {path} has aligned length {length}, expected {width}")
+                    sys.exit(1)
+                if name in reference_names and (i > 0 or not args.keep_reference):
+                    continue
+                if name in seen:
+                    logging.warning(f"Duplicate sequence name {name} in {path}; keeping the first")
+                    continue
+                seen.add(name)
+                out.write(record)
+                written += 1
+
+    logging.info(f"Merged {len(args.chunks)} chunk(s): {written} aligned sequences of length {width}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+"""
+Persistent phylogeny workspace for incremental alignment and tree updates.
+
+Layout of the workspace directory:
+    alignment.fas       Alignment of the last run (representative sequences)
+    tree.nwk            FastTree tree of the last run
+    manifest.tsv        strain <TAB> sequence hash, one row per aligned sequence
+    workspace.json      Alignment method, counts and time of the last update
+    .lock               Advisory lock (fcntl.flock): shared while planning, exclusive while saving
+
+A workspace is complete only when all four files exist. save removes
+workspace.json before it replaces anything and writes it back last, so a plan
+reading an interrupted save sees an incomplete workspace and rebuilds.
+
+Subcommands:
+    plan    Compares the sequences of this run with the manifest. Sequences
+            that are new, or whose sequence changed, have to be added; those
+            no longer present are pruned from the stored alignment and tree.
+            If the share of changed sequences exceeds --rebuild-ratio, the
+            workspace is empty, or the alignment method changed, a full rebuild
+            is planned. Writes one of:
+                <prefix>.rebuild.fasta                           Full rebuild
+                <prefix>.base.fas, .base.tree, .new.fasta        Incremental update
+                <prefix>.current.fas, .current.tree              Nothing to add
+            plus <prefix>.workspace_plan.json describing the decision.
+    save    Stores the final alignment, tree and manifest of this run.
+
+Usage:
+    phylogeny_workspace.py plan --workspace DIR --fasta seqs.fasta --method mafft --rebuild-ratio 0.3 --prefix run
+    phylogeny_workspace.py save --workspace DIR --fasta seqs.fasta --alignment aln.fas --tree tree.nwk --method mafft
+"""
+
+import argparse
+import fcntl
+import json
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from Bio import Phylo
+from dedup_sequences import read_fasta, sequence_key  # Shared FASTA reader and sequence hash bundled in bin/
+
+FILES = {"alignment": "alignment.fas", "tree": "tree.nwk", "manifest": "manifest.tsv", "info": "workspace.json"}
+MIN_BASE_SEQUENCES = 3      # FastTree needs at least three taxa to start from
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Persistent workspace for incremental phylogeny updates.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    plan = subparsers.add_parser("plan", help="Decide between an incremental update and a full rebuild")
+    plan.add_argument("--workspace", required=True, help="Workspace directory")
+    plan.add_argument("--fasta", required=True, help="Sequences of this run")
+    plan.add_argument("--method", required=True, help="Alignment method; a change forces a rebuild")
+    plan.add_argument("--rebuild-ratio", type=float, default=0.3,
+                      help="Rebuild when (added + removed) / sequences exceeds this (default: 0.3)")
+    plan.add_argument("--prefix", required=True, help="Output file prefix")
+
+    save = subparsers.add_parser("save", help="Store the alignment, tree and manifest of this run")
+    save.add_argument("--workspace", required=True, help="Workspace directory")
+    save.add_argument("--fasta", required=True, help="Sequences of this run")
+    save.add_argument("--alignment", required=True, help="Final alignment")
+    save.add_argument("--tree", required=True, help="Final tree")
+    save.add_argument("--method", required=True, help="Alignment method used")
+    save.add_argument("--manifest-copy", default=None, help="Also write the saved manifest here")
+    return parser.parse_args()
+
+
+def workspace_path(workspace, key):
+    return os.path.join(workspace, FILES[key])
+
+
+@contextmanager
+def workspace_lock(workspace, exclusive):
+    """Hold the workspace lock, so that a plan never reads a save of another run half way through."""
+    os.makedirs(workspace, exist_ok=True)
+    with open(os.path.join(workspace, ".lock"), "a") as handle:
+        fcntl.flock(handle, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        try:
+            yield
+        finally:
+            fcntl.flock(handle, fcntl.LOCK_UN)
+
+
+def load_manifest(workspace):
+    manifest = {}
+    with open(workspace_path(workspace, "manifest")) as f:
+        next(f, None)
+        for line in f:
+            fields = line.rstrip("\n").split("\t")
+            if len(fields) == 2:
+                manifest[fields[0]] = fields[1]
+    return manifest
+
+
+def load_info(workspace):
+    try:
+        with open(workspace_path(workspace, "info")) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def current_sequences(fasta):
+    return {name: (record, sequence_key(seq).hex()) for name, record, seq in read_fasta(fasta)}
+
+
+def write_records(path, records):
+    with open(path, "wb") as out:
+        for record in records:
+            out.write(record)
+
+
+def plan(args):
+    current = current_sequences(args.fasta)
+    decision = {"workspace": args.workspace, "sequences": len(current)}
+    with workspace_lock(args.workspace, exclusive=False):
+        plan_against(args, current, decision)
+
+    with open(f"{args.prefix}.workspace_plan.json", "w") as f:
+        json.dump(decision, f, indent=2)
+    logging.info(f"Phylogeny workspace plan: {decision['mode']} ({decision['reason']})")
+
+
+def plan_against(args, current, decision):
+    complete = all(os.path.exists(workspace_path(args.workspace, key)) for key in FILES)
+    info = load_info(args.workspace) if complete else {}
+    if not complete:
+        started = any(os.path.exists(workspace_path(args.workspace, key)) for key in FILES)
+        reason = "incomplete workspace, a save was interrupted" if started else "no workspace yet"
+    elif info.get("method") != args.method:
+        reason = f"alignment method changed ({info.get('method')} -> {args.method})"
+    else:
+        manifest = load_manifest(args.workspace)
+        added = [name for name, (_, key) in current.items() if manifest.get(name) != key]
+        removed = {name for name, key in manifest.items() if name not in current or current[name][1] != key}
+        kept = len(manifest) - len(removed)
+        ratio = (len(added) + len(removed)) / max(len(current), 1)
+        decision.update(added=len(added), removed=len(removed), kept=kept, change_ratio=round(ratio, 4))
+        if ratio > args.rebuild_ratio:
+            reason = f"change ratio {ratio:.3f} above {args.rebuild_ratio}"
+        elif kept < MIN_BASE_SEQUENCES:
+            reason = f"only {kept} sequences left in the workspace"
+        else:
+            reason = None
+
+    if reason:
+        decision.update(mode="rebuild", reason=reason)
+        shutil.copyfile(args.fasta, f"{args.prefix}.rebuild.fasta")
+    else:
+        # Existing alignment and tree, keeping only manifest sequences that are still current
+        keep = set(manifest) - removed
+        mode = "incremental" if added else "unchanged"
+        stem = "base" if added else "current"
+        write_records(f"{args.prefix}.{stem}.fas", (record for name, record, _ in
+                                                    read_fasta(workspace_path(args.workspace, "alignment"))
+                                                    if name in keep))
+        tree = Phylo.read(workspace_path(args.workspace, "tree"), "newick")
+        for leaf in tree.get_terminals():
+            if leaf.name not in keep:
+                tree.prune(leaf)
+        Phylo.write(tree, f"{args.prefix}.{stem}.tree", "newick")
+        if added:
+            write_records(f"{args.prefix}.new.fasta", (current[name][0] for name in added))
+        decision.update(mode=mode, reason="within change ratio")
+
+
+def save(args):
+    current = current_sequences(args.fasta)
+    aligned = [name for name, _, _ in read_fasta(args.alignment)]
+    missing = [name for name in aligned if name not in current]
+    if missing:
+        logging.warning(f"{len(missing)} aligned sequence(s) not in the input FASTA are not recorded in the manifest")
+
+    with workspace_lock(args.workspace, exclusive=True):
+        write_workspace(args, current, aligned)
+        if args.manifest_copy:
+            shutil.copyfile(workspace_path(args.workspace, "manifest"), args.manifest_copy)
+    logging.info(f"Saved alignment and tree of {len(aligned)} sequences to {args.workspace}")
+
+
+def write_workspace(args, current, aligned):
+    staging = tempfile.mkdtemp(dir=args.workspace, prefix=".staging.")
+    try:
+        shutil.copyfile(args.alignment, os.path.join(staging, FILES["alignment"]))
+        shutil.copyfile(args.tree, os.path.join(staging, FILES["tree"]))
+        with open(os.path.join(staging, FILES["manifest"]), "w") as f:
+            f.write("strain\tsequence_hash\n")
+            for name in aligned:
+                if name in current:
+                    f.write(f"{name}\t{current[name][1]}\n")
+        with open(os.path.join(staging, FILES["info"]), "w") as f:
+            json.dump({"method": args.method, "sequences": len(aligned),
+                       "updated": time.strftime("%Y-%m-%dT%H:%M:%S")}, f, indent=2)
+        # Invalidate the workspace before replacing anything and validate it again last, so an
+        # interrupted save leaves an incomplete workspace that the next plan rebuilds
+        try:
+            os.remove(workspace_path(args.workspace, "info"))
+        except FileNotFoundError:
+            pass
+        for key in ("alignment", "tree", "manifest", "info"):
+            os.replace(os.path.join(staging, FILES[key]), workspace_path(args.workspace, key))
+    finally:
+        shutil.rmtree(staging, ignore_errors=True)
+
+
+def main():
+    args = parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    if args.command == "plan":
+        plan(args)
+    elif args.command == "save":
+        save(args)
+    else:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
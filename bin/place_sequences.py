@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Place new sequences on an existing tree as a starting tree for FastTree -intree.
+
+The alignment (existing plus newly added rows, e.g. from mafft --add
+--keeplength) is encoded as a NumPy uint8 matrix. Each new sequence is
+attached next to its nearest already-placed sequence by p-distance over the
+columns where both have a base (gaps and Ns ignored): the neighbour's leaf
+becomes a cherry of the neighbour and the new tip, each at half the distance.
+New sequences are placed one after another, so later ones can attach to
+earlier ones. FastTree then only refines this topology and its branch
+lengths instead of building a tree from scratch.
+
+Usage:
+    place_sequences.py --alignment updated.fas --tree base.tree --new new.fasta --output starting.tree
+"""
+
+import argparse
+import logging
+import sys
+import numpy as np
+from Bio import Phylo
+from Bio.Phylo.Newick import Clade
+from dedup_sequences import read_fasta  # Shared FASTA reader bundled in bin/
+
+# Gap, N and other non-ACGT characters do not count towards the distance
+_VALID = np.zeros(256, dtype=bool)
+_VALID[np.frombuffer(b"ACGTacgt", dtype=np.uint8)] = True
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Attach new sequences to their nearest neighbour on a tree.")
+    parser.add_argument("--alignment", required=True, help="Alignment holding both the tree's and the new sequences")
+    parser.add_argument("--tree", required=True, help="Existing Newick tree")
+    parser.add_argument("--new", required=True, help="FASTA of the new sequences (names only are used)")
+    parser.add_argument("--output", required=True, help="Starting tree with the new sequences placed")
+    return parser.parse_args()
+
+
+def load_alignment(path):
+    names, rows = [], []
+    for name, _, seq in read_fasta(path):
+        names.append(name)
+        rows.append(b"".join(seq.split()).upper())
+    width = max((len(r) for r in rows), default=0)
+    if any(len(r) != width for r in rows):
+        logging.error(f"Sequences in {path} are not all the same length")
+        sys.exit(1)
+    matrix = np.frombuffer(b"".join(rows), dtype=np.uint8).reshape(len(rows), width) if rows else np.empty((0, 0), np.uint8)
+    return names, matrix
+
+
+def p_distances(query, matrix, valid):
+    """p-distance of one aligned row to every row of a matrix, over shared valid columns."""
+    query_valid = _VALID[query]
+    shared = valid & query_valid
+    overlap = shared.sum(axis=1)
+    mismatches = ((matrix != query) & shared).sum(axis=1)
+    return np.where(overlap > 0, mismatches / np.maximum(overlap, 1), 1.0)
+
+
+def main():
+    args = parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+    names, matrix = load_alignment(args.alignment)
+    row_of = {name: i for i, name in enumerate(names)}
+    tree = Phylo.read(args.tree, "newick")
+    leaves = {leaf.name: leaf for leaf in tree.get_terminals()}
+
+    new_names = [name for name, _, _ in read_fasta(args.new) if name in row_of and name not in leaves]
+    placed = np.array([name in leaves for name in names], dtype=bool)
+    if not placed.any():
+        logging.error("None of the tree's sequences are in the alignment")
+        sys.exit(1)
+    valid = _VALID[matrix]
+
+    for name in new_names:
+        candidates = np.flatnonzero(placed)
+        dist = p_distances(matrix[row_of[name]], matrix[candidates], valid[candidates])
+        best = int(np.argmin(dist))
+        neighbour = leaves[names[candidates[best]]]
+        half = float(dist[best]) / 2
+
+        # The neighbour's leaf becomes an internal node over the neighbour and the new tip
+        neighbour_tip = Clade(branch_length=half, name=neighbour.name)
+        new_tip = Clade(branch_length=half, name=name)
+        neighbour.clades = [neighbour_tip, new_tip]
+        neighbour.name = None
+        leaves[neighbour_tip.name] = neighbour_tip
+        leaves[name] = new_tip
+        placed[row_of[name]] = True
+
+    Phylo.write(tree, args.output, "newick")
+    logging.info(f"Placed {len(new_names)} new sequence(s) on a tree of {len(leaves) - len(new_names)} tips")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+"""
+Amplicon depth heatmap, depth table and dropout calls from mosdepth region files.
+
+All *.regions.bed.gz files are loaded into one sample x amplicon NumPy matrix
+(columns ordered by the collapsed primer BED when given, else by start
+position). In one pass the script writes:
+    all_samples.<suffix>.amplicon_depth.tsv   Depth per sample and amplicon
+    all_samples.<suffix>.heatmap.tsv          log10(depth + 1), rows in heatmap order
+    all_samples.<suffix>.heatmap.{pdf,png}    Heatmap, samples ordered by UPGMA clustering
+    all_samples.<suffix>.dropouts.tsv         Amplicons below --dropout-depth per sample
+
+Usage:
+    plot_mosdepth_regions.py --input-files *.regions.bed.gz --amplicon-bed scheme.collapsed.bed \\
+        --output-dir ./ --output-suffix mosdepth --dropout-depth 20
+"""
+
+import argparse
+import gzip
+import logging
+import os
+import sys
+import matplotlib
+matplotlib.use("Agg")
+import matplotlib.pyplot as plt
+import numpy as np
+
+CELL_INCHES = 0.1969
+MARGIN_INCHES = 1.5
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Batched amplicon depth plots and dropout calls from mosdepth regions.")
+    parser.add_argument("--input-files", nargs="+", required=True, help="mosdepth regions output files (*.regions.bed.gz)")
+    parser.add_argument("--input-suffix", default=".regions.bed.gz", help="Filename suffix trimmed to get the sample name")
+    parser.add_argument("--amplicon-bed", default=None, help="Collapsed primer BED defining the amplicons and their order")
+    parser.add_argument("--output-dir", default="./", help="Output directory")
+    parser.add_argument("--output-suffix", default="regions", help="Output suffix")
+    parser.add_argument("--regions-prefix", default=None, help="Remove this prefix from region names")
+    parser.add_argument("--dropout-depth", type=float, default=20, help="Amplicons below this depth are dropouts (default: 20)")
+    parser.add_argument("--formats", nargs="+", choices=["pdf", "png"], default=["pdf"], help="Heatmap formats (default: pdf)")
+    return parser.parse_args()
+
+
+def region_name(name, prefix):
+    return name[len(prefix):] if prefix and name.startswith(prefix) else name
+
+
+# Returns (start, name, depth or score) for every region of a BED file
+def read_regions(path, prefix):
+    regions = []
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, "rt") as f:
+        for line in f:
+            fields = line.rstrip("\n").split("\t")
+            if len(fields) >= 5:
+                regions.append((int(fields[1]), region_name(fields[3], prefix), fields[4]))
+    return regions
+
+
+def load_matrix(files, suffix, amplicon_bed, prefix):
+    samples = sorted(os.path.basename(f).replace(suffix, "") for f in files)
+    per_sample = {os.path.basename(f).replace(suffix, ""): read_regions(f, prefix) for f in files}
+
+    if amplicon_bed:
+        amplicons = [name for _, name, _ in sorted(read_regions(amplicon_bed, prefix))]
+    else:
+        starts = {}
+        for regions in per_sample.values():
+            for start, name, _ in regions:
+                starts.setdefault(name, start)
+        amplicons = sorted(starts, key=lambda name: (starts[name], name))
+    column = {name: i for i, name in enumerate(dict.fromkeys(amplicons))}
+    amplicons = list(column)
+
+    # Amplicons missing from a sample's file stay NaN
+    matrix = np.full((len(samples), len(amplicons)), np.nan)
+    for row, sample in enumerate(samples):
+        for _, name, depth in per_sample[sample]:
+            if name in column:
+                matrix[row, column[name]] = float(depth)
+    return samples, amplicons, matrix
+
+
+# Leaf order of average-linkage (UPGMA) clustering on euclidean distances
+def upgma_order(values):
+    n = values.shape[0]
+    if n < 3:
+        return list(range(n))
+    norms = (values ** 2).sum(axis=1)
+    dist = np.sqrt(np.maximum(norms[:, None] + norms[None, :] - 2 * values @ values.T, 0))
+    np.fill_diagonal(dist, np.inf)
+    clusters = {i: [i] for i in range(n)}
+    active = list(range(n))
+    while len(active) > 1:
+        sub = dist[np.ix_(active, active)]
+        a, b = np.unravel_index(np.argmin(sub), sub.shape)
+        i, j = active[a], active[b]
+        size_i, size_j = len(clusters[i]), len(clusters[j])
+        # Merged cluster takes slot i; weighted average of the two rows
+        dist[i, :] = (dist[i, :] * size_i + dist[j, :] * size_j) / (size_i + size_j)
+        dist[:, i] = dist[i, :]
+        dist[i, i] = np.inf
+        clusters[i] = clusters[i] + clusters.pop(j)
+        active.remove(j)
+    return clusters[active[0]]
+
+
+def plot_heatmap(log_matrix, samples, amplicons, outfile):
+    height = CELL_INCHES * len(samples) + 2 * MARGIN_INCHES
+    width = CELL_INCHES * len(amplicons) + 2 * MARGIN_INCHES
+    fig, ax = plt.subplots(figsize=(max(width, 6), max(height, 4)))
+    image = ax.imshow(np.ma.masked_invalid(log_matrix), aspect="auto", cmap="cividis", vmin=0,
+                      vmax=max(3, np.nanmax(log_matrix) if np.isfinite(log_matrix).any() else 3), interpolation="none")
+    ax.set_xticks(np.arange(len(amplicons)))
+    ax.set_xticklabels(amplicons, rotation=90, fontsize=8, fontweight="bold")
+    ax.set_yticks(np.arange(len(samples)))
+    ax.set_yticklabels(samples, fontsize=8, fontweight="bold")
+    ax.yaxis.tick_right()
+    ax.set_title("Amplicon Median Coverage Heatmap", fontsize=14, fontweight="bold")
+    colorbar = fig.colorbar(image, ax=ax, orientation="horizontal", pad=0.08, fraction=0.02, aspect=40)
+    colorbar.set_ticks([0, 1, 2, 3])
+    colorbar.set_ticklabels(["0", "10", "100", "1000"])
+    colorbar.set_label("read depth", fontweight="bold")
+    fig.savefig(outfile, bbox_inches="tight", dpi=150)
+    plt.close(fig)
+
+
+def write_region_outputs(samples, amplicons, matrix, prefix, dropout_depth, formats=("pdf",)):
+    """Depth table, clustered heatmap (TSV and plots) and dropout calls for a sample x amplicon matrix."""
+    with open(f"{prefix}.amplicon_depth.tsv", "w") as f:
+        f.write("sample\t" + "\t".join(amplicons) + "\n")
+        for sample, row in zip(samples, matrix):
+            f.write(sample + "\t" + "\t".join("NA" if np.isnan(v) else f"{v:g}" for v in row) + "\n")
+
+    log_matrix = np.log10(matrix + 1)
+    order = upgma_order(np.nan_to_num(log_matrix))
+    ordered_samples = [samples[i] for i in order]
+    log_matrix = log_matrix[order]
+
+    with open(f"{prefix}.heatmap.tsv", "w") as f:
+        f.write("sample\t" + "\t".join(amplicons) + "\n")
+        for sample, row in zip(ordered_samples, log_matrix):
+            f.write(sample + "\t" + "\t".join("NA" if np.isnan(v) else f"{v:.6g}" for v in row) + "\n")
+
+    for fmt in formats:
+        plot_heatmap(log_matrix, ordered_samples, amplicons, f"{prefix}.heatmap.{fmt}")
+
+    # Missing amplicons count as dropouts
+    dropout = ~(matrix >= dropout_depth)
+    with open(f"{prefix}.dropouts.tsv", "w") as f:
+        f.write("sample\tamplicons\tdropouts\tpercent_dropout\tmedian_depth\tdropout_amplicons\n")
+        for sample, row, mask in zip(samples, matrix, dropout):
+            median = np.nanmedian(row) if np.isfinite(row).any() else 0
+            names = ",".join(a for a, m in zip(amplicons, mask) if m)
+            f.write(f"{sample}\t{len(amplicons)}\t{int(mask.sum())}\t{100 * mask.mean():.2f}\t{median:g}\t{names}\n")
+
+    logging.info(f"{len(samples)} samples x {len(amplicons)} amplicons; "
+                 f"{int(dropout.sum())} amplicon dropouts below depth {dropout_depth:g}")
+
+
+def main():
+    args = parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+    missing = [f for f in args.input_files if not os.path.exists(f)]
+    if missing:
+        logging.error(f"The following input files don't exist: {' '.join(missing)}")
+        sys.exit(1)
+
+    samples, amplicons, matrix = load_matrix(args.input_files, args.input_suffix, args.amplicon_bed, args.regions_prefix)
+    if not amplicons:
+        logging.error("Input files must have region information (name and depth columns) for heatmap generation")
+        sys.exit(1)
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    prefix = os.path.join(args.output_dir, f"all_samples.{args.output_suffix.strip('.')}")
+    write_region_outputs(samples, amplicons, matrix, prefix, args.dropout_depth, args.formats)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,355 @@
+#!/usr/bin/env python3
+"""
+Alignment-free preview tree from MinHash sketch distances.
+
+Identical sequences are collapsed first and return on the tree as zero-length
+polytomies. Every remaining sequence is sketched (sketch_utils), and the
+all-against-all Mash distances are read through the sorted sketch index, one
+row per sequence. A neighbour-joining tree is built on the distance matrix
+in NumPy: the active matrix is kept compact (the joined pair is replaced by
+the new node and the last active row), and Q is scanned a block of rows at a
+time. The tree is rooted at its midpoint.
+
+Outputs the preview tree in Newick and, with --metadata and --auspice-config,
+an auspice v2 JSON with the metadata as node attributes and the colorings
+and filters of generate_auspice_config.py (colour scales from --colors).
+Branch lengths and divergence are Mash distances, not substitutions per site
+from an alignment.
+
+Usage:
+    preview_tree.py --fasta sequences.fasta --output-tree preview.nwk \\
+        --metadata metadata.tsv --auspice-config auspice_config.json --colors colors.tsv \\
+        --output-json preview_auspice_tree.json
+"""
+
+import argparse
+import csv
+import json
+import logging
+import sys
+import time
+from collections import defaultdict
+import numpy as np
+from dedup_sequences import read_fasta, sequence_key  # Shared FASTA reader and sequence hash bundled in bin/
+from sketch_utils import (DEFAULT_KMER, DEFAULT_SKETCH_SIZE, pairwise_distances,
+                          sketch_sequence)  # Shared sketching helpers bundled in bin/
+
+Q_BLOCK_ROWS = 64
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Neighbour-joining preview tree from sketch distances.")
+    parser.add_argument("--fasta", required=True, help="Sequences to place on the tree (optionally gzipped)")
+    parser.add_argument("--output-tree", required=True, help="Output Newick tree")
+    parser.add_argument("--metadata", default=None, help="Metadata TSV with a strain column")
+    parser.add_argument("--auspice-config", default=None, help="auspice_config.json from generate_auspice_config.py")
+    parser.add_argument("--colors", default=None, help="colors.tsv from generate_auspice_config.py")
+    parser.add_argument("--output-json", default=None, help="Output auspice v2 JSON")
+    parser.add_argument("--kmer", type=int, default=DEFAULT_KMER, help=f"k-mer size (default: {DEFAULT_KMER})")
+    parser.add_argument("--sketch-size", type=int, default=DEFAULT_SKETCH_SIZE,
+                        help=f"Hashes kept per sketch (default: {DEFAULT_SKETCH_SIZE})")
+    return parser.parse_args()
+
+
+def collapse_identical(path):
+    """Representative names in input order, their sequences, and the duplicates of each."""
+    names, sequences, first_of, members = [], [], {}, defaultdict(list)
+    for name, _, seq in read_fasta(path):
+        key = sequence_key(seq)
+        if key in first_of:
+            members[first_of[key]].append(name)
+            continue
+        first_of[key] = name
+        names.append(name)
+        sequences.append(b"".join(seq.split()))
+    return names, sequences, members
+
+
+def sketch_distances(sequences, k, sketch_size):
+    sketches = [sketch_sequence(seq, k, sketch_size) for seq in sequences]
+    empty = sum(1 for s in sketches if not s.size)
+    if empty:
+        logging.warning(f"{empty} sequence(s) have no valid {k}-mers and sit at distance 1 from all others")
+    return pairwise_distances(sketches, k)
+
+
+def neighbour_joining(dist):
+    """Unrooted NJ tree as an adjacency list {node: [(neighbour, length), ...]}; leaves are 0..n-1."""
+    n = dist.shape[0]
+    adjacency = defaultdict(list)
+    if n == 1:
+        adjacency[0] = []
+        return adjacency
+
+    # float32 halves the memory traffic of the Q scans; row sums stay float64
+    d = dist.astype(np.float32)
+    node = np.arange(n)
+    r = d.sum(axis=1, dtype=np.float64)
+    buffer = np.empty((Q_BLOCK_ROWS, n), dtype=np.float32)
+    next_node = n
+    m = n
+    while m > 2:
+        # Q(i, j) = (m - 2) d(i, j) - r(i) - r(j) over j >= i, minimised a block of rows at a time
+        r32 = r[:m].astype(np.float32)
+        best, i, j = np.inf, 0, 1
+        for start in range(0, m - 1, Q_BLOCK_ROWS):
+            stop = min(start + Q_BLOCK_ROWS, m - 1)
+            q = buffer[:stop - start, :m - start]
+            np.multiply(d[start:stop, start:m], m - 2, out=q)
+            np.subtract(q, r32[start:stop, None], out=q)
+            np.subtract(q, r32[None, start:m], out=q)
+            q[np.arange(stop - start), np.arange(stop - start)] = np.inf
+            flat = int(np.argmin(q))
+            row, column = divmod(flat, m - start)
+            if q[row, column] < best:
+                best = q[row, column]
+                i, j = start + row, start + column
+        i, j = min(i, j), max(i, j)
+
+        dij = d[i, j]
+        li = min(max(dij / 2 + (r[i] - r[j]) / (2 * (m - 2)), 0.0), dij)
+        lj = dij - li
+        u = next_node
+        next_node += 1
+        for child, length in ((node[i], li), (node[j], lj)):
+            adjacency[u].append((child, length))
+            adjacency[child].append((u, length))
+
+        du = (d[i, :m] + d[j, :m] - dij) / 2
+        r[:m] += du - d[i, :m] - d[j, :m]
+        d[i, :m] = du
+        d[:m, i] = du
+        d[i, i] = 0.0
+        r[i] = du.sum() - du[j]
+        node[i] = u
+
+        # The last active row takes the place of j, so the active block stays d[:m, :m]
+        last = m - 1
+        if j != last:
+            d[j, :m] = d[last, :m]
+            d[:m, j] = d[:m, last]
+            d[j, j] = 0.0
+            r[j] = r[last]
+            node[j] = node[last]
+        m -= 1
+
+    a, b = node[0], node[1]
+    adjacency[a].append((b, d[0, 1]))
+    adjacency[b].append((a, d[0, 1]))
+    return adjacency
+
+
+def farthest(adjacency, start):
+    """Farthest node from start, with the parent of each node on the way."""
+    distance, parent = {start: 0.0}, {start: None}
+    stack = [start]
+    while stack:
+        current = stack.pop()
+        for neighbour, length in adjacency[current]:
+            if neighbour not in distance:
+                distance[neighbour] = distance[current] + length
+                parent[neighbour] = current
+                stack.append(neighbour)
+    end = max(distance, key=distance.get)
+    return end, distance, parent
+
+
+def midpoint_root(adjacency):
+    """Rooted tree as {node: [(child, length), ...]} plus the root id, rooted halfway along the longest path."""
+    start = next(iter(adjacency))
+    a, _, _ = farthest(adjacency, start)
+    b, distance, parent = farthest(adjacency, a)
+    half = distance[b] / 2
+
+    # Walk from b towards a until the midpoint falls on the edge (child, upper)
+    child = b
+    while parent[child] is not None and distance[parent[child]] > half:
+        child = parent[child]
+    upper = parent[child]
+    root = max(adjacency) + 1
+    if upper is None:
+        root_edges = [(child, 0.0)]
+    else:
+        edge = distance[child] - distance[upper]
+        below = distance[child] - half
+        root_edges = [(child, below), (upper, edge - below)]
+
+    children = {root: root_edges}
+    visited = {root} | {node for node, _ in root_edges}
+    stack = [node for node, _ in root_edges]
+    while stack:
+        current = stack.pop()
+        children[current] = []
+        for neighbour, length in adjacency[current]:
+            if neighbour not in visited:
+                visited.add(neighbour)
+                children[current].append((neighbour, length))
+                stack.append(neighbour)
+    return children, root
+
+
+def newick_name(name):
+    if any(c in name for c in " \t()[]:;,'"):
+        return "'" + name.replace("'", "''") + "'"
+    return name
+
+
+def write_newick(path, children, root, label):
+    """Iterative writer, so deep ladder-like trees do not hit the recursion limit."""
+    parts = []
+    stack = [("open", root, None)]
+    while stack:
+        action, current, length = stack.pop()
+        if action == "open":
+            kids = children.get(current, [])
+            if kids:
+                parts.append("(")
+                stack.append(("close", current, length))
+                for position, (kid, kid_length) in enumerate(reversed(kids)):
+                    stack.append(("open", kid, kid_length))
+                    if position < len(kids) - 1:
+                        stack.append(("comma", None, None))
+            else:
+                parts.append(newick_name(label[current]))
+                if length is not None:
+                    parts.append(f":{length:.6g}")
+        elif action == "comma":
+            parts.append(",")
+        else:
+            parts.append(")")
+            if length is not None:
+                parts.append(f":{length:.6g}")
+    with open(path, "w") as out:
+        out.write("".join(parts) + ";\n")
+
+
+def load_metadata(path):
+    with open(path, newline="") as f:
+        reader = csv.reader(f, delimiter="\t")
+        header = next(reader, [])
+        lower = [column.lower() for column in header]
+        key = lower.index("strain") if "strain" in lower else 0
+        return header, {row[key]: row for row in reader if len(row) > key}
+
+
+def auspice_meta(config, colors_path, header):
+    scales = defaultdict(list)
+    if colors_path:
+        with open(colors_path, newline="") as f:
+            for row in csv.reader(f, delimiter="\t"):
+                if len(row) >= 3:
+                    scales[row[0].lower()].append([row[1], row[2]])
+
+    columns = {column.lower(): column for column in header}
+    colorings = []
+    for coloring in config.get("colorings", []):
+        if coloring.get("key", "").lower() not in columns:
+            continue
+        coloring = dict(coloring, key=columns[coloring["key"].lower()])
+        if scales.get(coloring["key"].lower()):
+            coloring["scale"] = scales[coloring["key"].lower()]
+        colorings.append(coloring)
+
+    meta = {
+        "title": f"Preview: {config.get('title', 'sketch distance tree')}",
+        "updated": time.strftime("%Y-%m-%d"),
+        "maintainers": config.get("maintainers", []),
+        "build_url": config.get("build_url", ""),
+        "colorings": colorings,
+        "filters": [columns[f.lower()] for f in config.get("filters", []) if f.lower() in columns],
+        "panels": ["tree"],     # No map or entropy: the preview has no coordinates or alignment
+        "description": "Neighbour-joining tree of MinHash sketch (Mash) distances; "
+                       "branch lengths are approximate and not from an alignment.",
+    }
+    if scales:
+        meta["display_defaults"] = {"color_by": next((c["key"] for c in colorings if "scale" in c), "div")}
+    return meta
+
+
+def write_auspice(path, children, root, label, meta, header, metadata):
+    """auspice v2 JSON, streamed node by node for the same reason as write_newick."""
+    keep = [(position, column) for position, column in enumerate(header) if column.lower() != "strain"]
+
+    def node_open(current, div):
+        attrs = {"div": round(div, 8)}
+        row = metadata.get(label.get(current))
+        if row:
+            for position, column in keep:
+                if position < len(row) and row[position].strip():
+                    attrs[column] = {"value": row[position]}
+        name = label.get(current, f"NODE_{current:07d}")
+        return '{"name":' + json.dumps(name) + ',"node_attrs":' + json.dumps(attrs) + ',"branch_attrs":{}'
+
+    parts = ['{"version":"v2","meta":', json.dumps(meta), ',"tree":']
+    stack = [("open", root, 0.0)]
+    while stack:
+        action, current, div = stack.pop()
+        if action == "open":
+            parts.append(node_open(current, div))
+            kids = children.get(current, [])
+            if kids:
+                parts.append(',"children":[')
+                stack.append(("close", None, None))
+                for position, (kid, length) in enumerate(reversed(kids)):
+                    stack.append(("open", kid, div + length))
+                    if position < len(kids) - 1:
+                        stack.append(("comma", None, None))
+            else:
+                parts.append("}")
+        elif action == "comma":
+            parts.append(",")
+        else:
+            parts.append("]}")
+    parts.append("}")
+    with open(path, "w") as out:
+        out.write("".join(parts) + "\n")
+
+
+def main():
+    args = parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+    names, sequences, members = collapse_identical(args.fasta)
+    if not names:
+        logging.error(f"No sequences found in {args.fasta}")
+        sys.exit(1)
+    logging.info(f"{len(names)} distinct sequences ({sum(map(len, members.values()))} identical duplicates collapsed)")
+
+    started = time.time()
+    dist = sketch_distances(sequences, args.kmer, args.sketch_size)
+    logging.info(f"Sketch distances computed in {time.time() - started:.1f} s")
+    started = time.time()
+    adjacency = neighbour_joining(dist)
+    children, root = midpoint_root(adjacency)
+    logging.info(f"Neighbour-joining tree built in {time.time() - started:.1f} s")
+
+    # Duplicates come back as a zero-length polytomy in place of their representative's leaf
+    label = dict(enumerate(names))
+    next_node = root + 1
+    for leaf, name in enumerate(names):
+        if name in members:
+            kids = []
+            for member in [name] + members[name]:
+                label[next_node] = member
+                kids.append((next_node, 0.0))
+                next_node += 1
+            children[leaf] = kids
+            del label[leaf]
+
+    write_newick(args.output_tree, children, root, label)
+
+    if args.output_json:
+        if not (args.metadata and args.auspice_config):
+            logging.error("--output-json needs --metadata and --auspice-config")
+            sys.exit(1)
+        header, metadata = load_metadata(args.metadata)
+        with open(args.auspice_config) as f:
+            config = json.load(f)
+        write_auspice(args.output_json, children, root, label, auspice_meta(config, args.colors, header),
+                      header, metadata)
+
+    logging.info(f"Preview tree of {len(label)} sequences written to {args.output_tree}")
+
+
+if __name__ == "__main__":
+    main()
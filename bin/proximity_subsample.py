@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+"""
+Proximity-focused subsampling of the global context sequences.
+
+All candidate global sequences and the query consensus genomes are sketched
+with MinHash (sketch_utils.py). The context set is then built in two steps:
+    1. Nearest neighbours: the closest global sequences to each query, taken
+       rank by rank across queries (1st nearest of every query, then 2nd, ...)
+       up to --neighbours per query and at most half of --max-sequences.
+    2. Diversity fill: the rest of the budget is filled by farthest-point
+       (k-centre) selection on sketch distance, so each pick is the candidate
+       furthest from everything already chosen (queries included). Picks
+       respect the --group-by groups: every group is capped at the largest
+       per-group count that fits the remaining budget, as augur filter does,
+       and the cap is raised one step at a time if budget is left over.
+
+Outputs the selected sequences and metadata rows (input order and columns
+unchanged) and a report of why each sequence was kept.
+
+Usage:
+    proximity_subsample.py --global-fasta global.fasta --global-metadata global.tsv \\
+        --query-fasta high_coverage.fasta --max-sequences 250 --group-by country year month \\
+        --output-fasta subsampled.fasta --output-metadata subsampled.tsv --report report.tsv
+"""
+
+import argparse
+import csv
+import logging
+import random
+import sys
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from sketch_utils import DEFAULT_KMER, DEFAULT_SKETCH_SIZE, build_index, distances_to_index, sketch_sequence
+
+DATE_PARTS = {"year": 0, "month": 1, "day": 2}
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Nearest-neighbour and diversity subsampling of global sequences.")
+    parser.add_argument("--global-fasta", required=True, help="Candidate global sequences")
+    parser.add_argument("--global-metadata", required=True, help="Metadata TSV of the global sequences (strain column)")
+    parser.add_argument("--query-fasta", nargs="*", default=[], help="Query consensus FASTA file(s)")
+    parser.add_argument("--max-sequences", type=int, required=True, help="Number of global sequences to keep")
+    parser.add_argument("--neighbours", type=int, default=3, help="Nearest neighbours kept per query (default: 3)")
+    parser.add_argument("--group-by", nargs="*", default=[],
+                        help="Metadata columns to group by; year, month and day are read from the date column")
+    parser.add_argument("--id-column", default="strain", help="Metadata column matching the FASTA names (default: strain)")
+    parser.add_argument("--seed", type=int, default=None, help="Seed used to break ties (default: random)")
+    parser.add_argument("--kmer", type=int, default=DEFAULT_KMER, help=f"k-mer size (default: {DEFAULT_KMER})")
+    parser.add_argument("--sketch-size", type=int, default=DEFAULT_SKETCH_SIZE,
+                        help=f"MinHash sketch size (default: {DEFAULT_SKETCH_SIZE})")
+    parser.add_argument("--threads", type=int, default=1, help="Threads used for sketching")
+    parser.add_argument("--output-fasta", required=True, help="Subsampled global FASTA")
+    parser.add_argument("--output-metadata", required=True, help="Subsampled global metadata TSV")
+    parser.add_argument("--report", default=None, help="TSV of selected sequences and the reason each was kept")
+    return parser.parse_args()
+
+
+# Returns {name: (record bytes, sequence bytes)} in file order
+def read_fasta(path):
+    with open(path, "rb") as f:
+        data = f.read()
+    records = {}
+    for chunk in data.split(b"\n>"):
+        chunk = chunk.lstrip(b">")
+        if not chunk.strip():
+            continue
+        header, _, seq = chunk.partition(b"\n")
+        records[header.split()[0].decode()] = (b">" + chunk.rstrip(b"\n") + b"\n", b"".join(seq.split()))
+    return records
+
+
+def group_key(row, group_by):
+    key = []
+    for column in group_by:
+        if column in DATE_PARTS:
+            parts = (row.get("date") or "").split("-")
+            index = DATE_PARTS[column]
+            key.append(parts[index] if len(parts) > index else "")
+        else:
+            key.append(row.get(column, ""))
+    return tuple(key)
+
+
+# Largest per-group count whose total fits the budget
+def group_cap(sizes, budget):
+    if not sizes or sum(sizes) <= budget:
+        return max(sizes, default=0)
+    low, high = 0, max(sizes)
+    while low < high:
+        mid = (low + high + 1) // 2
+        if sum(min(size, mid) for size in sizes) <= budget:
+            low = mid
+        else:
+            high = mid - 1
+    return low
+
+
+def nearest_neighbours(query_dist, per_query, budget):
+    """Picks neighbours rank by rank across queries; returns [(candidate, query index, distance)]."""
+    ranked = np.argsort(query_dist, axis=1, kind="stable")
+    picked, seen = [], set()
+    for rank in range(min(per_query, ranked.shape[1])):
+        for q in range(ranked.shape[0]):
+            if len(picked) >= budget:
+                return picked
+            candidate = int(ranked[q, rank])
+            if candidate not in seen:
+                seen.add(candidate)
+                picked.append((candidate, q, float(query_dist[q, candidate])))
+    return picked
+
+
+def diversity_fill(index, sketches, min_dist, groups, selected, budget, k, rng):
+    """Farthest-point selection within per-group caps; returns [(candidate, distance to selection)]."""
+    chosen = set(selected)
+    sizes = {}
+    for i, group in enumerate(groups):
+        if i not in chosen:
+            sizes[group] = sizes.get(group, 0) + 1
+    cap = group_cap(list(sizes.values()), budget)
+    taken = dict.fromkeys(sizes, 0)
+    group_ids = {group: i for i, group in enumerate(sizes)}
+    group_of = np.array([group_ids.get(g, -1) for g in groups])
+
+    available = np.array([i not in chosen for i in range(len(groups))], dtype=bool)
+    # Tiny seeded jitter breaks ties between equally distant candidates
+    score = min_dist + np.array([rng.random() for _ in groups]) * 1e-9
+    picked = []
+    while available.any() and len(picked) < budget:
+        full = [group_ids[g] for g, n in taken.items() if n >= cap]
+        eligible = available & ~np.isin(group_of, full)
+        if not eligible.any():
+            # Every group is at its cap; raise it by one to use the leftover budget
+            cap += 1
+            continue
+        best = int(np.argmax(np.where(eligible, score, -np.inf)))
+        picked.append((best, float(min_dist[best])))
+        available[best] = False
+        taken[groups[best]] += 1
+        update = distances_to_index(sketches[best], index, k)
+        min_dist = np.minimum(min_dist, update)
+        score = np.minimum(score, update)
+    return picked
+
+
+def main():
+    args = parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    rng = random.Random(args.seed)
+
+    records = read_fasta(args.global_fasta)
+    with open(args.global_metadata, newline="") as f:
+        reader = csv.DictReader(f, delimiter="\t")
+        fieldnames = reader.fieldnames or []
+        rows = [row for row in reader if row.get(args.id_column) in records]
+    if args.id_column not in fieldnames:
+        logging.error(f"Column '{args.id_column}' not found in {args.global_metadata}")
+        sys.exit(1)
+    missing = [c for c in args.group_by if c not in DATE_PARTS and c not in fieldnames]
+    if missing:
+        logging.warning(f"Group-by column(s) not in metadata, ignored: {', '.join(missing)}")
+    group_by = [c for c in args.group_by if c not in missing]
+
+    names = [row[args.id_column] for row in rows]
+    if len(names) <= args.max_sequences:
+        logging.info(f"{len(names)} candidate sequences within the budget of {args.max_sequences}; keeping all")
+        selected = {name: ("all", "", "") for name in names}
+    else:
+        query_names, queries = [], []
+        for path in args.query_fasta:
+            for name, (_, seq) in read_fasta(path).items():
+                query_names.append(name)
+                queries.append(seq)
+
+        with ThreadPoolExecutor(max_workers=max(1, args.threads)) as executor:
+            sketches = list(executor.map(lambda n: sketch_sequence(records[n][1], args.kmer, args.sketch_size), names))
+            query_sketches = list(executor.map(lambda s: sketch_sequence(s, args.kmer, args.sketch_size), queries))
+        index = build_index(sketches)
+
+        query_dist = np.array([distances_to_index(s, index, args.kmer) for s in query_sketches]).reshape(len(queries), len(names))
+        neighbours = nearest_neighbours(query_dist, args.neighbours, args.max_sequences // 2)
+
+        min_dist = query_dist.min(axis=0) if len(queries) else np.ones(len(names))
+        for candidate, _, _ in neighbours:
+            min_dist = np.minimum(min_dist, distances_to_index(sketches[candidate], index, args.kmer))
+
+        groups = [group_key(row, group_by) for row in rows]
+        fill = diversity_fill(index, sketches, min_dist, groups, [c for c, _, _ in neighbours],
+                              args.max_sequences - len(neighbours), args.kmer, rng)
+
+        selected = {names[c]: ("neighbour", query_names[q], f"{d:.5f}") for c, q, d in neighbours}
+        selected.update({names[c]: ("diversity", "", f"{d:.5f}") for c, d in fill})
+        logging.info(f"Selected {len(neighbours)} nearest neighbours of {len(queries)} queries and "
+                     f"{len(fill)} diverse representatives from {len(names)} candidates")
+
+    with open(args.output_metadata, "w", newline="") as out:
+        writer = csv.DictWriter(out, fieldnames=fieldnames, delimiter="\t", lineterminator="\n")
+        writer.writeheader()
+        writer.writerows(row for row in rows if row[args.id_column] in selected)
+    with open(args.output_fasta, "wb") as out:
+        for name in names:
+            if name in selected:
+                out.write(records[name][0])
+    if args.report:
+        with open(args.report, "w") as out:
+            out.write("strain\tselection\tnearest_query\tdistance\n")
+            for name in names:
+                if name in selected:
+                    out.write(f"{name}\t" + "\t".join(selected[name]) + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,255 @@
+#!/usr/bin/env python3
+"""
+Streaming read QC for ONT FASTQ files, a lightweight replacement for per-sample NanoPlot.
+
+Reads are processed in chunks: quality strings of a chunk are joined into one
+byte buffer and per-read mean Q is computed with NumPy (error-probability
+average, as NanoPlot does). Each FASTQ file is reduced to fixed-size
+accumulators, so memory does not grow with the number of reads:
+    - exact read-length counts up to MAX_EXACT_LENGTH (longer reads kept in a list)
+    - mean-Q histogram in 0.1 Q bins
+    - 2D histogram of log10(read length) vs mean Q
+
+Files are processed in a process pool and merged per sample. Outputs:
+    <sample>.read_qc.json              Summary and histograms per sample
+    read_qc_general_stats_mqc.tsv      MultiQC general statistics
+    read_length_mqc.json               MultiQC line graph of read lengths
+    read_quality_mqc.json              MultiQC line graph of mean read quality
+
+Usage:
+    read_qc_stats.py --samples samples.tsv --outdir ./ --threads 8
+    (samples.tsv: "sample_id<TAB>fastq file or directory" per line)
+"""
+
+import argparse
+import glob
+import gzip
+import json
+import logging
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+
+CHUNK_READS = 20000
+MAX_EXACT_LENGTH = 200000
+Q_BIN_WIDTH = 0.1
+MAX_Q = 60
+LOG_LENGTH_BINS = np.linspace(0, 6, 61)        # log10(length) from 1 bp to 1 Mb
+MEAN_Q_BINS_2D = np.arange(0, MAX_Q + 1, 1.0)
+FASTQ_SUFFIXES = (".fastq.gz", ".fq.gz", ".fastq", ".fq")
+
+# Phred score -> error probability, indexed by raw quality byte
+ERROR_PROB = np.zeros(256, dtype=np.float64)
+ERROR_PROB[33:127] = 10 ** (-np.arange(0, 94) / 10)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Streaming read QC statistics with MultiQC output.")
+    parser.add_argument("--samples", required=True, help="TSV of sample_id and FASTQ file or directory")
+    parser.add_argument("--outdir", default=".", help="Output directory (default: current directory)")
+    parser.add_argument("--threads", type=int, default=1, help="Worker processes (default: 1)")
+    return parser.parse_args()
+
+
+def empty_accumulator():
+    return {
+        "length_counts": np.zeros(MAX_EXACT_LENGTH + 1, dtype=np.int64),
+        "long_lengths": [],
+        "q_hist": np.zeros(int(MAX_Q / Q_BIN_WIDTH) + 1, dtype=np.int64),
+        "hist2d": np.zeros((len(LOG_LENGTH_BINS) - 1, len(MEAN_Q_BINS_2D) - 1), dtype=np.int64),
+        "q_sum": 0.0,
+    }
+
+
+def merge(acc, other):
+    acc["length_counts"] += other["length_counts"]
+    acc["long_lengths"].extend(other["long_lengths"])
+    acc["q_hist"] += other["q_hist"]
+    acc["hist2d"] += other["hist2d"]
+    acc["q_sum"] += other["q_sum"]
+    return acc
+
+
+# Adds one chunk of reads (lengths and concatenated quality bytes) to the accumulator
+def add_chunk(acc, lengths, qualities):
+    lengths = np.asarray(lengths, dtype=np.int64)
+    nonzero = lengths > 0
+    probs = ERROR_PROB[np.frombuffer(b"".join(qualities), dtype=np.uint8)]
+    offsets = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+
+    mean_q = np.zeros(lengths.size)
+    if nonzero.any():
+        sums = np.add.reduceat(probs, offsets[nonzero]) if probs.size else np.zeros(nonzero.sum())
+        mean_q[nonzero] = -10 * np.log10(np.maximum(sums / lengths[nonzero], 1e-10))
+    mean_q = np.clip(mean_q, 0, MAX_Q)
+
+    exact = lengths <= MAX_EXACT_LENGTH
+    acc["length_counts"] += np.bincount(lengths[exact], minlength=MAX_EXACT_LENGTH + 1)
+    acc["long_lengths"].extend(lengths[~exact].tolist())
+    acc["q_hist"] += np.bincount(np.round(mean_q / Q_BIN_WIDTH).astype(np.int64), minlength=acc["q_hist"].size)
+    hist2d, _, _ = np.histogram2d(np.log10(np.maximum(lengths, 1)), mean_q, bins=[LOG_LENGTH_BINS, MEAN_Q_BINS_2D])
+    acc["hist2d"] += hist2d.astype(np.int64)
+    acc["q_sum"] += float(mean_q.sum())
+
+
+def open_fastq(path):
+    return gzip.open(path, "rb") if path.endswith(".gz") else open(path, "rb")
+
+
+# Streams one FASTQ file into an accumulator
+def process_file(path):
+    acc = empty_accumulator()
+    lengths, qualities = [], []
+    with open_fastq(path) as f:
+        while True:
+            header = f.readline()
+            if not header:
+                break
+            seq = f.readline().rstrip(b"\r\n")
+            f.readline()
+            qual = f.readline().rstrip(b"\r\n")
+            if len(qual) != len(seq):
+                raise ValueError(f"Malformed FASTQ record in {path}: {header.strip()!r}")
+            lengths.append(len(seq))
+            qualities.append(qual)
+            if len(lengths) >= CHUNK_READS:
+                add_chunk(acc, lengths, qualities)
+                lengths, qualities = [], []
+    if lengths:
+        add_chunk(acc, lengths, qualities)
+    return acc
+
+
+def list_fastqs(path):
+    if os.path.isdir(path):
+        return sorted(f for f in glob.glob(os.path.join(path, "*")) if f.endswith(FASTQ_SUFFIXES))
+    return [path]
+
+
+# Reduces an accumulator to summary statistics
+def summarise(acc):
+    counts = acc["length_counts"]
+    long_lengths = np.sort(np.asarray(acc["long_lengths"], dtype=np.int64))
+    reads = int(counts.sum()) + long_lengths.size
+    if reads == 0:
+        return {"reads": 0, "bases": 0, "mean_length": 0, "median_length": 0, "n50": 0,
+                "max_length": 0, "mean_q": 0, "median_q": 0, "pct_q10": 0}
+
+    lengths = np.arange(counts.size)
+    bases = int((counts * lengths).sum() + long_lengths.sum())
+
+    # Walk the length distribution from longest to shortest for N50
+    cum_long = np.cumsum(long_lengths[::-1])
+    if cum_long.size and cum_long[-1] >= bases / 2:
+        n50 = int(long_lengths[::-1][np.searchsorted(cum_long, bases / 2)])
+    else:
+        done = cum_long[-1] if cum_long.size else 0
+        cum_exact = done + np.cumsum((counts * lengths)[::-1])
+        n50 = int(counts.size - 1 - np.searchsorted(cum_exact, bases / 2))
+
+    # Median length from the exact counts (long reads sit above every exact bin)
+    half = (reads + 1) / 2
+    cum_counts = np.cumsum(counts)
+    median_length = int(np.searchsorted(cum_counts, half)) if cum_counts[-1] >= half else int(
+        long_lengths[int(half - cum_counts[-1]) - 1])
+
+    q_hist = acc["q_hist"]
+    q_cum = np.cumsum(q_hist)
+    q10_bin = int(round(10 / Q_BIN_WIDTH))
+    return {
+        "reads": reads,
+        "bases": bases,
+        "mean_length": round(bases / reads, 1),
+        "median_length": median_length,
+        "n50": n50,
+        "max_length": int(long_lengths[-1]) if long_lengths.size else int(np.flatnonzero(counts)[-1]),
+        "mean_q": round(acc["q_sum"] / reads, 2),
+        "median_q": round(float(np.searchsorted(q_cum, reads / 2)) * Q_BIN_WIDTH, 1),
+        "pct_q10": round(100 * float(q_hist[q10_bin:].sum()) / reads, 2),
+    }
+
+
+def length_curve(acc, bin_width=500):
+    counts = acc["length_counts"]
+    binned = np.add.reduceat(counts, np.arange(0, counts.size, bin_width))
+    curve = {int(i * bin_width): int(c) for i, c in enumerate(binned) if c}
+    for length in acc["long_lengths"]:
+        key = int(length // bin_width * bin_width)
+        curve[key] = curve.get(key, 0) + 1
+    return dict(sorted(curve.items()))
+
+
+def quality_curve(acc):
+    return {round(i * Q_BIN_WIDTH, 1): int(c) for i, c in enumerate(acc["q_hist"]) if c}
+
+
+def write_multiqc(outdir, summaries, curves):
+    with open(os.path.join(outdir, "read_qc_general_stats_mqc.tsv"), "w") as f:
+        f.write("# id: 'read_qc'\n# section_name: 'Read QC'\n# plot_type: 'generalstats'\n")
+        f.write("Sample\tReads\tBases (Mb)\tMean length\tRead N50\tMean Q\tReads >Q10 (%)\n")
+        for sample, s in sorted(summaries.items()):
+            f.write(f"{sample}\t{s['reads']}\t{s['bases'] / 1e6:.2f}\t{s['mean_length']}\t{s['n50']}\t"
+                    f"{s['mean_q']}\t{s['pct_q10']}\n")
+
+    for name, title, xlab, key in [
+        ("read_length", "Read length distribution", "Read length (bp)", "lengths"),
+        ("read_quality", "Mean read quality distribution", "Mean read Q", "qualities"),
+    ]:
+        with open(os.path.join(outdir, f"{name}_mqc.json"), "w") as f:
+            json.dump({
+                "id": name,
+                "section_name": title,
+                "plot_type": "linegraph",
+                "pconfig": {"id": f"{name}_plot", "title": title, "xlab": xlab, "ylab": "Reads"},
+                "data": {sample: curves[sample][key] for sample in sorted(curves)},
+            }, f)
+
+
+def main():
+    args = parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+    samples = {}
+    with open(args.samples) as f:
+        for line in f:
+            fields = line.rstrip("\n").split("\t")
+            if len(fields) >= 2 and fields[0]:
+                samples.setdefault(fields[0], []).extend(list_fastqs(fields[1]))
+    if not samples:
+        logging.error(f"No samples found in {args.samples}")
+        sys.exit(1)
+
+    # One task per FASTQ file so large barcodes are split across workers too
+    tasks = [(sample, path) for sample, paths in samples.items() for path in paths]
+    accumulators = {sample: empty_accumulator() for sample in samples}
+    with ProcessPoolExecutor(max_workers=max(1, args.threads)) as executor:
+        for (sample, path), acc in zip(tasks, executor.map(process_file, [p for _, p in tasks])):
+            merge(accumulators[sample], acc)
+
+    os.makedirs(args.outdir, exist_ok=True)
+    summaries, curves = {}, {}
+    for sample, acc in accumulators.items():
+        summaries[sample] = summarise(acc)
+        curves[sample] = {"lengths": length_curve(acc), "qualities": quality_curve(acc)}
+        with open(os.path.join(args.outdir, f"{sample}.read_qc.json"), "w") as f:
+            json.dump({
+                "sample": sample,
+                "files": len(samples[sample]),
+                "summary": summaries[sample],
+                "length_histogram": curves[sample]["lengths"],
+                "mean_q_histogram": curves[sample]["qualities"],
+                "length_vs_mean_q": {
+                    "log10_length_bins": LOG_LENGTH_BINS.tolist(),
+                    "mean_q_bins": MEAN_Q_BINS_2D.tolist(),
+                    "counts": acc["hist2d"].tolist(),
+                },
+            }, f, indent=2)
+        logging.info(f"{sample}: {summaries[sample]['reads']} reads, N50 {summaries[sample]['n50']}, "
+                     f"mean Q {summaries[sample]['mean_q']}")
+
+    write_multiqc(args.outdir, summaries, curves)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,264 @@
+#!/usr/bin/env python3
+"""
+Persistent, content-addressed cache for reference sets and their minimap2 indexes.
+
+Layout of the cache directory:
+    refsets/<sha256>/reference.fasta      Reference multi-FASTA exactly as fetched
+    refsets/<sha256>/sequences/<id>.fa    One FASTA per accession
+    refsets/<sha256>/indexes/<id>.mmi     minimap2 index per accession
+    refsets/<sha256>/derived/<name>       Files derived from the set (e.g. clustered representatives)
+    taxa/<taxid>.fasta                    Symlink to the reference set of a taxid
+    manifest.json                         Size and last access time of each reference set
+    locks/                                Advisory lock files (fcntl.flock)
+
+Reference sets are keyed by the SHA-256 of the reference FASTA, so identical
+downloads share one entry. Entries are evicted least-recently-used first once
+the total size exceeds the configured limit. A task holds a shared lock on
+every reference set it uses (locks/<sha256>.use.lock) until it exits, and
+eviction skips sets it cannot lock exclusively, so concurrent tasks and runs
+never lose the references or indexes they are mapping against.
+
+Can also be run directly to inspect or prune a cache:
+    reference_cache.py --cache-dir /data/viralphyl_cache --max-gb 20 --prune
+"""
+
+import argparse
+import fcntl
+import hashlib
+import json
+import logging
+import os
+import shutil
+import tempfile
+import time
+from contextlib import contextmanager
+
+
+# Returns the SHA-256 hex digest of a file, read in fixed-size chunks
+def file_sha256(path, chunk_size=8 * 1024 * 1024):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+# Returns the total size in bytes of all files below a directory
+def dir_size(path):
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+
+class ReferenceCache:
+    def __init__(self, cache_dir, max_size_gb=None):
+        self.cache_dir = os.path.realpath(cache_dir)
+        self.max_size_bytes = int(max_size_gb * 1024 ** 3) if max_size_gb else None
+        self.hits = 0
+        self.misses = 0
+        self._in_use = {}
+        for sub in ("refsets", "taxa", "locks"):
+            os.makedirs(os.path.join(self.cache_dir, sub), exist_ok=True)
+
+    @contextmanager
+    def lock(self, name="manifest"):
+        """Hold an exclusive advisory lock shared by every task using this cache."""
+        lock_path = os.path.join(self.cache_dir, "locks", f"{name}.lock")
+        with open(lock_path, "a") as handle:
+            fcntl.flock(handle, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(handle, fcntl.LOCK_UN)
+
+    def _use_lock_path(self, key):
+        return os.path.join(self.cache_dir, "locks", f"{key}.use.lock")
+
+    def use(self, key):
+        """Hold a shared lock on a reference set until the process exits, so that eviction skips it."""
+        if key not in self._in_use:
+            handle = open(self._use_lock_path(key), "a")
+            fcntl.flock(handle, fcntl.LOCK_SH)
+            self._in_use[key] = handle
+
+    def _manifest_path(self):
+        return os.path.join(self.cache_dir, "manifest.json")
+
+    def _read_manifest(self):
+        try:
+            with open(self._manifest_path()) as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+    def _write_manifest(self, manifest):
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, prefix=".manifest.")
+        with os.fdopen(fd, "w") as f:
+            json.dump(manifest, f, indent=2)
+        os.replace(tmp_path, self._manifest_path())
+
+    def refset_dir(self, key):
+        return os.path.join(self.cache_dir, "refsets", key)
+
+    def _touch(self, key):
+        """Refresh size and last access time of a reference set in the manifest."""
+        with self.lock():
+            manifest = self._read_manifest()
+            manifest[key] = {
+                "size": dir_size(self.refset_dir(key)),
+                "last_access": time.time(),
+            }
+            self._write_manifest(manifest)
+
+    def store_refset(self, fasta_path, taxid=None):
+        """Register a reference FASTA and return its cache key."""
+        key = file_sha256(fasta_path)
+        refset = self.refset_dir(key)
+        # Taken before the set is checked: an eviction in progress finishes first and the set is rebuilt
+        self.use(key)
+        with self.lock(key):
+            if not os.path.exists(os.path.join(refset, "reference.fasta")):
+                os.makedirs(os.path.join(refset, "sequences"), exist_ok=True)
+                os.makedirs(os.path.join(refset, "indexes"), exist_ok=True)
+                fd, tmp_path = tempfile.mkstemp(dir=refset, prefix=".reference.")
+                os.close(fd)
+                shutil.copyfile(fasta_path, tmp_path)
+                os.replace(tmp_path, os.path.join(refset, "reference.fasta"))
+
+        if taxid is not None and not os.path.exists(os.path.join(self.cache_dir, "taxa", f"{taxid}.fasta")):
+            self.link_taxid(taxid, key)
+        self._touch(key)
+        return key
+
+    def link_taxid(self, taxid, key):
+        """Point taxa/<taxid>.fasta at the reference set so later runs can skip the download."""
+        link_path = os.path.join(self.cache_dir, "taxa", f"{taxid}.fasta")
+        target = os.path.join(self.refset_dir(key), "reference.fasta")
+        tmp_link = f"{link_path}.{os.getpid()}.tmp"
+        try:
+            os.symlink(target, tmp_link)
+            os.replace(tmp_link, link_path)
+        except OSError as e:
+            logging.warning(f"Could not link taxid {taxid} in reference cache: {e}")
+
+    def get_sequence(self, key, ref_id, record_writer):
+        """Return the cached per-accession FASTA, writing it with record_writer(path) on a miss."""
+        seq_path = os.path.join(self.refset_dir(key), "sequences", f"{ref_id}.fa")
+        if not os.path.exists(seq_path):
+            with self.lock(key):
+                if not os.path.exists(seq_path):
+                    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(seq_path), prefix=f".{ref_id}.")
+                    os.close(fd)
+                    record_writer(tmp_path)
+                    os.replace(tmp_path, seq_path)
+        return seq_path
+
+    def derived_path(self, key, name):
+        return os.path.join(self.refset_dir(key), "derived", name)
+
+    def store_derived(self, key, path, name):
+        """Copy a file derived from a reference set into the cache, next to the set it came from."""
+        dest = self.derived_path(key, name)
+        os.makedirs(os.path.dirname(dest), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(dest), prefix=f".{name}.")
+        os.close(fd)
+        shutil.copyfile(path, tmp_path)
+        os.replace(tmp_path, dest)
+        return dest
+
+    def get_index(self, key, ref_id, ref_fasta, index_builder):
+        """Return the cached .mmi for a reference, building it with index_builder(fasta, dest) on a miss."""
+        index_path = os.path.join(self.refset_dir(key), "indexes", f"{ref_id}.mmi")
+        if os.path.exists(index_path):
+            self.hits += 1
+            return index_path
+
+        # Per-reference lock so concurrent tasks wait for one build instead of racing
+        with self.lock(f"{key}.{ref_id}"):
+            if os.path.exists(index_path):
+                self.hits += 1
+                return index_path
+            self.misses += 1
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(index_path), prefix=f".{ref_id}.", suffix=".mmi")
+            os.close(fd)
+            try:
+                index_builder(ref_fasta, tmp_path)
+                os.replace(tmp_path, index_path)
+            finally:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+        return index_path
+
+    def finalize(self, key):
+        """Record the final size of a reference set and evict old entries if over the limit."""
+        self._touch(key)
+        self.evict(protect={key})
+
+    def evict(self, protect=()):
+        """Remove least-recently-used reference sets until the cache fits the size limit.
+
+        Sets in use by any task, this one included, are skipped.
+        """
+        if not self.max_size_bytes:
+            return []
+        removed = []
+        with self.lock():
+            manifest = self._read_manifest()
+            total = sum(entry.get("size", 0) for entry in manifest.values())
+            for key, entry in sorted(manifest.items(), key=lambda kv: kv[1].get("last_access", 0)):
+                if total <= self.max_size_bytes:
+                    break
+                if key in protect:
+                    continue
+                with open(self._use_lock_path(key), "a") as handle:
+                    try:
+                        fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    except BlockingIOError:
+                        logging.info(f"Reference cache: {key} is in use, not evicted")
+                        continue
+                    shutil.rmtree(self.refset_dir(key), ignore_errors=True)
+                    fcntl.flock(handle, fcntl.LOCK_UN)
+                total -= entry.get("size", 0)
+                del manifest[key]
+                removed.append(key)
+            self._write_manifest(manifest)
+
+        # Drop taxid links that now point at evicted reference sets
+        taxa_dir = os.path.join(self.cache_dir, "taxa")
+        for name in os.listdir(taxa_dir):
+            link_path = os.path.join(taxa_dir, name)
+            if os.path.islink(link_path) and not os.path.exists(link_path):
+                os.remove(link_path)
+
+        for key in removed:
+            logging.info(f"Reference cache: evicted {key}")
+        return removed
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect or prune the viralphyl reference cache")
+    parser.add_argument("--cache-dir", required=True, help="Reference cache directory")
+    parser.add_argument("--max-gb", type=float, default=None, help="Size limit in GB used by --prune")
+    parser.add_argument("--prune", action="store_true", help="Evict least-recently-used entries above --max-gb")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+    cache = ReferenceCache(args.cache_dir, args.max_gb)
+    if args.prune:
+        cache.evict()
+
+    manifest = cache._read_manifest()
+    total = sum(entry.get("size", 0) for entry in manifest.values())
+    logging.info(f"{len(manifest)} reference set(s), {total / 1024 ** 3:.2f} GB in {cache.cache_dir}")
+
+
+if __name__ == "__main__":
+    main()
@@ -3,8 +3,11 @@
 import os
 import re
 import argparse
+import json
+import tempfile
 import pandas as pd
 import sys
+from concurrent.futures import ThreadPoolExecutor
 from dateutil import parser as date_parser  # Renamed to avoid conflicts
 
 __author__ = "Samuel Odoyo"
@@ -50,27 +53,196 @@ def normalize_barcode(barcode):
         barcode = barcode.zfill(2)  # Ensure 2-digit format
     return f"barcode{barcode}"
 
-def find_barcode_dirs(base_dir):
-    """Recursively find all barcode directories with format 'barcodeXX'."""
-    base_dir = os.path.realpath(base_dir)
+BARCODE_PATTERN = re.compile(r"^barcode\d{2}$", re.IGNORECASE)
+RUN_PATTERN = re.compile(r"(?i)(?:\w*[-_]*)?(run\d+)(?:[-_]\w*)?")
+
+# MinKNOW output trees that never hold usable barcode directories
+PRUNED_DIR_PREFIXES = ("pod5", "fast5")
+DEFAULT_MAX_DEPTH = 10
+MANIFEST_VERSION = 1
+
+def is_pruned_dir(name):
+    """Return True for fastq_fail, pod5* and fast5* trees, which are never descended into."""
+    lowered = name.lower()
+    return "fastq_fail" in lowered or lowered.startswith(PRUNED_DIR_PREFIXES)
+
+def list_directory(path, dir_cache, seen_dirs):
+    """Return (subdirectory names, barcode directory names) of a directory.
+
+    When the directory mtime matches the manifest entry the cached listing is reused
+    and the directory is not read again; only changed directories are rescanned.
+    Listings are recorded in seen_dirs for the next manifest.
+    """
+    mtime_ns = os.stat(path).st_mtime_ns
+    cached = dir_cache.get(path)
+    if cached and cached["mtime_ns"] == mtime_ns:
+        seen_dirs[path] = cached
+        return cached["dirs"], cached["barcodes"]
+
+    subdirs, barcodes = [], []
+    with os.scandir(path) as entries:
+        for entry in entries:
+            try:
+                if not entry.is_dir():
+                    continue
+            except OSError:
+                continue
+            if BARCODE_PATTERN.match(entry.name):
+                barcodes.append(entry.name)
+            # Like os.walk, do not follow symlinked directories while descending
+            if not entry.is_symlink() and not is_pruned_dir(entry.name):
+                subdirs.append(entry.name)
+
+    seen_dirs[path] = {"mtime_ns": mtime_ns, "dirs": subdirs, "barcodes": barcodes}
+    return subdirs, barcodes
+
+def scan_tree(top, in_run, depth, max_depth, dir_cache):
+    """Iteratively scan one subtree and return (barcode directories, directory listings seen).
+
+    A barcode directory is reported when any directory on its path (including those
+    above the base directory) matches the run pattern. Barcode directories are leaves:
+    their contents are not scanned.
+    """
     barcode_dirs = []
-
-    barcode_pattern = re.compile(r"^barcode\d{2}$", re.IGNORECASE)
-    run_pattern = re.compile(r"(?i)(?:\w*[-_]*)?(run\d+)(?:[-_]\w*)?")
-
-    for root, dirs, _ in os.walk(base_dir):
-        if "fastq_fail" in root:
-            continue  
-
-        if not any(run_pattern.match(part) for part in root.split(os.sep)):
-            continue  
-
-        for directory in dirs:
-            if barcode_pattern.match(directory):  
-                barcode_path = os.path.realpath(os.path.join(root, directory))
-                barcode_dirs.append(barcode_path)
-
-    return barcode_dirs
+    seen_dirs = {}
+    stack = [(top, in_run, depth)]
+
+    while stack:
+        path, path_in_run, path_depth = stack.pop()
+        try:
+            subdirs, barcodes = list_directory(path, dir_cache, seen_dirs)
+        except OSError as e:
+            print(f"⚠ WARNING: Could not scan '{path}': {e}")
+            continue
+
+        if path_in_run:
+            barcode_dirs.extend(os.path.realpath(os.path.join(path, name)) for name in barcodes)
+
+        if path_depth + 1 > max_depth:
+            continue
+        for name in subdirs:
+            if path_in_run and name in barcodes:
+                continue
+            stack.append((os.path.join(path, name), path_in_run or bool(RUN_PATTERN.match(name)), path_depth + 1))
+
+    return barcode_dirs, seen_dirs
+
+def find_barcode_dirs(base_dir, max_depth=DEFAULT_MAX_DEPTH, threads=8, dir_cache=None):
+    """Find all 'barcodeXX' directories below sequencing run directories.
+
+    The top-level directories of base_dir are scanned in parallel with a thread pool,
+    which hides per-directory latency on network filesystems. Returns the sorted barcode
+    directories and the directory listings seen, for the scan manifest.
+    """
+    base_dir = os.path.realpath(base_dir)
+    dir_cache = dir_cache or {}
+    if "fastq_fail" in base_dir:
+        return [], {}
+
+    base_in_run = any(RUN_PATTERN.match(part) for part in base_dir.split(os.sep))
+    barcode_dirs, seen_dirs = scan_tree(base_dir, base_in_run, 0, 0, dir_cache)
+    if max_depth < 1:
+        return sorted(barcode_dirs), seen_dirs
+
+    subdirs = seen_dirs.get(base_dir, {}).get("dirs", [])
+    subtrees = [
+        (os.path.join(base_dir, name), base_in_run or bool(RUN_PATTERN.match(name)))
+        for name in subdirs
+        if not (base_in_run and name in seen_dirs[base_dir]["barcodes"])
+    ]
+
+    with ThreadPoolExecutor(max_workers=max(1, threads)) as executor:
+        for found, seen in executor.map(lambda tree: scan_tree(tree[0], tree[1], 1, max_depth, dir_cache), subtrees):
+            barcode_dirs.extend(found)
+            seen_dirs.update(seen)
+
+    return sorted(barcode_dirs), seen_dirs
+
+def barcode_stats(barcode_path, barcode_cache):
+    """Return mtime, file count and total bytes of a barcode directory, reusing the manifest when unchanged."""
+    mtime_ns = os.stat(barcode_path).st_mtime_ns
+    cached = barcode_cache.get(barcode_path)
+    if cached and cached["mtime_ns"] == mtime_ns:
+        return cached
+
+    files, total_bytes = 0, 0
+    with os.scandir(barcode_path) as entries:
+        for entry in entries:
+            if entry.is_file():
+                files += 1
+                total_bytes += entry.stat().st_size
+    return {"mtime_ns": mtime_ns, "files": files, "bytes": total_bytes}
+
+def load_manifest(manifest_file, base_dir):
+    """Load a previous scan manifest; a missing, unreadable or foreign manifest starts a full scan."""
+    empty = {"dirs": {}, "barcodes": {}}
+    if not manifest_file or not os.path.exists(manifest_file):
+        return empty
+    try:
+        with open(manifest_file) as f:
+            manifest = json.load(f)
+    except (OSError, json.JSONDecodeError):
+        print(f"⚠ WARNING: Could not read manifest '{manifest_file}', rescanning everything.")
+        return empty
+    if manifest.get("version") != MANIFEST_VERSION or manifest.get("base_dir") != base_dir:
+        return empty
+    return manifest
+
+def write_manifest(manifest_file, base_dir, seen_dirs, barcodes):
+    """Write the scan manifest atomically so an interrupted run never leaves a partial file."""
+    manifest_dir = os.path.dirname(os.path.abspath(manifest_file))
+    os.makedirs(manifest_dir, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=manifest_dir, prefix=".manifest.")
+    with os.fdopen(fd, "w") as f:
+        json.dump({"version": MANIFEST_VERSION, "base_dir": base_dir, "dirs": seen_dirs, "barcodes": barcodes}, f)
+    os.replace(tmp_path, manifest_file)
+
+def scan_barcodes(base_dir, max_depth, threads, manifest_file=None):
+    """Scan base_dir, incrementally when a manifest is given.
+
+    Returns the barcode directories and a {barcode_path: (status, stats)} mapping where
+    status is 'new', 'changed' or 'unchanged' relative to the previous manifest.
+    """
+    base_dir = os.path.realpath(base_dir)
+    manifest = load_manifest(manifest_file, base_dir)
+    barcode_dirs, seen_dirs = find_barcode_dirs(base_dir, max_depth, threads, manifest["dirs"])
+
+    previous = manifest["barcodes"]
+    statuses, barcodes = {}, {}
+    with ThreadPoolExecutor(max_workers=max(1, threads)) as executor:
+        for path, stats in zip(barcode_dirs, executor.map(lambda p: barcode_stats(p, previous), barcode_dirs)):
+            old = previous.get(path)
+            if old is None:
+                status = "new"
+            elif (old["files"], old["bytes"]) != (stats["files"], stats["bytes"]):
+                status = "changed"
+            else:
+                status = "unchanged"
+            statuses[path] = (status, stats)
+            barcodes[path] = stats
+
+    for path in previous.keys() - barcodes.keys():
+        statuses[path] = ("removed", previous[path])
+
+    if manifest_file:
+        write_manifest(manifest_file, base_dir, seen_dirs, barcodes)
+    return barcode_dirs, statuses
+
+def write_status(status_file, statuses):
+    """Write one row per barcode directory with its scan status."""
+    with open(status_file, "w") as f:
+        f.write("sample\tfastq_dir\tstatus\tfiles\tbytes\n")
+        for path in sorted(statuses):
+            status, stats = statuses[path]
+            run_name = extract_run_name(path)
+            barcode = normalize_barcode(os.path.basename(path))
+            sample_name = f"{run_name}_{barcode}" if run_name else barcode
+            f.write(f"{sample_name}\t{path}\t{status}\t{stats['files']}\t{stats['bytes']}\n")
+
+    counts = {}
+    for status, _ in statuses.values():
+        counts[status] = counts.get(status, 0) + 1
+    print("Scan status: " + ", ".join(f"{n} {status}" for status, n in sorted(counts.items())))
 
 def extract_run_name(path):
     """Extract sequencing run name from directory path."""
@@ -105,14 +277,20 @@ def load_metadata(metadata_file):
     metadata = metadata.sort_index()
     return metadata
 
-def generate_samplesheet(base_dir, metadata_file, output_file, output_format, missing_value):
+def generate_samplesheet(base_dir, metadata_file, output_file, output_format, missing_value,
+                         max_depth=DEFAULT_MAX_DEPTH, threads=8, manifest_file=None, status_file=None):
     """Generate samplesheet with metadata validation and barcode normalization."""
 
     metadata = None
     if metadata_file:
         metadata = load_metadata(metadata_file)
 
-    barcode_dirs = find_barcode_dirs(base_dir)
+    if manifest_file or status_file:
+        barcode_dirs, statuses = scan_barcodes(base_dir, max_depth, threads, manifest_file)
+        if status_file:
+            write_status(status_file, statuses)
+    else:
+        barcode_dirs, _ = find_barcode_dirs(base_dir, max_depth, threads)
 
     if not barcode_dirs:
         print(f"\u274c ERROR: No valid 'barcodeXX' directories found in {base_dir}.")
@@ -186,6 +364,11 @@ if __name__ == "__main__":
     parser.add_argument("-o", "--output", required=False, default="samplesheet.csv", help="Output samplesheet file (default: samplesheet.csv).")
     parser.add_argument("--format", choices=["csv", "tsv"], default="csv", help="Output format (default: csv).")
     parser.add_argument("--missing-value", default="NA", help="Placeholder for missing metadata values (default: NA).")
+    parser.add_argument("--max-depth", type=int, default=DEFAULT_MAX_DEPTH, help=f"Maximum directory depth to scan below --directory (default: {DEFAULT_MAX_DEPTH}).")
+    parser.add_argument("--threads", type=int, default=8, help="Parallel scanners over top-level directories (default: 8).")
+    parser.add_argument("--manifest", required=False, help="JSON scan manifest; only directories whose mtime changed are rescanned.")
+    parser.add_argument("--status", required=False, help="TSV reporting each barcode directory as new, changed, unchanged or removed.")
 
     args = parser.parse_args()
-    generate_samplesheet(args.directory, args.metadata, args.output, args.format, args.missing_value)
+    generate_samplesheet(args.directory, args.metadata, args.output, args.format, args.missing_value,
+                         args.max_depth, args.threads, args.manifest, args.status)
@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+"""
+Single-pass, constant-memory QC of an ONT sequencing_summary.txt.
+
+Only the needed columns (barcode, read length, mean qscore, pass/fail, start
+time) are read, in chunks and with explicit dtypes. Each chunk is folded into
+fixed-size NumPy accumulators per barcode (log-binned length and 0.5-Q
+histograms, read/base totals) and per time bin (reads and bases, pass and
+fail), so memory stays flat however large the run is.
+
+Outputs:
+    sequencing_summary_stats.json          Per-barcode and per-time-bin statistics
+    sequencing_summary_barcodes_mqc.tsv    MultiQC table, one row per barcode
+    sequencing_summary_throughput_mqc.json MultiQC line graph of cumulative yield
+
+Usage:
+    sequencing_summary_stats.py --input sequencing_summary.txt --outdir ./
+"""
+
+import argparse
+import json
+import logging
+import os
+import sys
+import numpy as np
+import pandas as pd
+
+# Accepted column names, in order of preference (Guppy / Dorado / MinKNOW variants)
+COLUMNS = {
+    "barcode": ["barcode_arrangement", "barcode", "alias"],
+    "length": ["sequence_length_template", "sequence_length"],
+    "qscore": ["mean_qscore_template", "mean_qscore"],
+    "passes": ["passes_filtering"],
+    "start_time": ["start_time", "template_start"],
+}
+DTYPES = {"barcode": "category", "length": "int64", "qscore": "float32", "passes": "string", "start_time": "float64"}
+
+LENGTH_EDGES = np.logspace(0, 6, 601)         # 1 bp .. 1 Mb, ~2.3% wide bins
+Q_BIN_WIDTH = 0.5
+MAX_Q = 60
+MAX_HOURS = 168                               # time bins beyond one week are folded into the last bin
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Streaming per-barcode statistics from an ONT sequencing summary.")
+    parser.add_argument("--input", required=True, help="sequencing_summary.txt (optionally gzipped)")
+    parser.add_argument("--outdir", default=".", help="Output directory (default: current directory)")
+    parser.add_argument("--chunksize", type=int, default=1000000, help="Rows per chunk (default: 1,000,000)")
+    parser.add_argument("--time-bin-minutes", type=int, default=60, help="Width of time bins in minutes (default: 60)")
+    return parser.parse_args()
+
+
+# Maps logical column names to the ones present in the file header
+def resolve_columns(path):
+    header = pd.read_csv(path, sep="\t", nrows=0).columns
+    resolved = {}
+    for key, candidates in COLUMNS.items():
+        found = next((c for c in candidates if c in header), None)
+        if found:
+            resolved[key] = found
+        elif key in ("length", "qscore"):
+            logging.error(f"Column for '{key}' not found in {path}; expected one of {candidates}")
+            sys.exit(1)
+    return resolved
+
+
+class BarcodeStats:
+    def __init__(self):
+        self.length_hist = np.zeros(LENGTH_EDGES.size + 1, dtype=np.int64)
+        self.length_bases = np.zeros(LENGTH_EDGES.size + 1, dtype=np.int64)
+        self.q_hist = np.zeros(int(MAX_Q / Q_BIN_WIDTH) + 1, dtype=np.int64)
+        self.reads = self.pass_reads = self.bases = self.pass_bases = 0
+        self.q_sum = 0.0
+
+    def add(self, lengths, qscores, passes):
+        length_bins = np.searchsorted(LENGTH_EDGES, lengths, side="right")
+        self.length_hist += np.bincount(length_bins, minlength=self.length_hist.size)
+        self.length_bases += np.bincount(length_bins, weights=lengths, minlength=self.length_bases.size).astype(np.int64)
+        q_bins = np.clip(qscores / Q_BIN_WIDTH, 0, self.q_hist.size - 1).astype(np.int64)
+        self.q_hist += np.bincount(q_bins, minlength=self.q_hist.size)
+        self.reads += lengths.size
+        self.pass_reads += int(passes.sum())
+        self.bases += int(lengths.sum())
+        self.pass_bases += int(lengths[passes].sum())
+        self.q_sum += float(qscores.sum())
+
+    def summary(self):
+        if self.reads == 0:
+            return {}
+        # N50 from the log-binned base counts (within one bin width, ~2%)
+        cum_bases = np.cumsum(self.length_bases[::-1])
+        n50_bin = self.length_bases.size - 1 - int(np.searchsorted(cum_bases, self.bases / 2))
+        n50 = LENGTH_EDGES[min(max(n50_bin - 1, 0), LENGTH_EDGES.size - 1)]
+        q_cum = np.cumsum(self.q_hist)
+        return {
+            "reads": self.reads,
+            "pass_reads": self.pass_reads,
+            "bases": self.bases,
+            "pass_bases": self.pass_bases,
+            "mean_length": round(self.bases / self.reads, 1),
+            "n50_approx": int(round(n50)),
+            "mean_qscore": round(self.q_sum / self.reads, 2),
+            "median_qscore": round(float(np.searchsorted(q_cum, self.reads / 2)) * Q_BIN_WIDTH, 1),
+            "pct_pass": round(100 * self.pass_reads / self.reads, 2),
+        }
+
+
+def main():
+    args = parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+    columns = resolve_columns(args.input)
+    names = {source: key for key, source in columns.items()}
+    n_time_bins = MAX_HOURS * 60 // args.time_bin_minutes
+    time_stats = {
+        "pass_reads": np.zeros(n_time_bins, dtype=np.int64), "fail_reads": np.zeros(n_time_bins, dtype=np.int64),
+        "pass_bases": np.zeros(n_time_bins, dtype=np.int64), "fail_bases": np.zeros(n_time_bins, dtype=np.int64),
+    }
+    barcodes = {}
+    rows = 0
+
+    reader = pd.read_csv(
+        args.input, sep="\t", usecols=list(columns.values()), chunksize=args.chunksize,
+        dtype={source: DTYPES[key] for key, source in columns.items()},
+    )
+    for chunk in reader:
+        chunk = chunk.rename(columns=names)
+        rows += len(chunk)
+        lengths = chunk["length"].to_numpy(dtype=np.int64)
+        qscores = chunk["qscore"].to_numpy(dtype=np.float64)
+        if "passes" in chunk:
+            passes = chunk["passes"].str.upper().eq("TRUE").to_numpy(dtype=bool, na_value=False)
+        else:
+            passes = np.ones(lengths.size, dtype=bool)
+
+        if "start_time" in chunk:
+            bins = (chunk["start_time"].to_numpy() // (args.time_bin_minutes * 60)).astype(np.int64)
+            bins = np.clip(bins, 0, n_time_bins - 1)
+            for label, mask in (("pass", passes), ("fail", ~passes)):
+                time_stats[f"{label}_reads"] += np.bincount(bins[mask], minlength=n_time_bins)
+                time_stats[f"{label}_bases"] += np.bincount(
+                    bins[mask], weights=lengths[mask], minlength=n_time_bins).astype(np.int64)
+
+        if "barcode" in chunk:
+            codes = chunk["barcode"].cat.codes.to_numpy()
+            for code, name in enumerate(chunk["barcode"].cat.categories):
+                mask = codes == code
+                if mask.any():
+                    barcodes.setdefault(str(name), BarcodeStats()).add(lengths[mask], qscores[mask], passes[mask])
+        else:
+            barcodes.setdefault("all", BarcodeStats()).add(lengths, qscores, passes)
+
+    logging.info(f"Processed {rows} reads across {len(barcodes)} barcode(s)")
+    os.makedirs(args.outdir, exist_ok=True)
+
+    # Trim trailing empty time bins
+    used = np.flatnonzero(sum(time_stats.values()))
+    last = int(used[-1]) + 1 if used.size else 0
+    summaries = {name: stats.summary() for name, stats in sorted(barcodes.items())}
+
+    with open(os.path.join(args.outdir, "sequencing_summary_stats.json"), "w") as f:
+        json.dump({
+            "reads": rows,
+            "barcodes": summaries,
+            "time_bin_minutes": args.time_bin_minutes,
+            "time_bins": {key: values[:last].tolist() for key, values in time_stats.items()},
+        }, f, indent=2)
+
+    with open(os.path.join(args.outdir, "sequencing_summary_barcodes_mqc.tsv"), "w") as f:
+        f.write("# id: 'sequencing_summary_barcodes'\n# section_name: 'Sequencing summary per barcode'\n# plot_type: 'table'\n")
+        f.write("Barcode\tReads\tPass reads (%)\tBases (Mb)\tMean length\tRead N50\tMean Q\n")
+        for name, s in summaries.items():
+            if s:
+                f.write(f"{name}\t{s['reads']}\t{s['pct_pass']}\t{s['bases'] / 1e6:.2f}\t{s['mean_length']}\t"
+                        f"{s['n50_approx']}\t{s['mean_qscore']}\n")
+
+    hours = np.arange(last) * args.time_bin_minutes / 60
+    with open(os.path.join(args.outdir, "sequencing_summary_throughput_mqc.json"), "w") as f:
+        json.dump({
+            "id": "sequencing_summary_throughput",
+            "section_name": "Cumulative yield over time",
+            "plot_type": "linegraph",
+            "pconfig": {"id": "sequencing_summary_throughput_plot", "title": "Cumulative yield",
+                        "xlab": "Run time (hours)", "ylab": "Gb"},
+            "data": {
+                label: {round(float(h), 2): round(float(v) / 1e9, 4)
+                        for h, v in zip(hours, np.cumsum(time_stats[f"{label}_bases"][:last]))}
+                for label in ("pass", "fail")
+            },
+        }, f)
+
+
+if __name__ == "__main__":
+    main()
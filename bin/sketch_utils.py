@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+"""
+MinHash sketching helpers shared by the reference and sequence curation scripts.
+
+Sequences are reduced to bottom-s MinHash sketches of their canonical k-mers
+(NumPy, no external sketching tool). Two sketches give a Jaccard estimate,
+which is converted to a Mash distance and an approximate identity:
+
+    d = -1/k * ln(2j / (1 + j)),   identity = 1 - d
+"""
+
+import numpy as np
+
+DEFAULT_KMER = 21
+DEFAULT_SKETCH_SIZE = 1000
+
+# 2-bit nucleotide codes; anything else (N, IUPAC, gaps) is 4 and breaks k-mers
+_CODES = np.full(256, 4, dtype=np.uint8)
+for _base, _code in zip(b"ACGT", range(4)):
+    _CODES[_base] = _code
+    _CODES[ord(chr(_base).lower())] = _code
+
+_MASK64 = np.uint64(0xFFFFFFFFFFFFFFFF)
+
+# Hashes in at least this many sketches are counted by matrix product in pairwise_distances
+DENSE_MIN_OWNERS = 128
+PAIR_CHUNK = 4_000_000
+
+
+# splitmix64 finaliser, vectorised; spreads packed k-mers uniformly over uint64
+def mix64(values):
+    with np.errstate(over="ignore"):
+        z = values + np.uint64(0x9E3779B97F4A7C15)
+        z = (z ^ (z >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+        z = (z ^ (z >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+        return (z ^ (z >> np.uint64(31))) & _MASK64
+
+
+# Returns the hashes of all canonical k-mers without ambiguous bases
+def kmer_hashes(sequence, k=DEFAULT_KMER):
+    if not 0 < k <= 31:
+        raise ValueError("k must be between 1 and 31")
+    if isinstance(sequence, str):
+        sequence = sequence.encode()
+    codes = _CODES[np.frombuffer(sequence, dtype=np.uint8)]
+    n_kmers = codes.size - k + 1
+    if n_kmers <= 0:
+        return np.empty(0, dtype=np.uint64)
+
+    # Windows containing an ambiguous base are dropped
+    invalid = np.concatenate(([0], np.cumsum(codes == 4)))
+    valid = (invalid[k:] - invalid[:-k]) == 0
+
+    forward = np.zeros(n_kmers, dtype=np.uint64)
+    reverse = np.zeros(n_kmers, dtype=np.uint64)
+    values = np.where(codes == 4, 0, codes).astype(np.uint64)
+    complement = np.uint64(3) - values
+    for offset in range(k):
+        window = values[offset:offset + n_kmers]
+        forward = (forward << np.uint64(2)) | window
+        reverse |= complement[offset:offset + n_kmers] << np.uint64(2 * offset)
+
+    return mix64(np.minimum(forward, reverse)[valid])
+
+
+# Bottom-s MinHash sketch: the s smallest distinct k-mer hashes, sorted
+def sketch_sequence(sequence, k=DEFAULT_KMER, sketch_size=DEFAULT_SKETCH_SIZE):
+    hashes = kmer_hashes(sequence, k)
+    # Only the 2s smallest hashes need sorting, unless repeats leave fewer than s distinct among them
+    if hashes.size > 2 * sketch_size:
+        smallest = np.unique(np.partition(hashes, 2 * sketch_size)[:2 * sketch_size])
+        if smallest.size >= sketch_size:
+            return smallest[:sketch_size]
+    return np.unique(hashes)[:sketch_size]
+
+
+# Jaccard estimate from two bottom-s sketches
+def jaccard(sketch_a, sketch_b, sketch_size=DEFAULT_SKETCH_SIZE):
+    if sketch_a.size == 0 or sketch_b.size == 0:
+        return 0.0
+    union = np.union1d(sketch_a, sketch_b)[:sketch_size]
+    shared = np.intersect1d(np.intersect1d(sketch_a, sketch_b, assume_unique=True), union, assume_unique=True)
+    return shared.size / union.size
+
+
+def mash_distance(sketch_a, sketch_b, k=DEFAULT_KMER, sketch_size=DEFAULT_SKETCH_SIZE):
+    j = jaccard(sketch_a, sketch_b, sketch_size)
+    if j <= 0:
+        return 1.0
+    return min(1.0, -np.log(2 * j / (1 + j)) / k)
+
+
+def identity(sketch_a, sketch_b, k=DEFAULT_KMER, sketch_size=DEFAULT_SKETCH_SIZE):
+    return 1.0 - mash_distance(sketch_a, sketch_b, k, sketch_size)
+
+
+# Pairwise Mash distance matrix for a list of sketches
+def distance_matrix(sketches, k=DEFAULT_KMER, sketch_size=DEFAULT_SKETCH_SIZE):
+    n = len(sketches)
+    dist = np.zeros((n, n), dtype=np.float64)
+    for i in range(n):
+        for j in range(i + 1, n):
+            dist[i, j] = dist[j, i] = mash_distance(sketches[i], sketches[j], k, sketch_size)
+    return dist
+
+
+# Sorted (hash, owner) pairs of a list of sketches, for one-against-many comparisons
+def build_index(sketches):
+    sizes = np.array([s.size for s in sketches], dtype=np.int64)
+    hashes = np.concatenate(sketches) if sketches else np.empty(0, dtype=np.uint64)
+    owners = np.repeat(np.arange(len(sketches)), sizes)
+    order = np.argsort(hashes, kind="stable")
+    return hashes[order], owners[order], sizes
+
+
+def distances_to_index(sketch, index, k=DEFAULT_KMER):
+    """Mash distance from one sketch to every indexed sketch.
+
+    Shared hashes are counted through the sorted index in a single pass, and
+    Jaccard is taken over the two sketch sets (|A & B| / |A | B|) rather than
+    the bottom-s of their union, which ranks neighbours the same way at a
+    fraction of the cost of pairwise mash_distance calls.
+    """
+    hashes, owners, sizes = index
+    left = np.searchsorted(hashes, sketch, side="left")
+    counts = np.searchsorted(hashes, sketch, side="right") - left
+    total = int(counts.sum())
+    if total:
+        offsets = np.repeat(left - np.concatenate(([0], np.cumsum(counts)[:-1])), counts)
+        shared = np.bincount(owners[offsets + np.arange(total)], minlength=sizes.size)
+    else:
+        shared = np.zeros(sizes.size, dtype=np.int64)
+    union = sizes + sketch.size - shared
+    with np.errstate(divide="ignore", invalid="ignore"):
+        j = np.where(union > 0, shared / np.maximum(union, 1), 0.0)
+        dist = np.where(j > 0, -np.log(2 * j / (1 + j)) / k, 1.0)
+    return np.minimum(dist, 1.0)
+
+
+def pairwise_distances(sketches, k=DEFAULT_KMER, dense_min_owners=DENSE_MIN_OWNERS):
+    """All-against-all Mash distances, with Jaccard over the sketch sets as in distances_to_index.
+
+    Shared hashes are counted in bulk: hashes found in many sketches (closely
+    related sequences) through a 0/1 incidence matrix product, a block of
+    hashes at a time; the remaining shared hashes by enumerating the pairs of
+    sketches holding them. Neither walks the sketches one pair at a time.
+    """
+    n = len(sketches)
+    hashes, owners, sizes = build_index(sketches)
+    _, starts, counts = np.unique(hashes, return_index=True, return_counts=True)
+    shared = np.zeros((n, n), dtype=np.float32)
+
+    common = np.flatnonzero(counts >= dense_min_owners)
+    for block in range(0, common.size, 4096):
+        columns = common[block:block + 4096]
+        incidence = np.zeros((n, columns.size), dtype=np.float32)
+        column_of = np.repeat(np.arange(columns.size), counts[columns])
+        rows = owners[np.repeat(starts[columns] - np.concatenate(([0], np.cumsum(counts[columns])[:-1])),
+                                counts[columns]) + np.arange(column_of.size)]
+        incidence[rows, column_of] = 1.0
+        shared += incidence @ incidence.T
+
+    # Owners of one hash are in sketch order, so each enumerated pair has a < b
+    pair_counts = np.zeros(n * n, dtype=np.int64)
+    pending, pending_size = [], 0
+    for size in np.unique(counts[(counts > 1) & (counts < dense_min_owners)]):
+        groups = starts[counts == size]
+        first, second = np.triu_indices(size, 1)
+        step = max(1, PAIR_CHUNK // first.size)
+        for chunk in range(0, groups.size, step):
+            members = owners[groups[chunk:chunk + step, None] + np.arange(size)]
+            pending.append((members[:, first] * n + members[:, second]).ravel())
+            pending_size += pending[-1].size
+            if pending_size >= 8 * PAIR_CHUNK:
+                pair_counts += np.bincount(np.concatenate(pending), minlength=n * n)
+                pending, pending_size = [], 0
+    if pending:
+        pair_counts += np.bincount(np.concatenate(pending), minlength=n * n)
+    pair_counts = pair_counts.reshape(n, n)
+    shared += pair_counts + pair_counts.T
+    shared[np.diag_indices(n)] = sizes
+
+    union = sizes[:, None] + sizes[None, :] - shared
+    with np.errstate(divide="ignore", invalid="ignore"):
+        j = np.where(union > 0, shared / np.maximum(union, 1), 0.0)
+        dist = np.where(j > 0, -np.log(2 * j / (1 + j)) / k, 1.0)
+    dist = np.minimum(dist, 1.0)
+    np.fill_diagonal(dist, 0.0)
+    return dist
@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+Split this run's sequences against a cached global context alignment.
+
+Rows of the cached alignment whose sequences are part of this run are kept
+as the base alignment, without the columns that are gaps in all of them (the
+cached alignment covers the whole candidate pool, of which a run selects a
+subset). Sequences of the run that are not in the cached alignment (the local
+consensus genomes) are written for `mafft --add --keeplength`. When every
+sequence is already aligned, the base alignment is written as the complete
+alignment instead.
+
+Outputs one of:
+    <prefix>.base.fas and <prefix>.new.fasta      Sequences to add to the cached context
+    <prefix>.fas                                  Complete alignment, nothing to add
+
+Usage:
+    split_context_alignment.py --alignment global_alignment.fas --fasta combined.fasta --prefix Concatenate
+"""
+
+import argparse
+import logging
+import os
+import sys
+import numpy as np
+from dedup_sequences import read_fasta  # Shared FASTA reader bundled in bin/
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Split sequences into cached-aligned and to-be-added sets.")
+    parser.add_argument("--alignment", required=True, help="Cached alignment of the global context")
+    parser.add_argument("--fasta", required=True, help="All sequences of this run")
+    parser.add_argument("--prefix", required=True, help="Output file prefix")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+    records = {name: record for name, record, _ in read_fasta(args.fasta)}
+    rows = {}
+    for name, record, seq in read_fasta(args.alignment):
+        if name in records and name not in rows:
+            rows[name] = (record.partition(b"\n")[0], b"".join(seq.split()))
+    if not rows:
+        logging.error(f"No sequence of {args.fasta} is in the cached alignment {args.alignment}")
+        sys.exit(1)
+    aligned = set(rows)
+
+    matrix = np.array([np.frombuffer(seq, dtype=np.uint8) for _, seq in rows.values()])
+    columns = ~(matrix == ord("-")).all(axis=0)
+    base_path = f"{args.prefix}.base.fas"
+    with open(base_path, "wb") as out:
+        for header, row in zip((header for header, _ in rows.values()), matrix[:, columns]):
+            out.write(header + b"\n" + row.tobytes() + b"\n")
+
+    new = [name for name in records if name not in aligned]
+    if new:
+        with open(f"{args.prefix}.new.fasta", "wb") as out:
+            for name in new:
+                out.write(records[name])
+    else:
+        # Nothing to add: the base alignment is the final alignment
+        os.replace(base_path, f"{args.prefix}.fas")
+
+    logging.info(f"{len(aligned)} sequences taken from the cached alignment ({int(columns.sum())} of "
+                 f"{columns.size} columns); {len(new)} to add")
+
+
+if __name__ == "__main__":
+    main()
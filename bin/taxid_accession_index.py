@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+"""
+Indexed taxid -> accession lookup for a Kraken2 database.
+
+The seqid2taxid.map shipped with a Kraken2 database is loaded once into an
+SQLite index named after the SHA-256 of the map file, so the index is reused
+for as long as the database does not change. All requested taxids are then
+answered in a single call, writing one <taxid>.accessions.txt per taxid.
+
+When a Kraken taxonomy (ktaxonomy.tsv) is available, --include-descendants
+also returns the accessions of every taxon below each requested taxid.
+
+Usage:
+    taxid_accession_index.py --map seqid2taxid.map --taxids taxids.txt \\
+        [--taxonomy ktaxonomy.tsv] [--include-descendants] [--index-dir DIR] [--outdir DIR]
+"""
+
+import argparse
+import fcntl
+import logging
+import os
+import sqlite3
+import sys
+import time
+from reference_cache import file_sha256  # Shared content hashing bundled in bin/
+
+BATCH_SIZE = 500000
+
+# Descendants of every requested taxid, including the taxid itself
+DESCENDANTS_SQL = """
+WITH RECURSIVE subtree(root, taxid) AS (
+    SELECT taxid, taxid FROM requested
+    UNION
+    SELECT subtree.root, taxonomy.taxid
+    FROM taxonomy JOIN subtree ON taxonomy.parent = subtree.taxid
+)
+SELECT subtree.root, accessions.accession
+FROM subtree JOIN accessions ON accessions.taxid = subtree.taxid
+ORDER BY subtree.root, accessions.rowid
+"""
+
+DIRECT_SQL = """
+SELECT requested.taxid, accessions.accession
+FROM requested JOIN accessions ON accessions.taxid = requested.taxid
+ORDER BY requested.taxid, accessions.rowid
+"""
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Batched taxid to accession lookup using a persistent SQLite index.")
+    parser.add_argument("--map", required=True, help="seqid2taxid.map from the Kraken2 database")
+    parser.add_argument("--taxids", required=True, help="File with one taxid per line")
+    parser.add_argument("--taxonomy", default=None, help="Kraken ktaxonomy.tsv, required for --include-descendants")
+    parser.add_argument("--include-descendants", action="store_true", help="Also return accessions of descendant taxa")
+    parser.add_argument("--index-dir", default=".", help="Directory holding the reusable index (default: current directory)")
+    parser.add_argument("--outdir", default=".", help="Output directory for <taxid>.accessions.txt files")
+    return parser.parse_args()
+
+
+# Yields (accession, taxid) pairs from seqid2taxid.map, e.g. "kraken:taxid|12345|NC_001802.1<TAB>12345"
+def read_seqid2taxid(map_path):
+    with open(map_path) as f:
+        for line in f:
+            seqid, _, taxid = line.rstrip("\n").partition("\t")
+            if taxid:
+                yield seqid.rsplit("|", 1)[-1], int(taxid)
+
+
+# Yields (taxid, parent) pairs from a Kraken ktaxonomy.tsv ("taxid | parent | rank | depth | name")
+def read_ktaxonomy(taxonomy_path):
+    with open(taxonomy_path) as f:
+        for line in f:
+            fields = line.split("\t|\t")
+            if len(fields) >= 2 and fields[0].strip().isdigit():
+                yield int(fields[0]), int(fields[1])
+
+
+def insert_batched(conn, sql, rows):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= BATCH_SIZE:
+            conn.executemany(sql, batch)
+            batch.clear()
+    if batch:
+        conn.executemany(sql, batch)
+
+
+# Builds the index into a temporary file and moves it into place once complete
+def build_index(index_path, map_path, taxonomy_path):
+    tmp_path = f"{index_path}.{os.getpid()}.tmp"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+
+    start = time.time()
+    conn = sqlite3.connect(tmp_path)
+    conn.execute("PRAGMA journal_mode = OFF")
+    conn.execute("PRAGMA synchronous = OFF")
+    conn.execute("CREATE TABLE accessions (taxid INTEGER NOT NULL, accession TEXT NOT NULL)")
+    conn.execute("CREATE TABLE taxonomy (taxid INTEGER PRIMARY KEY, parent INTEGER NOT NULL)")
+
+    insert_batched(conn, "INSERT INTO accessions VALUES (?, ?)",
+                   ((taxid, accession) for accession, taxid in read_seqid2taxid(map_path)))
+    if taxonomy_path:
+        # The root is its own parent in Kraken taxonomies; drop that self-loop
+        insert_batched(conn, "INSERT OR REPLACE INTO taxonomy VALUES (?, ?)",
+                       ((taxid, parent) for taxid, parent in read_ktaxonomy(taxonomy_path) if taxid != parent))
+
+    conn.execute("CREATE INDEX accessions_taxid ON accessions (taxid)")
+    conn.execute("CREATE INDEX taxonomy_parent ON taxonomy (parent)")
+    conn.commit()
+    conn.close()
+    os.replace(tmp_path, index_path)
+    logging.info(f"Built taxid index {index_path} in {time.time() - start:.1f}s")
+
+
+# Returns the path to an index for this map/taxonomy pair, building it only if it does not exist yet
+def get_index(map_path, taxonomy_path, index_dir):
+    os.makedirs(index_dir, exist_ok=True)
+    key = file_sha256(map_path)[:16]
+    if taxonomy_path:
+        key += "_" + file_sha256(taxonomy_path)[:16]
+    index_path = os.path.join(index_dir, f"seqid2taxid_{key}.sqlite")
+
+    if os.path.exists(index_path):
+        logging.info(f"Reusing taxid index {index_path}")
+        return index_path
+
+    # Serialise concurrent builds of the same index
+    with open(f"{index_path}.lock", "a") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            if not os.path.exists(index_path):
+                build_index(index_path, map_path, taxonomy_path)
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+    return index_path
+
+
+# Answers all taxids with one query and returns {taxid: [accessions]}
+def lookup(index_path, taxids, include_descendants):
+    conn = sqlite3.connect(f"file:{index_path}?mode=ro", uri=True)
+    conn.execute("CREATE TEMP TABLE requested (taxid INTEGER PRIMARY KEY)")
+    conn.executemany("INSERT OR IGNORE INTO temp.requested VALUES (?)", ((t,) for t in taxids))
+
+    results = {taxid: [] for taxid in taxids}
+    seen = {taxid: set() for taxid in taxids}
+    sql = DESCENDANTS_SQL if include_descendants else DIRECT_SQL
+    for taxid, accession in conn.execute(sql):
+        if accession not in seen[taxid]:
+            seen[taxid].add(accession)
+            results[taxid].append(accession)
+    conn.close()
+    return results
+
+
+def main():
+    args = parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+    if args.include_descendants and not args.taxonomy:
+        logging.error("--include-descendants requires --taxonomy")
+        sys.exit(1)
+
+    with open(args.taxids) as f:
+        taxids = sorted({int(line.strip()) for line in f if line.strip()})
+    if not taxids:
+        logging.error(f"No taxids found in {args.taxids}")
+        sys.exit(1)
+
+    index_path = get_index(args.map, args.taxonomy if args.include_descendants else None, args.index_dir)
+
+    start = time.time()
+    results = lookup(index_path, taxids, args.include_descendants)
+    logging.info(f"Looked up {len(taxids)} taxid(s) in {(time.time() - start) * 1000:.0f} ms")
+
+    os.makedirs(args.outdir, exist_ok=True)
+    for taxid, accessions in results.items():
+        if not accessions:
+            logging.warning(f"No accessions found for taxid {taxid}")
+            continue
+        with open(os.path.join(args.outdir, f"{taxid}.accessions.txt"), "w") as out:
+            out.write("\n".join(accessions) + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,42 @@
+process AMPLICON_DEPTH {
+    tag "Amplicon depth for ${sample_ids.size()} samples"
+    label 'process_medium'
+    label 'error_ignore'
+
+    container "${workflow.containerEngine == 'singularity' || workflow.containerEngine == 'apptainer' ? 
+    'docker://samordil/fieldbio-multiref:1.0.0' : 
+    'docker.io/samordil/fieldbio-multiref:1.0.0'}"
+
+    input:
+    tuple val(sample_ids), path(bams), path(bais), path(beds)
+
+    output:
+    path "*.depth.npz"                          , emit: store
+    path "*.amplicon_metrics.tsv"               , emit: amplicon_tsv
+    path "*.genome_coverage.tsv"                , emit: coverage_tsv
+    path "*.amplicon_depth.tsv"                 , optional:true, emit: depth_tsv
+    path "*heatmap.pdf"                         , optional:true, emit: heatmap_pdf
+    path "*heatmap.tsv"                         , optional:true, emit: heatmap_tsv
+    path "*dropouts.tsv"                        , optional:true, emit: dropouts_tsv
+
+    when:
+    task.ext.when == null || task.ext.when
+
+    script:     // This script is bundled with the pipeline, in kwtrp-peo/viralphyl/bin/
+    def args = task.ext.args ?: ''
+
+    // One "sample_id<TAB>bam<TAB>bed" line per sample, written by a single printf
+    def bam_list = bams instanceof List ? bams : [bams]
+    def bed_list = beds instanceof List ? beds : [beds]
+    def samples  = [sample_ids, bam_list, bed_list].transpose().collect { sample_id, bam, bed -> "'${sample_id}' '${bam}' '${bed}'" }.join(' ')
+
+    """
+    printf '%s\\t%s\\t%s\\n' ${samples} > samples.tsv
+
+    amplicon_depth.py \\
+        $args \\
+        --threads $task.cpus \\
+        --samples samples.tsv \\
+        --outdir ./
+    """
+}
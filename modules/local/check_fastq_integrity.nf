@@ -0,0 +1,36 @@
+process CHECK_FASTQ_INTEGRITY {
+    tag "FASTQ pre-flight check"
+    label 'process_medium'
+
+    container "${ workflow.containerEngine == 'singularity' && !task.ext.singularity_pull_docker_container ?
+        'oras://community.wave.seqera.io/library/pip_pandas_python-dateutil:d6988e7e56918bdb' :
+        'community.wave.seqera.io/library/pip_pandas_python-dateutil:62541a5d0213d960' }"
+
+    // Make the persistent result cache writable inside docker/podman containers
+    containerOptions { params.cache_dir && workflow.containerEngine in ['docker', 'podman'] ?
+        "-v ${params.cache_dir}:${params.cache_dir}" : '' }
+
+    input:
+        path samplesheet
+        path fastq_dir          // staged so the samplesheet paths are visible inside the container
+
+    output:
+        path "samplesheet.checked.csv"      , emit: samplesheet
+        path "fastq_integrity.tsv"          , emit: report
+
+    when:
+    task.ext.when == null || task.ext.when
+
+    script:     // This script is bundled with the pipeline, in kwtrp-peo/viralphyl/bin/
+    def args = task.ext.args ?: ''
+
+    """
+    check_fastq_integrity.py \\
+        $args \\
+        --threads $task.cpus \\
+        --samplesheet $samplesheet \\
+        --report fastq_integrity.tsv \\
+        --output-samplesheet samplesheet.checked.csv \\
+        --clean-dir \$PWD/checked_fastq
+    """
+}
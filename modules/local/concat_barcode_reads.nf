@@ -0,0 +1,32 @@
+process CONCAT_BARCODE_READS {
+    tag "$sample_id"
+    label 'process_medium'
+
+    container "${workflow.containerEngine == 'singularity' || workflow.containerEngine == 'apptainer' ? 
+    'docker://samordil/fieldbio-multiref:1.0.0' : 
+    'docker.io/samordil/fieldbio-multiref:1.0.0'}"
+
+    input:
+    tuple val(sample_id), path(fastq_dir)
+
+    output:
+    tuple val(sample_id), path("${sample_id}.fastq.gz")    , emit: reads
+    path "${sample_id}.read_stats.tsv"     , optional:true , emit: stats
+
+    when:
+    task.ext.when == null || task.ext.when
+
+    script:
+    // Check for optional commandline arguments
+    def args = task.ext.args ?: ''
+
+    """
+    concat_barcode_reads.py \\
+        $args \\
+        --threads $task.cpus \\
+        --directory $fastq_dir \\
+        --sample $sample_id \\
+        --output ${sample_id}.fastq.gz \\
+        --stats ${sample_id}.read_stats.tsv
+    """
+}
@@ -0,0 +1,31 @@
+process CONSENSUS_QC {
+    tag "QC of ${fasta_seqs.size()} consensus genomes"
+    label 'process_single'
+    label 'error_ignore'
+
+    container "${workflow.containerEngine == 'singularity' || workflow.containerEngine == 'apptainer' ? 
+    'docker://samordil/fieldbio-multiref:1.0.0' : 
+    'docker.io/samordil/fieldbio-multiref:1.0.0'}"
+
+    input:
+    path fasta_seqs, stageAs: "consensus/*"
+    path reference
+
+    output:
+    path "consensus_qc.tsv"                     , emit: tsv
+
+    when:
+    task.ext.when == null || task.ext.when
+
+    script:     // This script is bundled with the pipeline, in kwtrp-peo/viralphyl/bin/
+    def args = task.ext.args ?: ''
+    def ref  = reference ? "--reference $reference" : ''
+
+    """
+    consensus_qc.py \\
+        $args \\
+        --input-fasta consensus/* \\
+        $ref \\
+        --output consensus_qc.tsv
+    """
+}
@@ -0,0 +1,35 @@
+process CURATE_REFERENCES {
+    tag "Cluster refs for $taxid"
+    label 'process_medium'
+
+    container "${ workflow.containerEngine == 'singularity' && !task.ext.singularity_pull_docker_container ?
+        'oras://community.wave.seqera.io/library/minimap2_samtools_pip_biopython:bbb619d04ed4d583' :
+        'community.wave.seqera.io/library/minimap2_samtools_pip_biopython:74cbfe42612aa285' }"
+
+    // Make the persistent reference cache visible inside docker/podman containers
+    containerOptions { params.cache_dir && workflow.containerEngine in ['docker', 'podman'] ? "-v ${params.cache_dir}:${params.cache_dir}" : '' }
+
+    input:
+    tuple val(taxid), path(ref)
+
+    output:
+    tuple val(taxid), path("${taxid}.curated.fasta"),       emit: fasta
+    path "${taxid}_reference_clusters.tsv",                 emit: clusters
+
+    when:
+    task.ext.when == null || task.ext.when
+
+    script:
+    // Check for optional commandline arguments
+    def args = task.ext.args ?: ''
+
+    """
+    cluster_references.py \\
+        $args \\
+        --threads $task.cpus \\
+        --input $ref \\
+        --taxid ${taxid} \\
+        --output ${taxid}.curated.fasta \\
+        --clusters ${taxid}_reference_clusters.tsv
+    """
+}
@@ -0,0 +1,39 @@
+process DATASETS_INGEST_METADATA {
+    tag "ingest $taxon_name global metadata"
+
+    container "${workflow.containerEngine == 'singularity' || workflow.containerEngine == 'apptainer' ?
+    'docker://samordil/fieldbio-multiref:1.0.0' :
+    'docker.io/samordil/fieldbio-multiref:1.0.0'}"
+
+    input:
+    path jsonl_gz
+    val taxon_name
+    val min
+    val max
+
+    output:
+    path "${taxon_name}.cleaned.metadata.tsv"           , emit: meta_tsv
+    path "versions.yml"                 , optional:true , emit: versions
+
+    when:
+    task.ext.when == null || task.ext.when
+
+    script: // This script is bundled with the pipeline, in kwtrp-peo/viralphyl/bin/
+    def min_value   = min == -1 ? "" : "--min-length $min"
+    def max_value   = max == -1 ? "" : "--max-length $max"
+
+    // The JSON-lines report is cleaned record by record, without an intermediate TSV
+    """
+    ingest_datasets_jsonl.py \\
+        --input $jsonl_gz \\
+        $min_value \\
+        $max_value \\
+        --complete-only \\
+        --output ${taxon_name}.cleaned.metadata.tsv
+
+    cat <<-END_VERSIONS > versions.yml
+    "${task.process}":
+        python: \$(python3 --version | sed 's/^Python //')
+    END_VERSIONS
+    """
+}
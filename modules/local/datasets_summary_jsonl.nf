@@ -0,0 +1,40 @@
+process DATASETS_SUMMARY_JSONL {
+    tag "download $taxon_name global metadata"
+
+    conda "conda-forge::ncbi-datasets-cli"
+    container "${workflow.containerEngine == 'singularity' || workflow.containerEngine == 'apptainer' ?
+    'docker://biocontainers/ncbi-datasets-cli:16.22.1_cv1' :
+    'docker.io/biocontainers/ncbi-datasets-cli:16.22.1_cv1'}"
+
+    input:
+    val taxon_name
+    val host_name
+
+    output:
+    path "${taxon_name}.summary.jsonl.gz"               , emit: jsonl
+    path "versions.yml"                 , optional:true , emit: versions
+
+    when:
+    task.ext.when == null || task.ext.when
+
+    script:
+    def args  = task.ext.args ?: ''
+
+    // The JSON-lines report is kept compressed for DATASETS_INGEST_METADATA, without a dataformat TSV
+    """
+    set -o pipefail
+
+    datasets summary virus genome taxon $taxon_name \\
+        $args \\
+        --host $host_name \\
+        --complete-only \\
+        --annotated \\
+        --as-json-lines | \\
+    gzip -1 > ${taxon_name}.summary.jsonl.gz
+
+    cat <<-END_VERSIONS > versions.yml
+    "${task.process}":
+        datasets: \$(datasets --version | sed 's/^datasets version: //')
+    END_VERSIONS
+    """
+}
@@ -0,0 +1,25 @@
+process DEDUP_SEQUENCES {
+    tag "collapsing duplicate sequences"
+    label 'process_single'
+
+    container "${workflow.containerEngine == 'singularity' || workflow.containerEngine == 'apptainer' ? 
+    'docker://samordil/fieldbio-multiref:1.0.0' : 
+    'docker.io/samordil/fieldbio-multiref:1.0.0'}"
+
+    input:
+    tuple val(meta), path(fasta)
+
+    output:
+    tuple val(meta), path("${prefix}.unique.fasta")     , emit: fasta
+    path "${prefix}.duplicates.tsv"                     , emit: duplicates
+
+    script:     // This script is bundled with the pipeline, in kwtrp-peo/viralphyl/bin/
+    prefix = task.ext.prefix ?: "${meta.id}"
+
+    """
+    dedup_sequences.py \\
+        --fasta $fasta \\
+        --output-fasta ${prefix}.unique.fasta \\
+        --output-map ${prefix}.duplicates.tsv
+    """
+}
@@ -0,0 +1,30 @@
+process EXPAND_DUPLICATES {
+    tag "restoring duplicate sequences"
+    label 'process_single'
+
+    container "${workflow.containerEngine == 'singularity' || workflow.containerEngine == 'apptainer' ? 
+    'docker://samordil/fieldbio-multiref:1.0.0' : 
+    'docker.io/samordil/fieldbio-multiref:1.0.0'}"
+
+    input:
+    path newick_file
+    tuple val(meta), path(aln_fasta)
+    path duplicates_tsv
+
+    output:
+    path "${tree_name}.expanded.tree"                   , emit: phylogeny
+    tuple val(meta), path("${aln_name}.expanded.fas")   , emit: fas
+
+    script:     // This script is bundled with the pipeline, in kwtrp-peo/viralphyl/bin/
+    tree_name = newick_file.simpleName
+    aln_name = aln_fasta.simpleName
+
+    """
+    expand_duplicates.py \\
+        --tree $newick_file \\
+        --alignment $aln_fasta \\
+        --duplicates $duplicates_tsv \\
+        --output-tree ${tree_name}.expanded.tree \\
+        --output-alignment ${aln_name}.expanded.fas
+    """
+}
@@ -0,0 +1,32 @@
+process FASTTREE_INTREE {
+    tag "refining phylogeny from starting tree"
+    label 'process_medium'
+
+    container "${ workflow.containerEngine == 'singularity' && !task.ext.singularity_pull_docker_container ?
+        'https://depot.galaxyproject.org/singularity/fasttree:2.1.11--h7b50bb2_5' :
+        'biocontainers/fasttree:2.1.11--h7b50bb2_5' }"
+
+    input:
+    path alignment
+    path starting_tree
+
+    output:
+    path "*.tree"                               , emit: phylogeny
+    path "versions.yml"                         , emit: versions
+
+    script:
+    def args = task.ext.args ?: ''
+    """
+    fasttree \\
+        $args \\
+        -intree $starting_tree \\
+        -log fasttree_phylogeny.tree.log \\
+        -nt $alignment \\
+        > fasttree_phylogeny.tree
+
+    cat <<-END_VERSIONS > versions.yml
+    "${task.process}":
+        fasttree: \$(fasttree -help 2>&1 | head -1  | sed 's/^FastTree \\([0-9\\.]*\\) .*\$/\\1/')
+    END_VERSIONS
+    """
+}
@@ -8,19 +8,15 @@ process FETCH_FEFERENCE_FASTA {
     'biocontainers/entrez-direct:22.4--he881be0_0' }"
 
     input:
-    val(taxid)          
-    path(seqid2taxid_map)
+    tuple val(taxid), path(accessions)
 
     output:
     tuple val(taxid), path("${taxid}.fasta"),       emit: fasta
 
     script:
     """
-    # Extract all accessions for the given taxid from the seqid2taxid map
-    accessions=\$(awk -v TAXID=${taxid} -F'\t' '\$2 == TAXID { n = split(\$1, a, "|"); print a[n] }' ${seqid2taxid_map} | paste -sd "," -)
-
-    # Download the reference sequences in FASTA format
-    epost -db nuccore -id "\$accessions" | efetch -format fasta > "${taxid}.fasta"
+    # Download the reference sequences for the pre-resolved accessions in FASTA format
+    epost -db nuccore -input ${accessions} | efetch -format fasta > "${taxid}.fasta"
 
     """
 }
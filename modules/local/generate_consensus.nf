@@ -1,5 +1,5 @@
 process GENERATE_CONSENSUS {
-    tag "${sample_id}_taxon_${taxid}"
+    tag "taxon_${taxid} (${sample_ids.size()} samples)"
     label 'process_high'
 
     // Note: the versions here need to match the versions used in the mulled container below and minimap2/index
@@ -7,16 +7,20 @@ process GENERATE_CONSENSUS {
         'oras://community.wave.seqera.io/library/minimap2_samtools_pip_biopython:bbb619d04ed4d583' :
         'community.wave.seqera.io/library/minimap2_samtools_pip_biopython:74cbfe42612aa285' }"
 
+    // Make the persistent reference cache visible inside docker/podman containers
+    containerOptions { params.cache_dir && workflow.containerEngine in ['docker', 'podman'] ? "-v ${params.cache_dir}:${params.cache_dir}" : '' }
+
     input:
-    tuple val(taxid), val(sample_id), path(ref), path(fastq_gz), val(pathogen)
+    tuple val(taxid), path(ref), val(pathogen), val(sample_ids), path(fastq_gz)
 
     output:
-    path "${sample_id}_${taxid}.consensus.fasta"            , emit: fasta
-    path "${sample_id}_${taxid}.bam.bai"                    , emit: bai
-    path "${sample_id}_${taxid}.bam"                        , emit: bam
-    path "${sample_id}_${taxid}_beststat.json"              , emit: beststat_json
-    path "${sample_id}_${taxid}_allstats.json"              , emit: allstats_json
-    path "${sample_id}_bams",             optional:true     , emit: all_bams
+    path "*.consensus.fasta"                                , emit: fasta
+    path "*.bam.bai"                                        , emit: bai
+    path "*.bam"                                            , emit: bam
+    path "*_beststat.json"                                  , emit: beststat_json
+    path "*_allstats.json"                                  , emit: allstats_json
+    path "*_bams",                        optional:true     , emit: all_bams
+    path "*_reference_cache.json",        optional:true     , emit: cache_stats
     path "versions.yml"                                     , emit: versions
 
     when:
@@ -26,18 +30,22 @@ process GENERATE_CONSENSUS {
     // Check for optional commandline arguments
     def args = task.ext.args ?: ''
 
+    // One "sample_id<TAB>reads" line per sample positive for this taxid, written by a single printf
+    def fastqs = fastq_gz instanceof List ? fastq_gz : [fastq_gz]
+    def batch  = [sample_ids, fastqs].transpose().collect { sample_id, reads -> "'${sample_id}' '${reads}'" }.join(' ')
+
     """
+    printf '%s\\t%s\\n' ${batch} > ${taxid}_batch.tsv
+
     bestref_consensus.py \\
     $args \\
     --threads $task.cpus \\
-    --reads $fastq_gz \\
+    --batch ${taxid}_batch.tsv \\
     --msa $ref \\
-    --output ${sample_id}_${taxid} \\
-    --sample_id ${sample_id} \\
+    --output ./ \\
     --taxid ${taxid} \\
     --pathogen "${pathogen}" \\
-    --mapping-json ${sample_id}_${taxid}_allstats.json \\
-    --best-json ${sample_id}_${taxid}_beststat.json
+    --cache-stats ${taxid}_reference_cache.json
 
     cat <<-END_VERSIONS > versions.yml
     "${task.process}":
@@ -7,6 +7,10 @@ process GENERATE_SAMPLESHEET {
         'oras://community.wave.seqera.io/library/pip_pandas_python-dateutil:d6988e7e56918bdb' :
         'community.wave.seqera.io/library/pip_pandas_python-dateutil:62541a5d0213d960' }"
 
+    // Make the persistent scan manifest writable inside docker/podman containers
+    containerOptions { params.samplesheet_manifest && workflow.containerEngine in ['docker', 'podman'] ? 
+        "-v ${file(params.samplesheet_manifest).parent}:${file(params.samplesheet_manifest).parent}" : '' }
+
     input:
         path fastq_dir
         path metadata_tsv
@@ -14,13 +18,16 @@ process GENERATE_SAMPLESHEET {
     output:
         path "samplesheet.csv"                          , emit: samplesheet
         path "*without*.csv"    , optional: true        , emit: csv
+        path "samplesheet_status.tsv", optional: true   , emit: status
 
 
     script:     // This script is bundled with the pipeline, in kwtrp-peo/viralphyl/bin/
+    def args      = task.ext.args ?: ''
     def metadata  = metadata_tsv ? "--metadata $metadata_tsv" : ""
 
     """
     samplesheet_generator.py \\
+        $args \\
         --directory $fastq_dir \\
         $metadata \\
         --output samplesheet.csv
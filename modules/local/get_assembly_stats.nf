@@ -12,11 +12,14 @@ process GET_ASSEMBLY_STATS {
 
     output:
     path "assembly_stats.tsv"                   , emit: tsv
-    path "read_mapping.png"                  , emit: png
+    path "read_mapping*.png"                 , emit: png
 
     script:
+    def args = task.ext.args ?: ''
+
     """
     get_assembly_stats.py \\
+        $args \\
         --tsv-files  $tsv_files\\
         --threads $task.cpus \\
         --output-tsv assembly_stats.tsv \\
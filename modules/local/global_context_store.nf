@@ -0,0 +1,31 @@
+process GLOBAL_CONTEXT_STORE {
+    tag "caching $target_name"
+    label 'process_single'
+
+    container "${workflow.containerEngine == 'singularity' || workflow.containerEngine == 'apptainer' ? 
+    'docker://samordil/fieldbio-multiref:1.0.0' : 
+    'docker.io/samordil/fieldbio-multiref:1.0.0'}"
+
+    // Make the persistent cache writable inside docker/podman containers
+    containerOptions { params.cache_dir && workflow.containerEngine in ['docker', 'podman'] ? "-v ${params.cache_dir}:${params.cache_dir}" : '' }
+
+    input:
+    tuple val(entry), path(source), val(target_name)
+
+    output:
+    val "${entry}/${target_name}"           , emit: cached
+
+    script:     // This script is bundled with the pipeline, in kwtrp-peo/viralphyl/bin/
+    // Copy next to the target and rename, so readers never see a partial file
+    """
+    mkdir -p ${entry}
+    cp -L $source ${entry}/.${target_name}.\$\$
+    mv -f ${entry}/.${target_name}.\$\$ ${entry}/${target_name}
+    touch ${entry}/.last_access
+
+    global_context_cache.py \\
+        --cache-dir \$(dirname ${entry}) \\
+        --max-gb ${params.global_context_cache_max_gb} \\
+        --protect ${entry}
+    """
+}
@@ -48,6 +48,8 @@ def showHelp() {
 
         --multi_ref_file       (Optional) Path to a FASTA MSA reference file. See the "Artic MinION Parameters" section for details.  
         --sequencing_summary   (Optional) Path to ont sequencing summary file generated after Nanopore run completion.
+        --samplesheet_manifest (Optional) Path to a JSON manifest kept between runs. Only directories whose mtime changed
+                               are rescanned, and samplesheet_status.tsv lists each barcode as new, changed, unchanged or removed.
 
 
     Input Options:
@@ -67,6 +69,14 @@ def showHelp() {
     --------------
         --skip_assembly         Boolean: Skip the assembly step for the selected protocol (nanopore or metagenomic) (default: false)
         --skip_qc               Boolean: If set, skips the quality check step for the selected protocol (default: false)
+        --qc_engine             Read QC engine: "native" (streaming, constant memory; per-sample FASTQ stats in one
+                                process, or per-barcode stats from --sequencing_summary) or "nanoplot" (default: native)
+        --check_fastq_integrity Boolean: Decompress every input FASTQ (verifying gzip CRCs) and check its first and last
+                                records before any other step; results go to fastq_integrity.tsv and are cached by
+                                path, size and mtime under --cache_dir (default: false)
+        --exclude_bad_fastq     Boolean: With --check_fastq_integrity, drop truncated or malformed files, and samples left
+                                with no readable file, instead of only reporting them. Kept files are symlinked, so the
+                                original run directory must stay visible to the tasks (default: false)
         --skip_phylogenetics    Boolean: If set, skips the nanopore phylogenetics module (default: false)
         --skip_classification   Boolean: If set, skips the metagenomic classification module (default: false)
         
@@ -77,6 +87,24 @@ def showHelp() {
         --min_read_length       Minimum length for raw reads to be retained (Default: 10).  
         --max_read_length       Maximum length for raw reads (Default: null - no maximum length restriction).  
         --min_read_quality      Minimum read quality threshold (Default: null - no quality restriction).  
+        --read_merge_mode       How per-batch fastq files of a barcode are merged (Default: guppyplex).
+                                "guppyplex": artic guppyplex with the thresholds above.
+                                "concat": byte-level gzip concatenation, no filtering and no recompression.
+                                "filter": the thresholds above (quality 7 when unset, as guppyplex) applied by a parallel
+                                parser with per-file compression; repeated read IDs are dropped, as guppyplex does.
+                                For metagenomics, "concat"/"filter" hand porechop one merged fastq per barcode.
+        --read_merge_stats      Write per-barcode read and base counts in "concat" mode; false skips the extra
+                                decompression pass and the read_merge_summary.tsv rows (Default: true).
+
+        Read Normalisation Parameters (amplicon and metagenomics):
+        ----------------------------------------------------------
+        --read_norm_target_depth
+                                Cap reads at roughly this depth before assembly/consensus (Default: null - disabled).
+        --read_norm_method      "window" streams the reads once, keeping them until each genome window reaches the
+                                target depth, windows being placed by error-tolerant minimizers; "diginorm" keeps a read while the median count of its k-mers
+                                is below the target, which only caps depth at low error rates; "reservoir" takes a
+                                uniform random sample of target depth x genome size bases (Default: window).
+        --read_norm_genome_size Expected genome size in bases, required by --read_norm_method reservoir.
 
 
         Artic MinION Parameters:
@@ -92,6 +120,17 @@ def showHelp() {
         --min_mapq              Minimum mapping quality to consider (default: 20)              
         --min_depth             Minimum coverage required for a position to be included in the consensus sequence (default: 20)
         --sequence_threshold    Min coverage cutoff for tree construction (0.0-1.0, default: 0.7)
+        --consensus_qc_filters  Comma-separated filters on consensus_qc.tsv columns that genomes must also pass for
+                                tree construction, e.g. 'pct_n<=30,ambiguous_bases<=10,longest_acgt_run>=2000'.
+                                Columns: length, length_deviation, n_count, pct_n, ambiguous_bases, longest_acgt_run,
+                                leading_n, trailing_n, gc_percent (default: null)
+        --depth_engine          Amplicon depth engine: "native" (one pysam pass over each primer-trimmed BAM; per-base depth
+                                store, per-amplicon mean/median/breadth and genome coverage for the whole run) or "mosdepth"
+                                (default: native)
+        --depth_thresholds      Comma-separated depths at which genome coverage is reported by the native engine
+                                (default: 1,10,20,100)
+        --assembly_plot_types   Comma-separated read mapping plots rendered in one pass: grouped-bar, stacked-bar,
+                                mapping-rate-bar, scatter, histogram. Bar plots of >500 samples are binned by rank (default: stacked-bar)
 
         Reference FASTA and BED file (Required if --protocol="amplicon"):
         --------------------------------------------------------------- 
@@ -119,6 +158,38 @@ def showHelp() {
         --subsample_seed INT         Seed for subsampling (-1 = random, default: 123)
         --subsample_max_sequences    INT Max sequences in tree (default: 250)
         --subsample_by STR           Criteria: "country", "region", "year", etc. (default: "country year month")
+        --subsample_strategy STR     "proximity": nearest neighbours of the assembled sequences plus diverse
+                                     representatives (MinHash sketch distance); "random": augur filter only
+                                     (default: "proximity")
+        --subsample_candidates INT   Global sequences downloaded and sketched for proximity subsampling (default: 2000)
+        --subsample_neighbours INT   Nearest global neighbours kept per assembled sequence (default: 3)
+        --cache_global_context BOOL  With --cache_dir, keep downloaded context sets (keyed by taxon, host, length,
+                                     subsampling settings and NCBI metadata snapshot) and the MAFFT alignment of
+                                     their whole candidate pool, so later runs only add the local sequences,
+                                     whichever global sequences proximity subsampling selects (default: true)
+        --stream_global_metadata     BOOL Download the NCBI datasets JSON-lines report gzipped and clean it record by
+                                     record, instead of converting it to TSV and cleaning that afterwards
+                                     (default: false)
+        --dedup_sequences BOOL       Align and build the tree from unique sequences only, then restore
+                                     duplicates as zero-length polytomies (default: true)
+        --alignment_method STR       "mafft": de novo MSA of all sequences; "reference": each sequence aligned
+                                     to the reference in parallel chunks, in reference coordinates (default: "mafft")
+        --alignment_reference FILE   Reference FASTA or reference alignment for "reference" mode
+                                     (default: --ref_fasta, then --multi_ref_file)
+        --alignment_chunk_size INT   Sequences per reference-guided alignment task (default: 500)
+        --phylogeny_workspace DIR    Keep the alignment and tree between runs; new sequences are added with
+                                     mafft --add --keeplength and placed on the stored tree (default: null)
+        --phylogeny_rebuild_ratio    FLOAT Rebuild the alignment and tree from scratch when more than this
+                                     share of sequences was added or removed (default: 0.3)
+        --alignment_masking BOOL     Drop gap/N-dominated columns and ragged ends before FastTree (default: true)
+        --mask_max_gap FLOAT         Maximum gap fraction of a column kept for FastTree (default: 0.9)
+        --mask_max_n FLOAT           Maximum N fraction of a column kept for FastTree (default: 0.9)
+        --mask_min_end_occupancy     FLOAT Trim leading/trailing columns where fewer sequences than this
+                                     fraction have a base (default: 0.5)
+        --preview_tree BOOL          Also build a quick neighbour-joining tree from sketch (Mash) distances,
+                                     without alignment, with a preview auspice JSON (default: false)
+        --preview_kmer INT           k-mer size of the preview tree sketches (default: 21)
+        --preview_sketch_size INT    Hashes per sketch for the preview tree (default: 1000)
 
         AUGUR AUSPICE OPTIONS
         ---------------------
@@ -144,6 +215,22 @@ def showHelp() {
         --priority                  Metric to prioritize for best reference selection (default: mapped). 
                                     Options: [ "mapped", "coverage", "score" ]. "score" combines both "mapped" and "coverage". 
         --keep_all_bams             If set, all BAMs and indices from consensus generation are retained. (Default: false)       
+        --taxid_include_descendants Also use references of descendant taxa (strains, subspecies) of each detected taxid,
+                                    resolved through the kraken db ktaxonomy.tsv. (Default: false)
+        --reference_cluster_identity
+                                    Minimum MinHash identity for fetched references to share a cluster; one representative
+                                    (most complete, longest) per cluster is used for consensus. (Default: 0.99)
+        --skip_reference_clustering Use every fetched reference for consensus generation. (Default: false)
+
+        CACHING:
+        --------
+        --cache_dir                 Persistent directory reused across runs (Default: null - caching disabled).
+                                    Stores reference sets and minimap2 indexes keyed by the SHA-256 of the reference FASTA,
+                                    so repeat runs for known pathogens skip the reference download and index build.
+                                    Also holds the taxid to accession index of each kraken db. Must be on storage visible to all tasks.
+        --reference_cache_max_gb    Size limit for cached references; least-recently-used sets are evicted (Default: 20)
+        --global_context_cache_max_gb Size limit for cached global context sets and their alignments;
+                                    least-recently-used sets are evicted (Default: 5)
 
     Example:
     --------
@@ -0,0 +1,27 @@
+process MASK_ALIGNMENT {
+    tag "masking alignment columns"
+    label 'process_medium'
+
+    container "${workflow.containerEngine == 'singularity' || workflow.containerEngine == 'apptainer' ? 
+    'docker://samordil/fieldbio-multiref:1.0.0' : 
+    'docker.io/samordil/fieldbio-multiref:1.0.0'}"
+
+    input:
+    tuple val(meta), path(aln_fasta)
+
+    output:
+    tuple val(meta), path("${prefix}.masked.fas")       , emit: fas
+    path "${prefix}.mask_report.tsv"                    , emit: report
+
+    script:     // This script is bundled with the pipeline, in kwtrp-peo/viralphyl/bin/
+    def args = task.ext.args ?: ''
+    prefix = task.ext.prefix ?: "${aln_fasta.simpleName}"
+
+    """
+    mask_alignment.py \\
+        --alignment $aln_fasta \\
+        --output ${prefix}.masked.fas \\
+        --report ${prefix}.mask_report.tsv \\
+        $args
+    """
+}
@@ -0,0 +1,27 @@
+process MERGE_ALIGNMENT_CHUNKS {
+    tag "merging alignment chunks"
+    label 'process_single'
+
+    container "${workflow.containerEngine == 'singularity' || workflow.containerEngine == 'apptainer' ? 
+    'docker://samordil/fieldbio-multiref:1.0.0' : 
+    'docker.io/samordil/fieldbio-multiref:1.0.0'}"
+
+    input:
+    tuple val(meta), path(chunks, stageAs: "chunks/*")
+    path reference
+
+    output:
+    tuple val(meta), path("${prefix}.fas")          , emit: fas
+
+    script:     // This script is bundled with the pipeline, in kwtrp-peo/viralphyl/bin/
+    def args = task.ext.args ?: ''
+    prefix = task.ext.prefix ?: "${meta.id}"
+
+    """
+    merge_alignment_chunks.py \\
+        --chunks $chunks \\
+        --reference $reference \\
+        --output ${prefix}.fas \\
+        $args
+    """
+}
@@ -0,0 +1,31 @@
+process NORMALISE_READS {
+    tag "${reads.simpleName}"
+    label 'process_medium'
+
+    container "${workflow.containerEngine == 'singularity' || workflow.containerEngine == 'apptainer' ? 
+    'docker://samordil/fieldbio-multiref:1.0.0' : 
+    'docker.io/samordil/fieldbio-multiref:1.0.0'}"
+
+    input:
+    tuple val(meta), path(reads)
+
+    output:
+    tuple val(meta), path("${reads.simpleName}.normalised.fastq.gz"),   emit: reads
+    path "${reads.simpleName}.normalisation.tsv",                       emit: report
+
+    when:
+    task.ext.when == null || task.ext.when
+
+    script:
+    // Check for optional commandline arguments
+    def args = task.ext.args ?: ''
+
+    """
+    normalize_reads.py \\
+        $args \\
+        --input $reads \\
+        --sample ${reads.simpleName} \\
+        --output ${reads.simpleName}.normalised.fastq.gz \\
+        --report ${reads.simpleName}.normalisation.tsv
+    """
+}
@@ -0,0 +1,38 @@
+process PHYLOGENY_WORKSPACE_PLAN {
+    tag "planning phylogeny update"
+    label 'process_single'
+
+    container "${workflow.containerEngine == 'singularity' || workflow.containerEngine == 'apptainer' ? 
+    'docker://samordil/fieldbio-multiref:1.0.0' : 
+    'docker.io/samordil/fieldbio-multiref:1.0.0'}"
+
+    // Make the persistent phylogeny workspace visible inside docker/podman containers
+    containerOptions { params.phylogeny_workspace && workflow.containerEngine in ['docker', 'podman'] ? "-v ${params.phylogeny_workspace}:${params.phylogeny_workspace}" : '' }
+
+    // The workspace changes outside the work directory, so the plan is never resumed from cache
+    cache false
+
+    input:
+    tuple val(meta), path(fasta)
+    val workspace
+    val method
+
+    output:
+    tuple val(meta), path("${prefix}.rebuild.fasta")                                                        , optional: true, emit: rebuild
+    tuple val(meta), path("${prefix}.base.fas"), path("${prefix}.base.tree"), path("${prefix}.new.fasta")   , optional: true, emit: incremental
+    tuple val(meta), path("${prefix}.current.fas"), path("${prefix}.current.tree")                          , optional: true, emit: unchanged
+    path "${prefix}.workspace_plan.json"                                                                    , emit: plan
+
+    script:     // This script is bundled with the pipeline, in kwtrp-peo/viralphyl/bin/
+    def args = task.ext.args ?: ''
+    prefix = task.ext.prefix ?: "${meta.id}"
+
+    """
+    phylogeny_workspace.py plan \\
+        --workspace $workspace \\
+        --fasta $fasta \\
+        --method '$method' \\
+        --prefix $prefix \\
+        $args
+    """
+}
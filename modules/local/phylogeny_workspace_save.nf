@@ -0,0 +1,32 @@
+process PHYLOGENY_WORKSPACE_SAVE {
+    tag "saving phylogeny workspace"
+    label 'process_single'
+
+    container "${workflow.containerEngine == 'singularity' || workflow.containerEngine == 'apptainer' ? 
+    'docker://samordil/fieldbio-multiref:1.0.0' : 
+    'docker.io/samordil/fieldbio-multiref:1.0.0'}"
+
+    // Make the persistent phylogeny workspace visible inside docker/podman containers
+    containerOptions { params.phylogeny_workspace && workflow.containerEngine in ['docker', 'podman'] ? "-v ${params.phylogeny_workspace}:${params.phylogeny_workspace}" : '' }
+
+    input:
+    path newick_file
+    tuple val(meta), path(aln_fasta)
+    tuple val(meta2), path(fasta)
+    val workspace
+    val method
+
+    output:
+    path "workspace_manifest.tsv"               , emit: manifest
+
+    script:     // This script is bundled with the pipeline, in kwtrp-peo/viralphyl/bin/
+    """
+    phylogeny_workspace.py save \\
+        --workspace $workspace \\
+        --fasta $fasta \\
+        --alignment $aln_fasta \\
+        --tree $newick_file \\
+        --method '$method' \\
+        --manifest-copy workspace_manifest.tsv
+    """
+}
@@ -0,0 +1,25 @@
+process PLACE_SEQUENCES {
+    tag "placing new sequences"
+    label 'process_single'
+
+    container "${workflow.containerEngine == 'singularity' || workflow.containerEngine == 'apptainer' ? 
+    'docker://samordil/fieldbio-multiref:1.0.0' : 
+    'docker.io/samordil/fieldbio-multiref:1.0.0'}"
+
+    input:
+    tuple val(meta), path(aln_fasta)
+    path newick_file
+    path new_fasta
+
+    output:
+    path "starting.tree"                        , emit: tree
+
+    script:     // This script is bundled with the pipeline, in kwtrp-peo/viralphyl/bin/
+    """
+    place_sequences.py \\
+        --alignment $aln_fasta \\
+        --tree $newick_file \\
+        --new $new_fasta \\
+        --output starting.tree
+    """
+}
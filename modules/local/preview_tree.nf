@@ -0,0 +1,32 @@
+process PREVIEW_TREE {
+    tag "building preview tree"
+    label 'process_medium'
+
+    container "${workflow.containerEngine == 'singularity' || workflow.containerEngine == 'apptainer' ? 
+    'docker://samordil/fieldbio-multiref:1.0.0' : 
+    'docker.io/samordil/fieldbio-multiref:1.0.0'}"
+
+    input:
+    tuple val(meta), path(fasta)
+    path metadata_tsv
+    path auspice_config_json
+    path color_config_tsv
+
+    output:
+    path "preview_tree.nwk"                             , emit: tree
+    path "preview_auspice_tree.json"                    , emit: auspice_json
+
+    script:     // This script is bundled with the pipeline, in kwtrp-peo/viralphyl/bin/
+    def args = task.ext.args ?: ''
+
+    """
+    preview_tree.py \\
+        --fasta $fasta \\
+        --metadata $metadata_tsv \\
+        --auspice-config $auspice_config_json \\
+        --colors $color_config_tsv \\
+        --output-tree preview_tree.nwk \\
+        --output-json preview_auspice_tree.json \\
+        $args
+    """
+}
@@ -0,0 +1,43 @@
+process PROXIMITY_SUBSAMPLE {
+    tag "proximity subsampling of global sequences"
+    label 'process_medium'
+
+    container "${workflow.containerEngine == 'singularity' || workflow.containerEngine == 'apptainer' ? 
+    'docker://samordil/fieldbio-multiref:1.0.0' : 
+    'docker.io/samordil/fieldbio-multiref:1.0.0'}"
+
+    input:
+    path global_fasta
+    path global_tsv
+    path query_fasta, stageAs: "query/*"
+    val seed
+    val max_sequence_value
+    val subsample_creteria
+
+    output:
+    path "${filename}_subsampled.fasta"             , emit: fasta
+    path "${filename}_subsampled_metadata.tsv"      , emit: tsv
+    path "${filename}_subsample_report.tsv"         , emit: report
+
+    script:     // This script is bundled with the pipeline, in kwtrp-peo/viralphyl/bin/
+    def args = task.ext.args ?: ''
+    filename = global_fasta.simpleName
+
+    // Check if seed is -1 then switch to random seed per run
+    def seed_value  = seed == -1 ? "" : "--seed $seed"
+
+    """
+    proximity_subsample.py \\
+        --global-fasta $global_fasta \\
+        --global-metadata $global_tsv \\
+        --query-fasta $query_fasta \\
+        --max-sequences $max_sequence_value \\
+        --group-by $subsample_creteria \\
+        $seed_value \\
+        --threads $task.cpus \\
+        --output-fasta ${filename}_subsampled.fasta \\
+        --output-metadata ${filename}_subsampled_metadata.tsv \\
+        --report ${filename}_subsample_report.tsv \\
+        $args
+    """
+}
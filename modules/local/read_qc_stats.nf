@@ -0,0 +1,36 @@
+process READ_QC_STATS {
+    tag "Read QC for ${sample_ids.size()} samples"
+    label 'process_medium'
+
+    container "${workflow.containerEngine == 'singularity' || workflow.containerEngine == 'apptainer' ? 
+    'docker://samordil/fieldbio-multiref:1.0.0' : 
+    'docker.io/samordil/fieldbio-multiref:1.0.0'}"
+
+    input:
+    tuple val(sample_ids), path(fastq_dirs, stageAs: "fastq_dir_?/*")
+
+    output:
+    path "*.read_qc.json"                   , emit: json
+    path "*_mqc.{tsv,json}"                 , emit: multiqc
+
+    when:
+    task.ext.when == null || task.ext.when
+
+    script:
+    // Check for optional commandline arguments
+    def args = task.ext.args ?: ''
+
+    // One "sample_id<TAB>fastq_dir" line per sample, written by a single printf
+    def dirs    = fastq_dirs instanceof List ? fastq_dirs : [fastq_dirs]
+    def samples = [sample_ids, dirs].transpose().collect { sample_id, dir -> "'${sample_id}' '${dir}'" }.join(' ')
+
+    """
+    printf '%s\\t%s\\n' ${samples} > samples.tsv
+
+    read_qc_stats.py \\
+        $args \\
+        --threads $task.cpus \\
+        --samples samples.tsv \\
+        --outdir ./
+    """
+}
@@ -0,0 +1,29 @@
+process SEQUENCING_SUMMARY_STATS {
+    tag "${sequencing_summary.name}"
+    label 'process_low'
+
+    container "${ workflow.containerEngine == 'singularity' && !task.ext.singularity_pull_docker_container ?
+        'oras://community.wave.seqera.io/library/pip_pandas_python-dateutil:d6988e7e56918bdb' :
+        'community.wave.seqera.io/library/pip_pandas_python-dateutil:62541a5d0213d960' }"
+
+    input:
+    path sequencing_summary
+
+    output:
+    path "sequencing_summary_stats.json"        , emit: json
+    path "*_mqc.{tsv,json}"                     , emit: multiqc
+
+    when:
+    task.ext.when == null || task.ext.when
+
+    script:
+    // Check for optional commandline arguments
+    def args = task.ext.args ?: ''
+
+    """
+    sequencing_summary_stats.py \\
+        $args \\
+        --input $sequencing_summary \\
+        --outdir ./
+    """
+}
@@ -0,0 +1,26 @@
+process SPLIT_CONTEXT_ALIGNMENT {
+    tag "splitting against cached context alignment"
+    label 'process_single'
+
+    container "${workflow.containerEngine == 'singularity' || workflow.containerEngine == 'apptainer' ? 
+    'docker://samordil/fieldbio-multiref:1.0.0' : 
+    'docker.io/samordil/fieldbio-multiref:1.0.0'}"
+
+    input:
+    path context_alignment
+    tuple val(meta), path(fasta)
+
+    output:
+    tuple val(meta), path("${prefix}.base.fas"), path("${prefix}.new.fasta")    , optional: true, emit: split
+    tuple val(meta), path("${prefix}.fas")                                      , optional: true, emit: complete
+
+    script:     // This script is bundled with the pipeline, in kwtrp-peo/viralphyl/bin/
+    prefix = task.ext.prefix ?: "${meta.id}"
+
+    """
+    split_context_alignment.py \\
+        --alignment $context_alignment \\
+        --fasta $fasta \\
+        --prefix $prefix
+    """
+}
@@ -0,0 +1,34 @@
+process TAXID_ACCESSION_LOOKUP {
+    tag "Lookup accessions for ${taxids.size()} taxids"
+    label 'process_single'
+
+    container "${ workflow.containerEngine == 'singularity' && !task.ext.singularity_pull_docker_container ?
+        'oras://community.wave.seqera.io/library/pip_pandas_python-dateutil:d6988e7e56918bdb' :
+        'community.wave.seqera.io/library/pip_pandas_python-dateutil:62541a5d0213d960' }"
+
+    // Make the persistent index directory visible inside docker/podman containers
+    containerOptions { params.cache_dir && workflow.containerEngine in ['docker', 'podman'] ? "-v ${params.cache_dir}:${params.cache_dir}" : '' }
+
+    input:
+    val(taxids)
+    path(kraken_db)
+
+    output:
+    path "*.accessions.txt",                emit: accessions
+
+    script:
+    // Check for optional commandline arguments
+    def args = task.ext.args ?: ''
+    def taxonomy = params.taxid_include_descendants ? "--taxonomy ${kraken_db}/ktaxonomy.tsv --include-descendants" : ''
+
+    """
+    printf '%s\\n' ${taxids.join(' ')} > taxids.txt
+
+    taxid_accession_index.py \\
+        $args \\
+        --map ${kraken_db}/seqid2taxid.map \\
+        $taxonomy \\
+        --taxids taxids.txt \\
+        --outdir ./
+    """
+}
@@ -4,10 +4,28 @@
 
 include { DATASETS_SUMMARY                                        } from '../../modules/local/datasets_summary'
 include { CLEAN_GLOBAL_METADATA                                   } from '../../modules/local/clean_global_metadata'
+include { DATASETS_SUMMARY_JSONL                                  } from '../../modules/local/datasets_summary_jsonl'
+include { DATASETS_INGEST_METADATA                                } from '../../modules/local/datasets_ingest_metadata'
 include { AUGUR_FILTER                                            } from '../../modules/local/augur_filter'
 include { EXTRACT_ACCESSIONS                                      } from '../../modules/local/extract_tsv_column'
 include { EPOST_ENTREZ_DIRECT                                     } from '../../modules/local/epost_entrez_direct'
 include { RENAME_FASTA_HEADER                                     } from '../../modules/local/rename_fasta_headers'
+include { PROXIMITY_SUBSAMPLE                                     } from '../../modules/local/proximity_subsample'
+include { GLOBAL_CONTEXT_STORE                                    } from '../../modules/local/global_context_store'
+
+import java.security.MessageDigest
+
+// Short SHA-256 of the settings and the metadata snapshot that define a global context set
+def globalContextKey(List settings, snapshot) {
+    def digest = MessageDigest.getInstance('SHA-256')
+    digest.update(settings.join('\t').getBytes('UTF-8'))
+    snapshot.withInputStream { stream ->
+        def buffer = new byte[1 << 16]
+        int n
+        while ((n = stream.read(buffer)) > 0) { digest.update(buffer, 0, n) }
+    }
+    return digest.digest().encodeHex().toString().take(16)
+}
 
 workflow CONTEXTUAL_GLOBAL_DATASET {
     take:
@@ -18,40 +36,95 @@ workflow CONTEXTUAL_GLOBAL_DATASET {
         seed_value              // subsampling seed
         max_sequence_value      // maximum number of sequences for the tree
         subsample_creteria      
+        subsample_strategy      // 'random' (augur filter) or 'proximity'
+        candidate_sequence_value // global sequences downloaded for proximity subsampling
+        query_fasta             // assembled query sequences
+        cache_dir               // persistent cache for downloaded context sets, or [] to disable
+        stream_metadata         // clean the datasets JSON-lines report directly, skipping TSV + CLEAN_GLOBAL_METADATA
 
     main:
         ch_versions = Channel.empty()
 
-        //
-        // MODULE: DATASETS_SUMMARY downlaods global sequences from NCBI
-        // using ncbi datasets cli tool
-        //
-        DATASETS_SUMMARY (
-            virus_taxon_name,
-            virus_host_name
-        )
-        ch_raw_ncbi_metadata        = DATASETS_SUMMARY.out.tsv
-        ch_versions                 = ch_versions.mix(DATASETS_SUMMARY.out.versions)
+        if (stream_metadata) {
+            //
+            // MODULE: DATASETS_SUMMARY_JSONL downloads ncbi's datasets JSON-lines report, gzipped
+            //
+            DATASETS_SUMMARY_JSONL (
+                virus_taxon_name,
+                virus_host_name
+            )
+            ch_versions                              = ch_versions.mix(DATASETS_SUMMARY_JSONL.out.versions)
+
+            //
+            // MODULE: DATASETS_INGEST_METADATA cleans the JSON-lines report record by record
+            // into the cleaned metadata, filtering by length and collection date
+            //
+            DATASETS_INGEST_METADATA (
+                DATASETS_SUMMARY_JSONL.out.jsonl,
+                virus_taxon_name,
+                min_value,
+                max_value
+            )
+            ch_cleaned_ncbi_datasets_metadata        = DATASETS_INGEST_METADATA.out.meta_tsv
+            ch_versions                              = ch_versions.mix(DATASETS_INGEST_METADATA.out.versions)
+        } else {
+            //
+            // MODULE: DATASETS_SUMMARY downlaods global sequences from NCBI
+            // using ncbi datasets cli tool
+            //
+            DATASETS_SUMMARY (
+                virus_taxon_name,
+                virus_host_name
+            )
+            ch_raw_ncbi_metadata        = DATASETS_SUMMARY.out.tsv
+            ch_versions                 = ch_versions.mix(DATASETS_SUMMARY.out.versions)
+
+            //
+            // MODULE: CLEAN_GLOBAL_METADATA take global tsv metadata downloaded using
+            // ncbi's datasets and dataformat and cleans it
+            //
+            CLEAN_GLOBAL_METADATA (
+                ch_raw_ncbi_metadata,
+                min_value,
+                max_value
+            )
+            ch_cleaned_ncbi_datasets_metadata        = CLEAN_GLOBAL_METADATA.out.meta_tsv
+            ch_versions                              = ch_versions.mix(CLEAN_GLOBAL_METADATA.out.versions)
+        }
 
         //
-        // MODULE: CLEAN_GLOBAL_METADATA take global tsv metadata downloaded using
-        // ncbi's datasets and dataformat and cleans it
+        // Context sets are cached by taxon, host, length bounds, subsampling settings and
+        // a hash of the cleaned metadata, so an unchanged NCBI snapshot is not downloaded again
         //
-        CLEAN_GLOBAL_METADATA (
-            ch_raw_ncbi_metadata,
-            min_value,
-            max_value
-        )
-        ch_cleaned_ncbi_datasets_metadata        = CLEAN_GLOBAL_METADATA.out.meta_tsv
-        ch_versions                              = ch_versions.mix(CLEAN_GLOBAL_METADATA.out.versions)
+        ch_context_pool         = Channel.empty()
+        ch_filter_input         = ch_cleaned_ncbi_datasets_metadata
+        if (cache_dir) {
+            def filter_sequences = subsample_strategy == 'proximity' ? candidate_sequence_value : max_sequence_value
+            ch_cleaned_ncbi_datasets_metadata
+                .map { tsv ->
+                    def key = globalContextKey([virus_taxon_name, virus_host_name, min_value, max_value,
+                                                seed_value, filter_sequences, subsample_creteria], tsv)
+                    [ "${cache_dir}/global_context/${key}", tsv ]
+                }
+                .branch { entry, tsv ->
+                    cached: file("${entry}/global.fasta").exists() && file("${entry}/global_metadata.tsv").exists()
+                    download: true
+                }.set { ch_context }
+
+            ch_filter_input     = ch_context.download.map { entry, tsv -> tsv }
+
+            // Mark reused entries as recently used, so size-bounded eviction keeps them
+            ch_context.cached.subscribe { entry, tsv -> file("${entry}/.last_access").text = "${System.currentTimeMillis()}\n" }
+        }
 
         //
         // MODULE: AUGUR_FILTER take the cleaned global tsv metadata perfomes subsampling
+        // With proximity subsampling it only caps the candidate set that is downloaded
         //
         AUGUR_FILTER (
-            ch_cleaned_ncbi_datasets_metadata,
+            ch_filter_input,
             seed_value,
-            max_sequence_value,
+            subsample_strategy == 'proximity' ? candidate_sequence_value : max_sequence_value,
             subsample_creteria
         )
         ch_subsampled_global_metadata        = AUGUR_FILTER.out.subsamples_tsv
@@ -85,8 +158,47 @@ workflow CONTEXTUAL_GLOBAL_DATASET {
         ch_sequence_fasta                   = RENAME_FASTA_HEADER.out.fasta
         // ch_versions                          = ch_versions.mix(RENAME_FASTA_HEADER.out.versions)
 
+        if (cache_dir) {
+            // Store a newly downloaded context set; reuse the stored one on a cache hit
+            GLOBAL_CONTEXT_STORE (
+                ch_context.download.map { entry, tsv -> entry }
+                    .combine(ch_sequence_fasta)
+                    .map { entry, fasta -> [ entry, fasta, 'global.fasta' ] }
+                    .mix(
+                        ch_context.download.map { entry, tsv -> entry }
+                            .combine(ch_metadata_tsv)
+                            .map { entry, tsv -> [ entry, tsv, 'global_metadata.tsv' ] }
+                    )
+            )
+            ch_metadata_tsv     = ch_context.cached.map { entry, tsv -> file("${entry}/global_metadata.tsv") }.mix(ch_metadata_tsv)
+            ch_sequence_fasta   = ch_context.cached.map { entry, tsv -> file("${entry}/global.fasta") }.mix(ch_sequence_fasta)
+
+            // Cache entry and the whole context set before proximity subsampling, aligned once per entry
+            ch_context_pool     = ch_context.cached.mix(ch_context.download)
+                                    .map { entry, tsv -> entry }
+                                    .combine(ch_sequence_fasta)
+        }
+
+        //
+        // MODULE: PROXIMITY_SUBSAMPLE keeps the nearest neighbours of each query and
+        // fills the rest of the budget with diverse representatives of the candidates
+        //
+        if (subsample_strategy == 'proximity') {
+            PROXIMITY_SUBSAMPLE (
+                ch_sequence_fasta,
+                ch_metadata_tsv,
+                query_fasta,
+                seed_value,
+                max_sequence_value,
+                subsample_creteria
+            )
+            ch_metadata_tsv                 = PROXIMITY_SUBSAMPLE.out.tsv
+            ch_sequence_fasta               = PROXIMITY_SUBSAMPLE.out.fasta
+        }
+
     emit:
         global_metadata_tsv                     = ch_metadata_tsv     // channel: [ .tsv ]
         global_seqs_fasta                       = ch_sequence_fasta        // channel: [ .fasta ]
+        context_pool                            = ch_context_pool          // channel: [ cache entry directory, .fasta ] set before proximity subsampling
         versions                                = ch_versions                       // channel: [ versions.yml ]
 }
@@ -6,6 +6,8 @@
 
 include { PREPARE_SAMPLESHEET               } from './samplesheet_subworkflow'
 include { NANOPLOT                          } from '../../modules/nf-core/nanoplot/main' 
+include { READ_QC_STATS                     } from '../../modules/local/read_qc_stats'
+include { SEQUENCING_SUMMARY_STATS          } from '../../modules/local/sequencing_summary_stats'
 include { MULTIQC as MULTIQC_AMP            } from '../../modules/nf-core/multiqc/main'
 include { MULTIQC as MULTIQC_META           } from '../../modules/nf-core/multiqc/main'
 
@@ -27,49 +29,69 @@ workflow QUALITY_CHECK {
         ch_samplesheet              // [sample_id, path_to_fastq_dir]
 
     main:
+        if (!(params.qc_engine.toLowerCase() in ['native', 'nanoplot'])) {
+            error "Invalid --qc_engine '${params.qc_engine}'. Choose either 'native' or 'nanoplot'."
+        }
+
         if (params.sequencing_summary) {
             // Define reference fasta channel
             Channel
                 .fromPath(params.sequencing_summary)
                 .set { ch_sequencing_summary }
 
-            // MODULE: Run sequencing qc using nanoplot
-            NANOPLOT (
-                ch_sequencing_summary.map { [ [id:'qc'], it ] }
-            )
-        } else {
-            // Run qc on individual samples if sequencing summary file not provided
-            NANOPLOT (
-                ch_samplesheet
-                .map { sample_id, dir_path ->
-                    tuple( id:sample_id, file("${dir_path}/*.fastq.gz") ) 
-                }
-            )
-
-            // Aggregate nanoplot qc report into one report for amplicon
-            if (params.protocol.toLowerCase() == 'amplicon') {
-                MULTIQC_AMP (
-                    NANOPLOT.out.txt
-                    .map { it[1] }
-                    .collect(),
-                    [], [], [], [], []
+            if (params.qc_engine.toLowerCase() == 'native') {
+                // MODULE: Stream the summary once, per barcode and per time bin
+                SEQUENCING_SUMMARY_STATS (
+                    ch_sequencing_summary
                 )
-                report_html = MULTIQC_AMP.out.report
-            } 
-            // Aggregate nanoplot qc report into one report for metagenomics
-            else if (params.protocol.toLowerCase() == 'metagenomics') {
-                MULTIQC_META (
-                    NANOPLOT.out.txt
-                    .map { it[1] }
-                    .collect(),
-                    [], [], [], [], []
+                ch_qc_reports = SEQUENCING_SUMMARY_STATS.out.multiqc.flatten()
+            } else {
+                // MODULE: Run sequencing qc using nanoplot
+                NANOPLOT (
+                    ch_sequencing_summary.map { [ [id:'qc'], it ] }
                 )
-                report_html = MULTIQC_META.out.report
+                ch_qc_reports = NANOPLOT.out.txt.map { it[1] }
             }
-            else {
-                error "Invalid protocol specified: ${params.protocol}. Must be 'amplicon' or 'metagenomics'"
+        } else {
+            if (params.qc_engine.toLowerCase() == 'native') {
+                // Stream all samples through one native QC process pool
+                READ_QC_STATS (
+                    ch_samplesheet
+                    .toList()
+                    .map { rows -> [ rows.collect { it[0] }, rows.collect { it[1] } ] }
+                )
+                ch_qc_reports = READ_QC_STATS.out.multiqc.flatten()
+            } else {
+                // Run qc on individual samples if sequencing summary file not provided
+                NANOPLOT (
+                    ch_samplesheet
+                    .map { sample_id, dir_path ->
+                        tuple( id:sample_id, file("${dir_path}/*.fastq.gz") ) 
+                    }
+                )
+                ch_qc_reports = NANOPLOT.out.txt.map { it[1] }
             }
         }
+
+        // Aggregate qc reports into one report for amplicon
+        if (params.protocol.toLowerCase() == 'amplicon') {
+            MULTIQC_AMP (
+                ch_qc_reports.collect(),
+                [], [], [], [], []
+            )
+            report_html = MULTIQC_AMP.out.report
+        } 
+        // Aggregate qc reports into one report for metagenomics
+        else if (params.protocol.toLowerCase() == 'metagenomics') {
+            MULTIQC_META (
+                ch_qc_reports.collect(),
+                [], [], [], [], []
+            )
+            report_html = MULTIQC_META.out.report
+        }
+        else {
+            error "Invalid protocol specified: ${params.protocol}. Must be 'amplicon' or 'metagenomics'"
+        }
     
     emit:
         multiqc_html_report = report_html
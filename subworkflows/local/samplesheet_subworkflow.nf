@@ -6,6 +6,7 @@
 
 include { GENERATE_SAMPLESHEET as GENERATE_SAMPLESHEET_AMP   } from '../../modules/local/generate_samplesheet'
 include { GENERATE_SAMPLESHEET as GENERATE_SAMPLESHEET_META  } from '../../modules/local/generate_samplesheet'
+include { CHECK_FASTQ_INTEGRITY                              } from '../../modules/local/check_fastq_integrity'
 
 
  /*
@@ -26,6 +27,9 @@ workflow PREPARE_SAMPLESHEET {
     if (params.metadata_tsv) { ch_metadata_tsv = file(params.metadata_tsv) } else { ch_metadata_tsv = [] }
 
 
+    // Make sure the directory of a persistent scan manifest exists (needed for container mounts)
+    if (params.samplesheet_manifest) { file(params.samplesheet_manifest).parent.mkdirs() }
+
     // Define fastq_pass directory channel
     Channel                                                     // Get raw fastq directory
         .fromPath(params.fastq_dir, type: 'dir', maxDepth: 1)
@@ -48,11 +52,7 @@ workflow PREPARE_SAMPLESHEET {
             )
             
             raw_csv_file = GENERATE_SAMPLESHEET_AMP.out.samplesheet
-
-            GENERATE_SAMPLESHEET_AMP.out.samplesheet
-                .splitCsv(header:true)
-                .map { row-> tuple(row.strain_id, file(row.fastq_dir)) }
-                .set { ch_samplesheet }
+            sample_status = GENERATE_SAMPLESHEET_AMP.out.status
         } else if (params.protocol.toLowerCase() == 'metagenomics') {
             // MODULE: Run bin/viraphly_samplesheet_generator.py to generate samplesheet
             GENERATE_SAMPLESHEET_META (
@@ -61,16 +61,32 @@ workflow PREPARE_SAMPLESHEET {
             )
             
             raw_csv_file = GENERATE_SAMPLESHEET_META.out.samplesheet
-
-            GENERATE_SAMPLESHEET_META.out.samplesheet
-                .splitCsv(header:true)
-                .map { row-> tuple(row.strain_id, file(row.fastq_dir)) }
-                .set { ch_samplesheet }
+            sample_status = GENERATE_SAMPLESHEET_META.out.status
         } else {
             error "Invalid protocol specified: ${params.protocol}. Must be 'amplicon' or 'metagenomics'"
         }
+
+        // MODULE: Pre-flight gzip/FASTQ check of every input file before any compute is spent on it
+        if (params.check_fastq_integrity) {
+            CHECK_FASTQ_INTEGRITY (
+                raw_csv_file,
+                ch_fastq_data_dir
+            )
+            checked_csv_file = CHECK_FASTQ_INTEGRITY.out.samplesheet
+            integrity_report = CHECK_FASTQ_INTEGRITY.out.report
+        } else {
+            checked_csv_file = raw_csv_file
+            integrity_report = Channel.empty()
+        }
+
+        checked_csv_file
+            .splitCsv(header:true)
+            .map { row-> tuple(row.strain_id, file(row.fastq_dir)) }
+            .set { ch_samplesheet }
     
     emit:
         raw_samplesheet_csv            = raw_csv_file 
         samplesheet_ch                 = ch_samplesheet    
+        sample_status                  = sample_status      // [ tsv ] new/changed/unchanged/removed per barcode (with --samplesheet_manifest)
+        integrity_report               = integrity_report   // [ tsv ] per-file gzip/FASTQ check (with --check_fastq_integrity)
 }
\ No newline at end of file
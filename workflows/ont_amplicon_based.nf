@@ -6,15 +6,32 @@
  include { PREPARE_SAMPLESHEET                  } from '../subworkflows/local/samplesheet_subworkflow'
  include { QUALITY_CHECK                        } from '../subworkflows/local/qc_subworkflow'
  include { ARTIC_GUPPYPLEX                      } from '../modules/local/artic_guppyplex'
+ include { CONCAT_BARCODE_READS                 } from '../modules/local/concat_barcode_reads'
+ include { NORMALISE_READS                      } from '../modules/local/normalise_reads'
  include { ARTIC_MINION                         } from '../modules/local/artic_minion'
  include { COLLAPSE_PRIMER_BED                  } from '../modules/local/collapse_primer_bed'
  include { PLOT_MOSDEPTH_REGIONS                } from '../modules/local/plot_mosdepth_region.nf'
+ include { AMPLICON_DEPTH                       } from '../modules/local/amplicon_depth'
  include { GET_ASSEMBLY_STATS                   } from '../modules/local/get_assembly_stats'
  include { GET_GENOTYPES                        } from '../modules/local/get_genotypes'
+ include { CONSENSUS_QC                         } from '../modules/local/consensus_qc'
  include { AGGREGATE_ASSEMBLY_TSVS              } from '../modules/local/aggregate_assembly_tsv'
  include { FASTA_META_FILTER                    } from '../modules/local/fasta_meta_filter'
  include { CONTEXTUAL_GLOBAL_DATASET            } from '../subworkflows/local/contextual_global_dataset'
  include { PHYLO_COMBINE_TSVS                   } from '../modules/local/phylo_combine_tsv'
+ include { DEDUP_SEQUENCES                      } from '../modules/local/dedup_sequences'
+ include { EXPAND_DUPLICATES                    } from '../modules/local/expand_duplicates'
+ include { MERGE_ALIGNMENT_CHUNKS               } from '../modules/local/merge_alignment_chunks'
+ include { PHYLOGENY_WORKSPACE_PLAN             } from '../modules/local/phylogeny_workspace_plan'
+ include { PLACE_SEQUENCES                      } from '../modules/local/place_sequences'
+ include { FASTTREE_INTREE                      } from '../modules/local/fasttree_intree'
+ include { PHYLOGENY_WORKSPACE_SAVE             } from '../modules/local/phylogeny_workspace_save'
+ include { SPLIT_CONTEXT_ALIGNMENT              } from '../modules/local/split_context_alignment'
+ include { GLOBAL_CONTEXT_STORE as GLOBAL_ALIGNMENT_STORE } from '../modules/local/global_context_store'
+ include { MASK_ALIGNMENT                       } from '../modules/local/mask_alignment'
+ include { MASK_ALIGNMENT as MASK_UPDATED_ALIGNMENT } from '../modules/local/mask_alignment'
+ include { PREVIEW_TREE                         } from '../modules/local/preview_tree'
+ include { AUSPICE_CONFIG as PREVIEW_AUSPICE_CONFIG } from '../modules/local/auspice_config'
  include { AUGUR_TRANSFORM                      } from '../subworkflows/local/augur_transformation'
 
  /*
@@ -25,6 +42,10 @@
 include { MOSDEPTH                             } from '../modules/nf-core/mosdepth/main'
 include { SEQKIT_SEQ                           } from '../modules/nf-core/seqkit/seq/main'
 include { MAFFT_ALIGN                          } from '../modules/nf-core/mafft/align/main'
+include { MAFFT_ALIGN as MAFFT_ADDFRAGMENTS    } from '../modules/nf-core/mafft/align/main'
+include { MAFFT_ALIGN as MAFFT_ADD             } from '../modules/nf-core/mafft/align/main'
+include { MAFFT_ALIGN as MAFFT_ALIGN_CONTEXT   } from '../modules/nf-core/mafft/align/main'
+include { MAFFT_ALIGN as MAFFT_ADD_LOCAL       } from '../modules/nf-core/mafft/align/main'
 include { FASTTREE                             } from '../modules/nf-core/fasttree/main'
 
 /*
@@ -107,10 +128,45 @@ workflow AMPLICON_BASED {
         ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
         */
 
-        // MODULE: Run artic guppyplex
-        ARTIC_GUPPYPLEX (
-            PREPARE_SAMPLESHEET.out.samplesheet_ch
-        )
+        // MODULE: Merge the per-batch fastq files of each barcode
+        if (params.read_merge_mode.toLowerCase() == 'guppyplex') {
+            ARTIC_GUPPYPLEX (
+                PREPARE_SAMPLESHEET.out.samplesheet_ch
+            )
+            ARTIC_GUPPYPLEX.out.fastq_gz
+                .set { ch_merged_reads }
+        } else if (params.read_merge_mode.toLowerCase() in ['concat', 'filter']) {
+            // Byte-level gzip concatenation, or parallel length/quality filtering
+            CONCAT_BARCODE_READS (
+                PREPARE_SAMPLESHEET.out.samplesheet_ch
+            )
+            CONCAT_BARCODE_READS.out.reads
+                .map { sample_id, fastq -> fastq }
+                .set { ch_merged_reads }
+
+            CONCAT_BARCODE_READS.out.stats
+                .collectFile(name: 'read_merge_summary.tsv', keepHeader: true, skip: 1,
+                             storeDir: "${params.outdir}/read_merge")
+        } else {
+            error "Invalid --read_merge_mode '${params.read_merge_mode}'. Choose 'guppyplex', 'concat' or 'filter'."
+        }
+
+        // MODULE: Cap read depth before assembly
+        if (params.read_norm_target_depth) {
+            NORMALISE_READS (
+                ch_merged_reads.map { fastq -> [ fastq.simpleName, fastq ] }
+            )
+            NORMALISE_READS.out.reads
+                .map { sample_id, fastq -> fastq }
+                .set { ch_assembly_reads }
+
+            NORMALISE_READS.out.report
+                .collectFile(name: 'read_normalisation_summary.tsv', keepHeader: true, skip: 1,
+                             storeDir: "${params.outdir}/read_normalisation")
+        } else {
+            ch_merged_reads
+                .set { ch_assembly_reads }
+        }
 
         // MODULE: Run artic minion
         ARTIC_MINION (
@@ -119,7 +175,7 @@ workflow AMPLICON_BASED {
             ch_select_ref_file,                  // optional multi-reference file
             ch_ref_fasta,                       // reference fasta file - required
             ch_ref_bed,                         // reference bed file - required
-            ARTIC_GUPPYPLEX.out.fastq_gz        // concatenated sample fastq file
+            ch_assembly_reads                   // concatenated (optionally normalised) sample fastq file
         )
 
         // Clean up primer bed for plotting
@@ -127,25 +183,42 @@ workflow AMPLICON_BASED {
             ARTIC_MINION.out.bed
         )
 
-        // Generate regions/amplicon  
-        // requeires a .BED, .BAM and .BAI files [ seqId, bam, bai, bed ]
-        MOSDEPTH (
-            ARTIC_MINION.out.bam_primertrimmed
-                .map { bam_file -> tuple(id:bam_file.simpleName, bam_file) }
-                .join( 
-                    ARTIC_MINION.out.bai_primertrimmed.map { bai_file -> tuple(id:bai_file.simpleName, bai_file)}, by: [0]
-                ).join(
-                    COLLAPSE_PRIMER_BED.out.collapsed_bed.map { bed_file -> tuple(id:bed_file.simpleName, bed_file)}, by: [0]
-                ),
-            [ [:], [] ] 
-        )
+        // Per-sample primer-trimmed BAM, index and collapsed primer BED [ meta, bam, bai, bed ]
+        ARTIC_MINION.out.bam_primertrimmed
+            .map { bam_file -> tuple(id:bam_file.simpleName, bam_file) }
+            .join( 
+                ARTIC_MINION.out.bai_primertrimmed.map { bai_file -> tuple(id:bai_file.simpleName, bai_file)}, by: [0]
+            ).join(
+                COLLAPSE_PRIMER_BED.out.collapsed_bed.map { bed_file -> tuple(id:bed_file.simpleName, bed_file)}, by: [0]
+            )
+            .set { ch_depth_input }
+
+        if (params.depth_engine.toLowerCase() == 'native') {
+            // MODULE: Per-base, per-amplicon and genome coverage of all samples in one pysam pass
+            AMPLICON_DEPTH (
+                ch_depth_input
+                    .toList()
+                    .filter { rows -> rows }
+                    .map { rows -> tuple(rows.collect { it[0].id }, rows.collect { it[1] }, rows.collect { it[2] }, rows.collect { it[3] }) }
+            )
+        } else if (params.depth_engine.toLowerCase() == 'mosdepth') {
+            // Generate regions/amplicon  
+            // requeires a .BED, .BAM and .BAI files [ seqId, bam, bai, bed ]
+            MOSDEPTH (
+                ch_depth_input,
+                [ [:], [] ] 
+            )
 
-        // Generate mosdepth plots for visualization
-        PLOT_MOSDEPTH_REGIONS (
-            MOSDEPTH.out.regions_bed.map {
-                bed_gz -> bed_gz[1]
-            }.collect()
-        )
+            // Generate mosdepth plots for visualization
+            PLOT_MOSDEPTH_REGIONS (
+                MOSDEPTH.out.regions_bed.map {
+                    bed_gz -> bed_gz[1]
+                }.collect(),
+                COLLAPSE_PRIMER_BED.out.collapsed_bed.first()       // amplicon intervals shared by every sample
+            )
+        } else {
+            error "Invalid depth engine specified: ${params.depth_engine}. Must be 'native' or 'mosdepth'"
+        }
 
         // Get assembly statistics
         GET_ASSEMBLY_STATS (
@@ -160,10 +233,16 @@ workflow AMPLICON_BASED {
             ch_genotypes = Channel.empty()
         }
 
+        // Vectorised QC metrics (N content, ambiguity, ACGT runs, GC, length) of every consensus genome
+        CONSENSUS_QC (
+            ARTIC_MINION.out.fasta.collect(),
+            params.ref_fasta ? file(params.ref_fasta) : []
+        )
+
         // Concatenate all tsv channels then collect into a single channel
         AGGREGATE_ASSEMBLY_TSVS {
             PREPARE_SAMPLESHEET.out.raw_samplesheet_csv
-                .concat( GET_ASSEMBLY_STATS.out.tsv, ch_genotypes )
+                .concat( GET_ASSEMBLY_STATS.out.tsv, ch_genotypes, CONSENSUS_QC.out.tsv )
                 .collect()
         }
        // Clean fasta headers and filter for phylogenetics
@@ -190,12 +269,20 @@ workflow AMPLICON_BASED {
         global_fasta_ch            = Channel.empty()
         global_tsv_ch              = Channel.empty()
 
+        // Downloaded context sets and their alignment are cached when the subsampling is reproducible
+        use_context_cache          = params.cache_dir && params.cache_global_context && params.subsample_seed != -1 &&
+                                        !(params.global_fasta && params.global_metadata_tsv)
+
         if (params.global_fasta && params.global_metadata_tsv) { 
             // Runs when global fasta and tsv are provided by the user
             Channel.fromPath(params.global_fasta).set { global_fasta_ch } 
             Channel.fromPath(params.global_metadata_tsv).set { global_tsv_ch } 
 
         } else {
+            if (!(params.subsample_strategy.toLowerCase() in ['proximity', 'random'])) {
+                error "Invalid subsample strategy specified: ${params.subsample_strategy}. Must be 'proximity' or 'random'"
+            }
+
             // If global dataset not provided download the global dataset and subsample
             CONTEXTUAL_GLOBAL_DATASET (
                 params.viral_host,
@@ -204,7 +291,12 @@ workflow AMPLICON_BASED {
                 params.max_sequence_length,
                 params.subsample_seed,
                 params.subsample_max_sequences,
-                params.subsample_by
+                params.subsample_by,
+                params.subsample_strategy.toLowerCase(),
+                params.subsample_candidates,
+                assembled_fasta_ch.collect().ifEmpty([]),
+                use_context_cache ? params.cache_dir : [],
+                params.stream_global_metadata
             )
 
             // subsample globa metadata and sequences
@@ -229,25 +321,213 @@ workflow AMPLICON_BASED {
         SEQKIT_SEQ (
                     combined_fasta_ch
                 )
+        align_input_ch = SEQKIT_SEQ.out.fastx
+
+        // Alignment-free preview tree, ready long before the alignment and FastTree finish
+        if (params.preview_tree) {
+            PREVIEW_AUSPICE_CONFIG (
+                PHYLO_COMBINE_TSVS.out.tsv.map{ [[:], it] }
+            )
+
+            PREVIEW_TREE (
+                SEQKIT_SEQ.out.fastx,
+                PHYLO_COMBINE_TSVS.out.tsv,
+                PREVIEW_AUSPICE_CONFIG.out.json,
+                PREVIEW_AUSPICE_CONFIG.out.tsv
+            )
+        }
+
+        // Keep one representative per identical sequence for alignment and tree building
+        if (params.dedup_sequences) {
+            DEDUP_SEQUENCES (
+                SEQKIT_SEQ.out.fastx
+            )
+            align_input_ch = DEDUP_SEQUENCES.out.fasta
+        }
+
+        def alignment_reference = params.alignment_reference ?: params.ref_fasta ?: params.multi_ref_file
+        full_build_ch = align_input_ch
+
+        // With a phylogeny workspace, a full alignment and tree are only built when too much changed
+        if (params.phylogeny_workspace) {
+            workspace_dir    = "${params.phylogeny_workspace}/${params.viral_taxon.replaceAll(/[^A-Za-z0-9_.-]/, '_')}"
+            workspace_method = params.alignment_method.toLowerCase() == 'reference' && alignment_reference ?
+                                "reference:${file(alignment_reference).name}" : params.alignment_method.toLowerCase()
+
+            PHYLOGENY_WORKSPACE_PLAN (
+                align_input_ch,
+                workspace_dir,
+                workspace_method
+            )
+            full_build_ch = PHYLOGENY_WORKSPACE_PLAN.out.rebuild
+        }
 
         // Align the sequences
-        MAFFT_ALIGN (
-            SEQKIT_SEQ.out.fastx,
-            [[:], []], [[:], []], [[:], []],
-            [[:], []], [[:], []], []
+        if (params.alignment_method.toLowerCase() == 'reference') {
+            // Align chunks of sequences independently to the reference (--keeplength), then merge
+            if (!alignment_reference) {
+                error "Reference alignment needs --alignment_reference, --ref_fasta or --multi_ref_file"
+            }
+            ch_alignment_reference = file(alignment_reference, checkIfExists: true)
+
+            full_build_ch
+                .flatMap { meta, fasta -> fasta.splitFasta(by: params.alignment_chunk_size, file: true) }
+                .multiMap { chunk ->
+                    reference: [ [id: chunk.baseName], ch_alignment_reference ]
+                    fragments: [ [id: chunk.baseName], chunk ]
+                }.set { alignment_chunks_ch }
+
+            MAFFT_ADDFRAGMENTS (
+                alignment_chunks_ch.reference,
+                [[:], []],
+                alignment_chunks_ch.fragments,
+                [[:], []], [[:], []], [[:], []], []
+                )
+
+            MERGE_ALIGNMENT_CHUNKS (
+                MAFFT_ADDFRAGMENTS.out.fas.map{ it[1] }.collect().map{ [ [id:"Concatenate"], it ] },
+                ch_alignment_reference
             )
+            aligned_ch = MERGE_ALIGNMENT_CHUNKS.out.fas
+
+        } else if (params.alignment_method.toLowerCase() == 'mafft' && use_context_cache) {
+            // Align each cached context set once, candidate pool included; the rows selected by this run
+            // are sliced from it and only the local sequences are added, whatever proximity picks
+            CONTEXTUAL_GLOBAL_DATASET.out.context_pool
+                .branch { entry, fasta ->
+                    cached: file("${entry}/global_alignment.fas").exists()
+                    align: true
+                }.set { context_alignment_ch }
+
+            MAFFT_ALIGN_CONTEXT (
+                context_alignment_ch.align.map { entry, fasta -> [ [id:"global_context"], fasta ] },
+                [[:], []], [[:], []], [[:], []],
+                [[:], []], [[:], []], []
+                )
+
+            GLOBAL_ALIGNMENT_STORE (
+                context_alignment_ch.align.map { entry, fasta -> entry }
+                    .combine(MAFFT_ALIGN_CONTEXT.out.fas.map{ it[1] })
+                    .map { entry, aln -> [ entry, aln, 'global_alignment.fas' ] }
+            )
+
+            SPLIT_CONTEXT_ALIGNMENT (
+                context_alignment_ch.cached.map { entry, fasta -> file("${entry}/global_alignment.fas") }
+                    .mix(MAFFT_ALIGN_CONTEXT.out.fas.map{ it[1] }),
+                full_build_ch
+            )
+            SPLIT_CONTEXT_ALIGNMENT.out.split
+                .multiMap { meta, base_aln, new_fasta ->
+                    alignment: [ meta, base_aln ]
+                    add: [ meta, new_fasta ]
+                }.set { context_split_ch }
+
+            MAFFT_ADD_LOCAL (
+                context_split_ch.alignment,
+                context_split_ch.add,
+                [[:], []], [[:], []], [[:], []], [[:], []], []
+                )
+            aligned_ch = MAFFT_ADD_LOCAL.out.fas.mix(SPLIT_CONTEXT_ALIGNMENT.out.complete)
+
+        } else if (params.alignment_method.toLowerCase() == 'mafft') {
+            MAFFT_ALIGN (
+                full_build_ch,
+                [[:], []], [[:], []], [[:], []],
+                [[:], []], [[:], []], []
+                )
+            aligned_ch = MAFFT_ALIGN.out.fas
+
+        } else {
+            error "Invalid alignment method specified: ${params.alignment_method}. Must be 'mafft' or 'reference'"
+        }
         
+        // Drop gap/N-dominated columns and ragged ends from the tree input; augur keeps the full alignment
+        tree_input_ch = aligned_ch
+        if (params.alignment_masking) {
+            MASK_ALIGNMENT (
+                aligned_ch
+            )
+            tree_input_ch = MASK_ALIGNMENT.out.fas
+        }
+
         // Gererate the phylogenetic tree
         FASTTREE (
-            MAFFT_ALIGN.out.fas.map{it[1]}
+            tree_input_ch.map{it[1]}
         )
+        phylogeny_ch = FASTTREE.out.phylogeny
+
+        if (params.phylogeny_workspace) {
+            // Add only the new sequences to the stored alignment and place them on the stored tree
+            PHYLOGENY_WORKSPACE_PLAN.out.incremental
+                .multiMap { meta, base_aln, base_tree, new_fasta ->
+                    alignment: [ meta, base_aln ]
+                    add: [ meta, new_fasta ]
+                    tree: base_tree
+                    fasta: new_fasta
+                }.set { workspace_update_ch }
+
+            MAFFT_ADD (
+                workspace_update_ch.alignment,
+                workspace_update_ch.add,
+                [[:], []], [[:], []], [[:], []], [[:], []], []
+                )
+
+            PLACE_SEQUENCES (
+                MAFFT_ADD.out.fas,
+                workspace_update_ch.tree,
+                workspace_update_ch.fasta
+            )
+
+            updated_tree_input_ch = MAFFT_ADD.out.fas
+            if (params.alignment_masking) {
+                MASK_UPDATED_ALIGNMENT (
+                    MAFFT_ADD.out.fas
+                )
+                updated_tree_input_ch = MASK_UPDATED_ALIGNMENT.out.fas
+            }
+
+            // FastTree refines the starting tree instead of building one from scratch
+            FASTTREE_INTREE (
+                updated_tree_input_ch.map{it[1]},
+                PLACE_SEQUENCES.out.tree
+            )
+
+            // Exactly one of rebuild, incremental or unchanged produces the final alignment and tree
+            aligned_ch      = aligned_ch
+                                .mix(MAFFT_ADD.out.fas)
+                                .mix(PHYLOGENY_WORKSPACE_PLAN.out.unchanged.map{ meta, aln, tree -> [ meta, aln ] })
+            phylogeny_ch    = phylogeny_ch
+                                .mix(FASTTREE_INTREE.out.phylogeny)
+                                .mix(PHYLOGENY_WORKSPACE_PLAN.out.unchanged.map{ meta, aln, tree -> tree })
+
+            PHYLOGENY_WORKSPACE_SAVE (
+                phylogeny_ch,
+                aligned_ch,
+                align_input_ch,
+                workspace_dir,
+                workspace_method
+            )
+        }
+        tree_ch        = phylogeny_ch
+        alignment_ch   = aligned_ch
+
+        // Restore the collapsed duplicates as zero-length polytomies on the tree and alignment
+        if (params.dedup_sequences) {
+            EXPAND_DUPLICATES (
+                phylogeny_ch,
+                aligned_ch,
+                DEDUP_SEQUENCES.out.duplicates
+            )
+            tree_ch        = EXPAND_DUPLICATES.out.phylogeny
+            alignment_ch   = EXPAND_DUPLICATES.out.fas
+        }
 
         // AUGUR_TRANSFORM: (Includes augur refine, augur traits and augur export)
         // Generate json file for visualization using auspice
         //
         AUGUR_TRANSFORM (
-            FASTTREE.out.phylogeny.map{ [[:], it] },            // tree file in newick
-            MAFFT_ALIGN.out.fas,                                // Aligned sequences
+            tree_ch.map{ [[:], it] },                           // tree file in newick
+            alignment_ch,                                       // Aligned sequences
             PHYLO_COMBINE_TSVS.out.tsv.map{ [[:], it] }         // metadata in tsv
         )
     }
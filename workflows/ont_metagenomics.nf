@@ -6,12 +6,16 @@
 include { PREPARE_SAMPLESHEET            } from '../subworkflows/local/samplesheet_subworkflow'
 include { QUALITY_CHECK                  } from '../subworkflows/local/qc_subworkflow'
 include { HUMAN_GENOME_PROCESSING        } from '../subworkflows/local/process_human_genome'
+include { CONCAT_BARCODE_READS           } from '../modules/local/concat_barcode_reads'
 include { DEPLETE_HUMAN_READS            } from '../modules/local/deplete_human_reads'
 include { MASH_WORKFLOW                  } from '../subworkflows/local/mash_classification_sub_workflow'
 include { KRAKEN2_WORKFLOW               } from '../subworkflows/local/kraken2_classification_workflow'
 include { FILTER_PRIORITY_PATHOGENS      } from '../modules/local/filter_priority_pathogen'
 include { KRAKENTOOLS_EXTRACTKRAKENREADS } from '../modules/local/extract_kraken_reads'
+include { NORMALISE_READS                } from '../modules/local/normalise_reads'
+include { TAXID_ACCESSION_LOOKUP         } from '../modules/local/taxid_accession_lookup'
 include { FETCH_FEFERENCE_FASTA          } from '../modules/local/fetch_reference_from_taxid'
+include { CURATE_REFERENCES              } from '../modules/local/curate_references'
 include { GENERATE_CONSENSUS             } from '../modules/local/generate_consensus'
 include { METAGENOMICS_ASSEMBLY_STATS    } from '../modules/local/json_to_tsv'
 
@@ -56,11 +60,27 @@ workflow METAGENOMICS {
     // Module adopter trimming
     if (!params.skip_classification) {
 
+        // Merge each barcode into one fastq first when requested, else hand porechop the raw directory
+        if (params.read_merge_mode.toLowerCase() in ['concat', 'filter']) {
+            CONCAT_BARCODE_READS (
+                PREPARE_SAMPLESHEET.out.samplesheet_ch
+            )
+            CONCAT_BARCODE_READS.out.reads
+                .set { ch_raw_reads }                   // [ sample_id, fastq_gz ]
+
+            CONCAT_BARCODE_READS.out.stats
+                .collectFile(name: 'read_merge_summary.tsv', keepHeader: true, skip: 1,
+                             storeDir: "${params.outdir}/read_merge")
+        } else {
+            PREPARE_SAMPLESHEET.out.samplesheet_ch
+                .set { ch_raw_reads }                   // [ sample_id, fastq_dir ]
+        }
+
         // Trim sequencing adapters
         PORECHOP_ABI (
-            PREPARE_SAMPLESHEET.out.samplesheet_ch
-            .map { sample_id, dir_path ->
-                [ [id:sample_id], dir_path ]
+            ch_raw_reads
+            .map { sample_id, reads ->
+                [ [id:sample_id], reads ]
             },
             []
         ) 
@@ -183,27 +203,83 @@ workflow METAGENOMICS {
             extract_kraken_ch        // [[a,b,c,d], [e,f,g]]
         )
 
+        // Cap read depth per taxon before consensus generation
+        if (params.read_norm_target_depth) {
+            NORMALISE_READS (
+                KRAKENTOOLS_EXTRACTKRAKENREADS.out.extracted_kraken2_reads
+                    .map { taxid, sample_id, name, fastq -> [ [taxid, sample_id, name], fastq ] }
+            )
+            NORMALISE_READS.out.reads
+                .map { meta, fastq -> [ meta[0], meta[1], meta[2], fastq ] }
+                .set { extracted_reads_ch }         // [ taxid, sample_id, name, fastq ]
+
+            NORMALISE_READS.out.report
+                .collectFile(name: 'read_normalisation_summary.tsv', keepHeader: true, skip: 1,
+                             storeDir: "${params.outdir}/read_normalisation")
+        } else {
+            KRAKENTOOLS_EXTRACTKRAKENREADS.out.extracted_kraken2_reads
+                .set { extracted_reads_ch }
+        }
+
         // Get the unique taxids for references downlod through accessions
         taxid_ch.unique{ it[1] }               // remove duplicate taxids
             .map{ sample_id, taxid, name -> 
                     taxid }
             .set { unique_taxid_ch }
             
-        // Get the map file for taxid:acession from kraken db directory
-        KRAKEN2_WORKFLOW.out.db
-            .map { db_dir -> file("${db_dir}/seqid2taxid.map") }  
-            .set { taxid_map_ch }
+        // Reuse reference sets already held in the persistent cache, download the rest
+        if (params.cache_dir) { file("${params.cache_dir}/references").mkdirs() }
+
+        unique_taxid_ch
+            .branch { taxid ->
+                cached:   params.cache_dir && file("${params.cache_dir}/references/taxa/${taxid}.fasta").exists()
+                download: true
+            }
+            .set { taxid_cache_ch }
+
+        if (params.cache_dir) {
+            taxid_cache_ch.cached.count().subscribe { n -> log.info "Reference cache: ${n} taxid(s) served from ${params.cache_dir}" }
+            taxid_cache_ch.download.count().subscribe { n -> log.info "Reference cache: ${n} taxid(s) not cached, downloading" }
+        }
+
+        // Resolve accessions for all uncached taxids in one call against an
+        // index of the kraken db seqid2taxid.map (built once per database)
+        TAXID_ACCESSION_LOOKUP (
+            taxid_cache_ch.download.collect(),      // [ taxids ]
+            KRAKEN2_WORKFLOW.out.db                 // kraken db directory
+        )
+
+        TAXID_ACCESSION_LOOKUP.out.accessions
+            .flatten()
+            .map { txt -> [ txt.name - '.accessions.txt', txt ] }
+            .set { taxid_accessions_ch }            // [ taxid, accessions.txt ]
 
         // Download the refrence using the accession number obtained
         // after the mappiong of taxid to accessions
         FETCH_FEFERENCE_FASTA (
-           unique_taxid_ch,         // [ taxid ]
-           taxid_map_ch             // [ txt ]
+           taxid_accessions_ch      // [ taxid, txt ]
         )
 
-        // Prepare data for mapping
         FETCH_FEFERENCE_FASTA.out.fasta
-        .cross( KRAKENTOOLS_EXTRACTKRAKENREADS.out.extracted_kraken2_reads )
+            .mix(
+                taxid_cache_ch.cached.map { taxid ->
+                    [ taxid, file("${params.cache_dir}/references/taxa/${taxid}.fasta") ]
+                }
+            )
+            .set { reference_fasta_ch }             // [ taxid, fasta ]
+
+        // Collapse near-identical references to one representative per cluster
+        if (!params.skip_reference_clustering) {
+            CURATE_REFERENCES (
+                reference_fasta_ch                  // [ taxid, fasta ]
+            )
+            CURATE_REFERENCES.out.fasta
+                .set { reference_fasta_ch }         // [ taxid, curated fasta ]
+        }
+
+        // Prepare data for mapping
+        reference_fasta_ch
+        .cross( extracted_reads_ch )
         .map{                   // [ [taxid, ref], [taxid, sample_id, virus_name, fastq] ]
             [                
                 it[0][0],                          // taxid 
@@ -214,11 +290,26 @@ workflow METAGENOMICS {
                 ]
         }.set { mapping_data }                   // [ taxid, sample_id, ref, fastq, pathogen ]
 
+        // Group samples by taxid so each reference set is indexed once per run
+        mapping_data
+            .map { taxid, sample_id, ref, fastq, pathogen ->
+                [ taxid, ref, pathogen, sample_id, fastq ]
+            }
+            .groupTuple(by: [0, 1, 2])
+            .set { consensus_batch_ch }          // [ taxid, ref, pathogen, [sample_ids], [fastqs] ]
+
         // Select the best reference incase of mutliple references and generate consensus
         GENERATE_CONSENSUS (
-            mapping_data                // [ taxid, sample_id, ref, fastq, pathogen ]
+            consensus_batch_ch          // [ taxid, ref, pathogen, [sample_ids], [fastqs] ]
         )
 
+        // Report reference index cache usage in the pipeline log
+        GENERATE_CONSENSUS.out.cache_stats
+            .map { json -> new groovy.json.JsonSlurper().parse(json) }
+            .subscribe { stats ->
+                log.info "Reference cache [taxid ${stats.taxid}]: ${stats.hits} index hit(s), ${stats.misses} miss(es)"
+            }
+
         // Generate assembly statatics tsv file
         METAGENOMICS_ASSEMBLY_STATS (
             GENERATE_CONSENSUS.out.beststat_json.collect()